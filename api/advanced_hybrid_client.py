@@ -1,21 +1,275 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
 import requests
+import threading
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from django.core.cache import caches
+
+from .cache import ResponseCache, endpoint_path
+from .circuit_breaker import OPEN, CircuitBreakerRegistry, backoff_delay, endpoint_key
+from .health import HealthMonitor
+from .http_pool import build_session
+from .metrics import MetricsCollector
+from .prometheus import PrometheusStore
+from .registry import ClientRegistry
+from .records import unwrap
+from .singleflight import SingleFlight
+from .snapshot import SnapshotStore
+from .topn import TopN, order_recency
+from .streaming import iter_json_array
+
+logger = logging.getLogger(__name__)
+
+# TTL (segundos) por endpoint; endpoints ausentes não são guardados em cache
+DEFAULT_CACHE_TTLS = {
+    '/products': 300,
+    '/admin/stats': 60,
+    '/admin/users': 60,
+    '/admin/orders': 15,
+    '/admin/deliveries/live': 5,
+}
+
+# Endpoints cujo cache fica desatualizado quando um pedido muda de status
+ORDER_DEPENDENT_ENDPOINTS = ('/admin/orders', '/admin/stats', '/admin/deliveries/live')
+
+# Capacidades do upstream descobertas em runtime, partilhadas entre workers
+CAPABILITY_KEY_PREFIX = 'ecogas:cap:'
+CAPABILITY_TTL = 86400
+
+# Endpoints sem autenticação: a resposta é igual para qualquer token e o cache é partilhado
+PUBLIC_ENDPOINTS = ('/products',)
+
+
+# Ids de pedido vão para o path do PATCH e para as labels das métricas: só dígitos
+ORDER_ID_RE = re.compile(r'[0-9]{1,20}')
+
+
+def valid_order_id(order_id):
+    """True se o id for um inteiro positivo (em int ou string), sem nada que mexa no path"""
+    if isinstance(order_id, bool) or not isinstance(order_id, (int, str)):
+        return False
+    return ORDER_ID_RE.fullmatch(str(order_id)) is not None
+
+
+def token_scope(token):
+    """Identificador curto do token (nunca o próprio token) para separar o cache por credencial"""
+    if not token:
+        return 'anon'
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()[:16]
 
 class EcoGasRealAPI:
-    def __init__(self):
+    def __init__(self, token=None, parent=None):
         self.base_url = settings.ECO_GAS_API_URL
-        self.token = None
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'EcoGas-Admin/1.0.0',
-            'Content-Type': 'application/json'
-        })
-    
-    def _make_request(self, endpoint, method='GET', data=None, max_retries=2):
+        self.token = token
+        # Chaves que este cliente serviu do snapshot em disco: {chave: saved_at}
+        self.stale = {}
+        if parent is not None:
+            # Clientes por sessão partilham pool HTTP, cache, circuitos e health com o cliente base
+            self.session = parent.session
+            self.cache = parent.cache
+            self.breakers = parent.breakers
+            self.backoff_base = parent.backoff_base
+            self.backoff_cap = parent.backoff_cap
+            self.health = parent.health
+            self.inflight = parent.inflight
+            self.metrics = parent.metrics
+            self.prometheus = parent.prometheus
+            self.capabilities = parent.capabilities
+            self.recent_fallback_ttl = parent.recent_fallback_ttl
+            self.snapshots = parent.snapshots
+            return
+        
+        shared_alias = getattr(settings, 'ECO_GAS_SHARED_CACHE', 'default')
+        self.cache = ResponseCache(
+            ttls=getattr(settings, 'ECO_GAS_CACHE_TTLS', DEFAULT_CACHE_TTLS),
+            max_entries=getattr(settings, 'ECO_GAS_CACHE_MAX_ENTRIES', 256),
+            shared=caches[shared_alias] if shared_alias else None,
+            lock_dir=getattr(settings, 'ECO_GAS_FETCH_LOCK_DIR', None),
+            lock_timeout=getattr(settings, 'ECO_GAS_FETCH_LOCK_TIMEOUT', 5),
+            failure_ttl=getattr(settings, 'ECO_GAS_FETCH_FAILURE_TTL', 5),
+        )
+        self.session = build_session(
+            pool_connections=getattr(settings, 'ECO_GAS_POOL_CONNECTIONS', 10),
+            pool_maxsize=getattr(settings, 'ECO_GAS_POOL_MAXSIZE', 32),
+            pool_block=getattr(settings, 'ECO_GAS_POOL_BLOCK', False),
+            keep_alive=getattr(settings, 'ECO_GAS_KEEP_ALIVE', True),
+            idle_timeout=getattr(settings, 'ECO_GAS_POOL_IDLE_TIMEOUT', 60),
+        )
+        self.breakers = CircuitBreakerRegistry(
+            failure_threshold=getattr(settings, 'ECO_GAS_BREAKER_FAILURE_THRESHOLD', 5),
+            reset_timeout=getattr(settings, 'ECO_GAS_BREAKER_RESET_TIMEOUT', 30),
+        )
+        self.backoff_base = getattr(settings, 'ECO_GAS_RETRY_BACKOFF_BASE', 0.5)
+        self.backoff_cap = getattr(settings, 'ECO_GAS_RETRY_BACKOFF_CAP', 4.0)
+        self.inflight = SingleFlight()
+        # O que o upstream suporta, descoberto em runtime (None = ainda não se sabe)
+        self.capabilities = {
+            'orders_limit': getattr(settings, 'ECO_GAS_ORDERS_LIMIT_PARAMS', None),
+        }
+        # Sem limit no upstream, os n mais recentes custam a lista inteira: ficam mais tempo em cache
+        self.recent_fallback_ttl = getattr(settings, 'ECO_GAS_RECENT_ORDERS_FALLBACK_TTL', 120)
+        self.metrics = MetricsCollector(window=getattr(settings, 'ECO_GAS_METRICS_WINDOW', 1024))
+        self.prometheus = PrometheusStore(
+            directory=getattr(settings, 'ECO_GAS_PROMETHEUS_DIR', None),
+            flush_interval=getattr(settings, 'ECO_GAS_PROMETHEUS_FLUSH_INTERVAL', 5),
+        )
+        # Última resposta boa por endpoint, em disco, para arrancar sem esperar pelo upstream
+        snapshot_dir = getattr(settings, 'ECO_GAS_SNAPSHOT_DIR', None)
+        self.snapshots = SnapshotStore(
+            snapshot_dir,
+            max_age=getattr(settings, 'ECO_GAS_SNAPSHOT_MAX_AGE', 86400),
+            save_interval=getattr(settings, 'ECO_GAS_SNAPSHOT_SAVE_INTERVAL', 60),
+            max_files=getattr(settings, 'ECO_GAS_SNAPSHOT_MAX_FILES', 500),
+        ) if snapshot_dir else None
+        self.health = HealthMonitor(
+            self.session,
+            f"{self.base_url}{getattr(settings, 'ECO_GAS_HEALTH_PATH', '/')}",
+            interval=getattr(settings, 'ECO_GAS_HEALTH_INTERVAL', 30),
+        )
+    
+    def warm_up(self):
+        """Prepara um worker acabado de criar (post_fork do gunicorn)
+
+        Arranca o health monitor, cuja primeira sonda também acorda o upstream
+        se estiver a dormir, e vai buscar os endpoints públicos em segundo
+        plano. Os endpoints de admin precisam de token: vêm do cache
+        partilhado ou do snapshot em disco.
+        """
+        self.health.start()
+        threading.Thread(target=self.get_products, name='ecogas-warm-up', daemon=True).start()
+
+    def for_token(self, token=None):
+        """Novo cliente com token próprio que reutiliza os recursos deste"""
+        return EcoGasRealAPI(token=token, parent=self)
+    
+    def _cache_key(self, endpoint):
+        """Chave de cache/snapshot do endpoint para o token deste cliente
+        
+        Os endpoints de admin ficam separados por token (``<endpoint>#<hash>``),
+        para uma sessão sem token ou com outro token nunca receber dados
+        guardados por outra. Os públicos são partilhados.
+        """
+        if endpoint.split('?', 1)[0] in PUBLIC_ENDPOINTS:
+            return endpoint
+        return f"{endpoint}#{token_scope(self.token)}"
+    
+    def _make_request(self, endpoint, method='GET', data=None, max_retries=2, use_cache=True):
         """Faz request para a API com sistema de retry"""
+        use_cache = use_cache and method.upper() == 'GET'
+        if use_cache:
+            cache_key = self._cache_key(endpoint)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.debug("upstream_cache_hit endpoint=%s", endpoint,
+                             extra={'event': 'upstream_cache_hit', 'endpoint': endpoint})
+                self.stale.pop(cache_key, None)
+                return True, cached
+            stale = self._serve_snapshot(
+                cache_key, lambda: self._fetch_get(endpoint, max_retries, use_cache)
+            )
+            if stale is not None:
+                return True, stale
+
+        if method.upper() == 'GET':
+            # GETs idênticos (mesmo endpoint e token) em curso noutras threads partilham o mesmo request
+            key = (self._cache_key(endpoint), use_cache)
+            result = self.inflight.do(
+                key, lambda: self._fetch_get(endpoint, max_retries, use_cache)
+            )
+            self.stale.pop(key[0], None)
+            return result
+        return self._send_with_retries(endpoint, method, data, max_retries, use_cache)
+    
+    def _upstream_down(self, key):
+        """True se o upstream ainda não respondeu neste processo ou se está em baixo"""
+        if not self.snapshots.upstream_seen:
+            return True
+        if self.health.snapshot().get('api_status') == 'offline':
+            return True
+        return self.breakers.get('GET', endpoint_path(key)).snapshot()['state'] == OPEN
+    
+    def _serve_snapshot(self, key, refresh):
+        """Payload do snapshot em disco (desatualizado) e atualização em segundo plano
+        
+        Só serve o snapshot antes da primeira resposta do upstream neste
+        processo ou com o upstream em baixo (health offline ou circuito
+        aberto). Devolve None nos outros casos, e o request segue para o
+        upstream.
+        """
+        if self.snapshots is None or not self._upstream_down(key):
+            return None
+        entry = self.snapshots.get(key)
+        if entry is None:
+            return None
+        saved_at, payload = entry
+        self.stale[key] = saved_at
+        logger.info("upstream_snapshot_served endpoint=%s", key,
+                    extra={'event': 'upstream_snapshot_served', 'endpoint': key})
+        if self.snapshots.begin_refresh(key):
+            def run():
+                try:
+                    refresh()
+                except Exception:
+                    logger.exception("upstream_snapshot_refresh_failed endpoint=%s", key,
+                                     extra={'event': 'upstream_snapshot_refresh_failed', 'endpoint': key})
+                finally:
+                    # Com sucesso ou não, a marca sai; o próximo pedido decide de novo
+                    self.stale.pop(key, None)
+                    self.snapshots.end_refresh(key)
+            threading.Thread(target=run, name=f'snapshot-refresh {key}', daemon=True).start()
+        return payload
+    
+    def _remember(self, key, payload, generation=None, ttl=None):
+        """Guarda uma resposta boa no cache e no snapshot em disco"""
+        self.cache.set(key, payload, generation, ttl)
+        if self.snapshots is not None and self.cache.ttl_for(key) > 0:
+            self.snapshots.save(key, payload)
+    
+    def _fetch_get(self, endpoint, max_retries, use_cache):
+        """GET ao upstream; com lock entre workers, só um processo vai buscar cada endpoint
+        
+        A espera pelo lock é limitada (``ECO_GAS_FETCH_LOCK_TIMEOUT``): quem a
+        esgota vai ao upstream sem lock e com uma única tentativa, para não
+        passar do timeout do gunicorn. Se o worker com o lock falhar, a marca
+        de falha faz os que esperavam devolver logo o mesmo erro.
+        """
+        if not use_cache or self.cache.lock_dir is None:
+            return self._send_with_retries(endpoint, 'GET', None, max_retries, use_cache)
+        cache_key = self._cache_key(endpoint)
+        with self.cache.fetch_lock(cache_key, timeout=self.cache.lock_timeout) as acquired:
+            # Outro worker pode ter preenchido o cache partilhado (ou falhado) enquanto esperávamos
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return True, cached
+            failure = self.cache.recent_failure(cache_key)
+            if failure is not None:
+                return False, failure
+            if not acquired:
+                return self._send_with_retries(endpoint, 'GET', None, 0, use_cache)
+            success, result = self._send_with_retries(endpoint, 'GET', None, max_retries, use_cache)
+            # Só falhas do upstream (timeout, ligação, 5xx, circuito aberto); 401/404 são da credencial
+            if not success and result.get('status', 500) >= 500:
+                self.cache.mark_failed(cache_key, result)
+            return success, result
+    
+    def _send_with_retries(self, endpoint, method, data, max_retries, use_cache):
+        """Envia o request ao upstream com circuit breaker e backoff"""
+        breaker = self.breakers.get(method, endpoint)
+        # Lida antes do request: uma invalidação a meio impede que a resposta fique em cache
+        generation = self.cache.generation(self._cache_key(endpoint)) if use_cache else None
         for attempt in range(max_retries + 1):
+            if not breaker.allow_request():
+                logger.warning("upstream_circuit_open method=%s endpoint=%s", method, endpoint,
+                               extra={'event': 'upstream_circuit_open', 'method': method, 'endpoint': endpoint})
+                return False, {"error": "API indisponível - circuito aberto, tente novamente em instantes"}
+            
+            response = None
+            started = time.perf_counter()
             try:
                 url = f"{self.base_url}{endpoint}"
                 headers = {}
@@ -23,47 +277,130 @@ class EcoGasRealAPI:
                 if self.token:
                     headers['Authorization'] = f'Bearer {self.token}'
                 
-                print(f"🌐 Request {attempt+1}/{max_retries+1}: {method} {url}")
-                
                 if method.upper() == 'GET':
                     response = self.session.get(url, headers=headers, timeout=10)
                 else:
                     response = self.session.request(method, url, json=data, headers=headers, timeout=10)
+                body = response.content
+                network_ms = (time.perf_counter() - started) * 1000
                 
-                print(f"📡 Response: {response.status_code}")
-                print(f"📦 Response data type: {type(response.json())}")
-                print(f"📦 Response data: {response.json()}")
+                # Só erros do servidor contam como falha do upstream
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                    self._upstream_seen()
+                
+                # O corpo é decodificado uma única vez
+                decode_started = time.perf_counter()
+                try:
+                    payload = json.loads(body) if body else None
+                except ValueError:
+                    payload = None
+                decode_ms = (time.perf_counter() - decode_started) * 1000
+                
+                self._log_response(method, endpoint, response.status_code, len(body),
+                                   attempt + 1, network_ms, decode_ms)
                 
                 if response.status_code == 200:
-                    return True, response.json()
+                    if use_cache:
+                        self._remember(self._cache_key(endpoint), payload, generation)
+                    return True, payload
                 elif response.status_code == 401:
-                    return False, {"error": "Não autorizado - Faça login novamente"}
+                    return False, {"error": "Não autorizado - Faça login novamente", "status": 401}
                 elif response.status_code == 403:
-                    return False, {"error": "Acesso negado - Permissões insuficientes"}
+                    return False, {"error": "Acesso negado - Permissões insuficientes", "status": 403}
                 elif response.status_code == 404:
-                    return False, {"error": "Endpoint não encontrado"}
+                    return False, {"error": "Endpoint não encontrado", "status": 404}
                 else:
-                    error_msg = response.json().get('error', f'HTTP {response.status_code}')
-                    return False, {"error": error_msg}
+                    error_msg = f'HTTP {response.status_code}'
+                    if isinstance(payload, dict):
+                        error_msg = payload.get('error', error_msg)
+                    return False, {"error": error_msg, "status": response.status_code}
                     
             except requests.exceptions.Timeout:
+                breaker.record_failure()
+                self._log_retry('timeout', method, endpoint, attempt, max_retries, started)
                 if attempt < max_retries:
-                    print(f"⏳ Timeout, tentando novamente... ({attempt + 1}/{max_retries})")
-                    time.sleep(1)
+                    time.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_cap))
                 else:
                     return False, {"error": "Timeout - API não respondeu"}
             except requests.exceptions.ConnectionError:
+                breaker.record_failure()
+                self._log_retry('connection_error', method, endpoint, attempt, max_retries, started)
                 if attempt < max_retries:
-                    print(f"🔌 Erro de conexão, tentando novamente... ({attempt + 1}/{max_retries})")
-                    time.sleep(1)
+                    time.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_cap))
                 else:
                     return False, {"error": "Erro de conexão - Verifique a URL da API"}
             except Exception as e:
+                if response is None:
+                    # Liberta o circuito meio-aberto se o request nem chegou a ter resposta
+                    breaker.record_failure()
+                logger.exception("upstream_unexpected_error method=%s endpoint=%s", method, endpoint,
+                                 extra={'event': 'upstream_unexpected_error', 'method': method, 'endpoint': endpoint})
                 return False, {"error": f"Erro inesperado: {str(e)}"}
     
+    def _upstream_seen(self):
+        if self.snapshots is not None:
+            self.snapshots.mark_upstream_seen()
+    
+    def _log_response(self, method, endpoint, status, size, attempts, network_ms, decode_ms):
+        """Evento estruturado com o tempo de rede e de decodificação de uma resposta"""
+        key = endpoint_key(method, endpoint)
+        self.metrics.observe('upstream', key, network_ms + decode_ms, error=status >= 500)
+        self._record_prometheus(key, str(status), (network_ms + decode_ms) / 1000)
+        fields = {
+            'event': 'upstream_response',
+            'method': method,
+            'endpoint': endpoint,
+            'status': status,
+            'bytes': size,
+            'attempts': attempts,
+            'network_ms': round(network_ms, 1),
+            'decode_ms': round(decode_ms, 1),
+        }
+        logger.log(
+            logging.INFO if status < 400 else logging.WARNING,
+            "upstream_response method=%(method)s endpoint=%(endpoint)s status=%(status)s "
+            "bytes=%(bytes)s attempts=%(attempts)s network_ms=%(network_ms)s decode_ms=%(decode_ms)s",
+            fields,
+            extra=fields,
+        )
+    
+    def _record_prometheus(self, key, status, seconds):
+        """Contador por endpoint/status e histograma de latência de cada tentativa"""
+        self.prometheus.inc('ecogas_upstream_requests_total', {'endpoint': key, 'status': status})
+        self.prometheus.observe('ecogas_upstream_request_duration_seconds', seconds, {'endpoint': key})
+    
+    def _log_retry(self, reason, method, endpoint, attempt, max_retries, started):
+        """Evento estruturado de falha de rede (com ou sem nova tentativa)"""
+        network_ms = (time.perf_counter() - started) * 1000
+        key = endpoint_key(method, endpoint)
+        self.metrics.observe('upstream', key, network_ms, error=True)
+        self._record_prometheus(key, reason, network_ms / 1000)
+        labels = {'endpoint': key, 'reason': reason}
+        if attempt < max_retries:
+            self.prometheus.inc('ecogas_upstream_retries_total', labels)
+        if reason == 'timeout':
+            self.prometheus.inc('ecogas_upstream_timeouts_total', {'endpoint': key})
+        fields = {
+            'event': 'upstream_retry' if attempt < max_retries else 'upstream_failed',
+            'reason': reason,
+            'method': method,
+            'endpoint': endpoint,
+            'attempts': attempt + 1,
+            'network_ms': round(network_ms, 1),
+        }
+        logger.warning(
+            "%(event)s reason=%(reason)s method=%(method)s endpoint=%(endpoint)s "
+            "attempts=%(attempts)s network_ms=%(network_ms)s",
+            fields,
+            extra=fields,
+        )
+    
     def login(self, email, password):
         """Autentica na API real"""
-        print(f"🔐 Tentando login real para: {email}")
+        logger.info("login_attempt email=%s", email, extra={'event': 'login_attempt', 'email': email})
         
         success, result = self._make_request(
             "/auth/login", 
@@ -74,50 +411,375 @@ class EcoGasRealAPI:
             }
         )
         
+        self.prometheus.inc('ecogas_login_attempts_total', {'result': 'success' if success else 'failure'})
         if success:
             self.token = result.get('token')
-            print("✅ Login REAL bem-sucedido!")
+            logger.info("login_success email=%s", email, extra={'event': 'login_success', 'email': email})
             return True, result
         else:
-            print(f"❌ Falha no login: {result.get('error')}")
+            logger.warning("login_failed email=%s error=%s", email, result.get('error'),
+                           extra={'event': 'login_failed', 'email': email})
             return False, result
     
     def get_admin_stats(self):
         """Obtém estatísticas administrativas da API real"""
         return self._make_request("/admin/stats")
     
-    def get_all_orders(self):
+    def get_all_orders(self, use_cache=True):
         """Obtém todos os pedidos da API real"""
-        return self._make_request("/admin/orders")
+        return self._make_request("/admin/orders", use_cache=use_cache)
     
-    def get_all_users(self):
+    def get_all_users(self, use_cache=True):
         """Obtém todos os usuários da API real"""
-        return self._make_request("/admin/users")
+        return self._make_request("/admin/users", use_cache=use_cache)
+    
+    def stream_list(self, endpoint, key=None, chunk_size=65536):
+        """Lê uma lista grande da API em blocos e gera os registos um a um
+        
+        Devolve (success, gerador) ou (False, erro). Se a resposta completa já
+        estiver em cache, os registos vêm do cache. Parar de consumir o gerador
+        fecha a ligação sem ler o resto do corpo.
+        """
+        cached = self.cache.get(self._cache_key(endpoint))
+        if cached is not None:
+            return True, iter(unwrap(cached, key) or [])
+        
+        breaker = self.breakers.get('GET', endpoint)
+        if not breaker.allow_request():
+            return False, {"error": "API indisponível - circuito aberto, tente novamente em instantes"}
+        
+        headers = {}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        started = time.perf_counter()
+        try:
+            response = self.session.get(f"{self.base_url}{endpoint}", headers=headers, timeout=10, stream=True)
+        except requests.exceptions.Timeout:
+            breaker.record_failure()
+            self._log_retry('timeout', 'GET', endpoint, 0, 0, started)
+            return False, {"error": "Timeout - API não respondeu"}
+        except requests.exceptions.RequestException:
+            breaker.record_failure()
+            self._log_retry('connection_error', 'GET', endpoint, 0, 0, started)
+            return False, {"error": "Erro de conexão - Verifique a URL da API"}
+        
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+            self._upstream_seen()
+        if response.status_code != 200:
+            response.close()
+            self._log_response('GET', endpoint, response.status_code, 0, 1,
+                               (time.perf_counter() - started) * 1000, 0)
+            return False, {"error": f"HTTP {response.status_code}"}
+        
+        # Em streaming a latência registada é a do cabeçalho da resposta
+        headers_ms = (time.perf_counter() - started) * 1000
+        self.metrics.observe('upstream', endpoint_key('GET', endpoint), headers_ms)
+        self._record_prometheus(endpoint_key('GET', endpoint), '200', headers_ms / 1000)
+        return True, self._iter_response(response, endpoint, key, chunk_size, started)
+    
+    def _iter_response(self, response, endpoint, key, chunk_size, started):
+        count = 0
+        try:
+            for record in iter_json_array(response.iter_content(chunk_size=chunk_size), key,
+                                          response.encoding or 'utf-8'):
+                if count == 0:
+                    logger.info("upstream_first_record endpoint=%s ttfr_ms=%.1f", endpoint,
+                                (time.perf_counter() - started) * 1000,
+                                extra={'event': 'upstream_first_record', 'endpoint': endpoint})
+                count += 1
+                yield record
+        finally:
+            response.close()
+            logger.info("upstream_stream_closed endpoint=%s records=%s total_ms=%.1f", endpoint, count,
+                        (time.perf_counter() - started) * 1000,
+                        extra={'event': 'upstream_stream_closed', 'endpoint': endpoint, 'records': count})
     
-    def get_products(self):
+    def iter_all_orders(self):
+        """Pedidos em streaming: (success, gerador de dicts)"""
+        return self.stream_list("/admin/orders", key='orders')
+    
+    def iter_all_users(self):
+        """Usuários em streaming: (success, gerador de dicts)"""
+        return self.stream_list("/admin/users", key='users')
+    
+    def iter_live_deliveries(self):
+        """Entregas em streaming: (success, gerador de dicts)"""
+        return self.stream_list("/admin/deliveries/live", key='deliveries')
+    
+    def get_recent_orders(self, n=5):
+        """Os n pedidos mais recentes (por created_at)
+        
+        Pede ao upstream só esses n com ``limit``/``sort``. Se a API rejeitar
+        os parâmetros (400/404/422), ignorar o limite ou não ordenar a
+        resposta, a capacidade fica registada no cache partilhado (nenhum
+        worker volta a sondar) e os n mais recentes saem de um heap
+        alimentado pela lista de /admin/orders já em cache ou, sem ela, lida
+        em streaming. Nesse caso o resultado fica em cache
+        ``ECO_GAS_RECENT_ORDERS_FALLBACK_TTL`` segundos em vez do TTL de
+        /admin/orders; é sempre invalidado com ele.
+        """
+        cache_key = self._cache_key(f"/admin/orders?recent={n}")
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self.stale.pop(cache_key, None)
+            return True, cached
+        stale = self._serve_snapshot(cache_key, lambda: self._load_recent_orders(n, cache_key))
+        if stale is not None:
+            return True, stale
+        result = self._load_recent_orders(n, cache_key)
+        self.stale.pop(cache_key, None)
+        return result
+    
+    def _orders_limit_supported(self):
+        """Capacidade ``limit`` do upstream: deste processo ou descoberta por outro worker"""
+        supported = self.capabilities.get('orders_limit')
+        if supported is None and self.cache.shared is not None:
+            try:
+                supported = self.cache.shared.get(CAPABILITY_KEY_PREFIX + 'orders_limit')
+            except Exception:
+                supported = None
+            if supported is not None:
+                self.capabilities['orders_limit'] = supported
+        return supported
+    
+    def _set_orders_limit_supported(self, supported):
+        self.capabilities['orders_limit'] = supported
+        if self.cache.shared is not None:
+            try:
+                self.cache.shared.set(CAPABILITY_KEY_PREFIX + 'orders_limit', supported, CAPABILITY_TTL)
+            except Exception:
+                pass
+    
+    def _load_recent_orders(self, n, cache_key):
+        top = TopN(n, order_recency)
+        generation = self.cache.generation(cache_key)
+        records = None
+        supported = self._orders_limit_supported()
+        if supported is not False:
+            # Enquanto não se sabe, pede pelo menos 2 para se poder verificar a ordenação
+            limit = n if supported else max(n, 2)
+            success, payload = self._make_request(
+                f"/admin/orders?limit={limit}&sort=-created_at", use_cache=False
+            )
+            if success:
+                records = unwrap(payload, 'orders')
+                if records is None:
+                    return False, {"error": "Resposta inválida da API"}
+                keys = [order_recency(record) for record in records]
+                in_order = all(newer >= older for newer, older in zip(keys, keys[1:]))
+                # Mais registos que o limite: veio a lista toda, que o heap ainda reduz.
+                # Dentro do limite mas fora de ordem: são os primeiros, não os mais recentes.
+                supported = len(records) <= limit and in_order
+                self._set_orders_limit_supported(supported)
+                if len(records) <= limit and not in_order:
+                    records = None
+            elif payload.get('status') in (400, 404, 422):
+                supported = False
+                self._set_orders_limit_supported(False)
+            else:
+                return False, payload
+        if records is None:
+            # A lista completa pode já estar em cache (página de pedidos): nada a transferir
+            records = unwrap(self.cache.get(self._cache_key("/admin/orders")), 'orders')
+        if records is not None:
+            top.extend(records)
+        else:
+            success, records = self.iter_all_orders()
+            if not success:
+                return False, records
+            try:
+                top.extend(records)
+            except ValueError as e:
+                return False, {"error": f"Resposta inválida: {e}"}
+            finally:
+                if hasattr(records, 'close'):
+                    records.close()
+        
+        recent = top.items()
+        self._remember(cache_key, recent, generation, None if supported else self.recent_fallback_ttl)
+        return True, recent
+    
+    def get_products(self, use_cache=True):
         """Obtém produtos da API real (endpoint público)"""
-        return self._make_request("/products")
+        return self._make_request("/products", use_cache=use_cache)
     
-    def get_live_deliveries(self):
+    def get_live_deliveries(self, use_cache=True):
         """Obtém entregas em tempo real da API real"""
-        return self._make_request("/admin/deliveries/live")
+        return self._make_request("/admin/deliveries/live", use_cache=use_cache)
     
     def update_order_status(self, order_id, new_status):
         """Atualiza status do pedido na API real"""
-        return self._make_request(
+        if not valid_order_id(order_id):
+            return False, {'error': f'order_id inválido: {order_id!r}'}
+        success, result = self._make_request(
             f"/orders/{order_id}/status",
             method='PATCH',
             data={"status": new_status}
         )
+        if success:
+            self.invalidate_cache(*ORDER_DEPENDENT_ENDPOINTS)
+        return success, result
+    
+    def bulk_update_order_status(self, updates, max_workers=None):
+        """Atualiza o status de vários pedidos com PATCHes em paralelo
+        
+        ``updates`` é uma lista de (order_id, status). Os PATCHes passam por um
+        pool de no máximo ``ECO_GAS_BULK_MAX_WORKERS`` threads (abaixo do
+        tamanho do pool HTTP) e cada um tem o seu retry e circuit breaker.
+        Devolve um resultado por item, pela mesma ordem; o cache dos
+        endpoints de pedidos é invalidado uma única vez no fim.
+        """
+        updates = list(updates)
+        if not updates:
+            return []
+        workers = min(max_workers or getattr(settings, 'ECO_GAS_BULK_MAX_WORKERS', 8), len(updates))
+        
+        def patch(update):
+            order_id, status = update
+            if not valid_order_id(order_id):
+                return {'order_id': order_id, 'status': status, 'success': False,
+                        'error': f'order_id inválido: {order_id!r}'}
+            success, result = self._make_request(
+                f"/orders/{order_id}/status",
+                method='PATCH',
+                data={"status": status}
+            )
+            item = {'order_id': order_id, 'status': status, 'success': success}
+            if not success:
+                item['error'] = result.get('error') if isinstance(result, dict) else str(result)
+            return item
+        
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ecogas-bulk') as pool:
+            results = list(pool.map(patch, updates))
+        if any(item['success'] for item in results):
+            self.invalidate_cache(*ORDER_DEPENDENT_ENDPOINTS)
+        
+        fields = {
+            'event': 'bulk_order_status',
+            'items': len(results),
+            'failed': sum(1 for item in results if not item['success']),
+            'workers': workers,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+        logger.info("bulk_order_status items=%(items)s failed=%(failed)s workers=%(workers)s "
+                    "elapsed_ms=%(elapsed_ms)s", fields, extra=fields)
+        return results
+    
+    def invalidate_cache(self, *endpoints):
+        """Invalida o cache dos endpoints indicados (ou todo o cache)
+        
+        Os snapshots em memória dos mesmos endpoints também deixam de ser
+        servidos, para uma alteração acabada de fazer não ser escondida.
+        """
+        self.cache.invalidate(*endpoints)
+        if self.snapshots is not None:
+            self.snapshots.discard(*endpoints)
+    
+    def get_cache_stats(self):
+        """Estatísticas do cache de respostas"""
+        return self.cache.stats()
+    
+    def get_circuit_status(self):
+        """Estado dos circuit breakers por endpoint"""
+        return self.breakers.snapshot()
+    
+    def get_metrics(self):
+        """Latências, erros e taxa de cache recentes deste processo"""
+        return {**self.metrics.snapshot(), 'cache': self.get_cache_stats()}
+    
+    def render_prometheus(self):
+        """Métricas de todos os workers no formato de texto do Prometheus"""
+        return self.prometheus.render()
     
     def get_system_status(self):
-        """Verifica status da API"""
-        success, _ = self._make_request("/products", max_retries=0)
+        """Status da API a partir da última sonda do HealthMonitor (sem request)"""
+        now = time.time()
+        stale = {key: int(now - saved_at) for key, saved_at in dict(self.stale).items()}
         return {
-            "api_status": "online" if success else "offline",
+            **self.health.snapshot(),
             "base_url": self.base_url,
-            "authenticated": bool(self.token)
+            "authenticated": bool(self.token),
+            "cache": self.get_cache_stats(),
+            "circuit_breakers": self.get_circuit_status(),
+            "singleflight": self.inflight.stats(),
+            # Endpoints que este cliente serviu do snapshot em disco: {endpoint: idade em s}
+            "stale": stale,
+            "stale_seconds": max(stale.values(), default=0),
         }
 
-# Instância global
-advanced_hybrid_api = EcoGasRealAPI()
\ No newline at end of file
+
+class AsyncEcoGasRealAPI:
+    """Versão asyncio do cliente EcoGás
+
+    Cada chamada corre o cliente síncrono numa thread, partilhando token,
+    sessão HTTP e retry. Assim várias chamadas independentes podem ser
+    disparadas em paralelo com ``gather``.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    async def _call(self, method, *args, **kwargs):
+        return await asyncio.to_thread(method, *args, **kwargs)
+
+    async def gather(self, *calls):
+        """Executa várias chamadas em paralelo e devolve os resultados na mesma ordem"""
+        return await asyncio.gather(*calls)
+
+    async def login(self, email, password):
+        """Autentica na API real"""
+        return await self._call(self.client.login, email, password)
+
+    async def get_admin_stats(self):
+        """Obtém estatísticas administrativas da API real"""
+        return await self._call(self.client.get_admin_stats)
+
+    async def get_all_orders(self):
+        """Obtém todos os pedidos da API real"""
+        return await self._call(self.client.get_all_orders)
+
+    async def get_recent_orders(self, n=5):
+        """Os n pedidos mais recentes"""
+        return await self._call(self.client.get_recent_orders, n)
+
+    async def get_all_users(self):
+        """Obtém todos os usuários da API real"""
+        return await self._call(self.client.get_all_users)
+
+    async def get_products(self):
+        """Obtém produtos da API real (endpoint público)"""
+        return await self._call(self.client.get_products)
+
+    async def get_live_deliveries(self):
+        """Obtém entregas em tempo real da API real"""
+        return await self._call(self.client.get_live_deliveries)
+
+    async def update_order_status(self, order_id, new_status):
+        """Atualiza status do pedido na API real"""
+        return await self._call(self.client.update_order_status, order_id, new_status)
+
+    async def bulk_update_order_status(self, updates, max_workers=None):
+        """Atualiza o status de vários pedidos em paralelo"""
+        return await self._call(self.client.bulk_update_order_status, updates, max_workers)
+
+    async def get_system_status(self):
+        """Status da API (leitura em memória, não precisa de thread)"""
+        return self.client.get_system_status()
+
+# Instância global (cliente base, sem token de usuário)
+advanced_hybrid_api = EcoGasRealAPI()
+
+# Clientes por sessão Django
+api_clients = ClientRegistry(
+    advanced_hybrid_api,
+    max_clients=getattr(settings, 'ECO_GAS_CLIENT_MAX', 1000),
+    idle_timeout=getattr(settings, 'ECO_GAS_CLIENT_IDLE_TIMEOUT', 3600),
+)
+
+def client_for_request(request):
+    """Cliente EcoGás da sessão do request, com o token guardado no login"""
+    return api_clients.get(request.session.session_key, request.session.get('auth_token'))
\ No newline at end of file
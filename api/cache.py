@@ -0,0 +1,234 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+SHARED_KEY_PREFIX = 'ecogas:resp:'
+GENERATION_KEY_PREFIX = 'ecogas:gen:'
+FAILURE_KEY_PREFIX = 'ecogas:fail:'
+
+
+def endpoint_path(key):
+    """Caminho do endpoint de uma chave de cache (sem query string nem ``#<token>``)"""
+    return key.split('#', 1)[0].split('?', 1)[0]
+
+
+def _flock(handle, timeout):
+    if timeout is None:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        return True
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+
+class ResponseCache:
+    """Cache das respostas da API com TTL por endpoint e despejo LRU
+
+    O primeiro nível é um LRU em memória do processo. Se ``shared`` for um
+    backend de cache do Django (ex.: FileBasedCache), as respostas também
+    são gravadas lá, para que o fetch de um worker do gunicorn aqueça todos
+    os outros e sobreviva a reinícios.
+
+    Cada entrada guarda a geração do seu endpoint. ``invalidate`` muda a
+    geração no cache partilhado e as entradas antigas, locais ou partilhadas,
+    deixam de ser servidas em todos os workers.
+
+    Com o upstream em baixo, ``mark_failed`` deixa no cache partilhado uma
+    marca de ``failure_ttl`` segundos: os workers que esperavam pelo mesmo
+    fetch devolvem o erro em vez de repetirem o ciclo de retries.
+    """
+
+    def __init__(self, ttls=None, max_entries=256, default_ttl=0, shared=None, lock_dir=None,
+                 lock_timeout=5, failure_ttl=5):
+        self.ttls = dict(ttls or {})
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.shared = shared
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.lock_timeout = lock_timeout
+        self.failure_ttl = failure_ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def ttl_for(self, endpoint):
+        """TTL em segundos do endpoint (ignora a query string); 0 desliga o cache"""
+        return self.ttls.get(endpoint_path(endpoint), self.default_ttl)
+
+    def generation(self, endpoint):
+        """Geração atual do endpoint; ler antes do fetch e passar a ``set``"""
+        path = endpoint_path(endpoint)
+        if self.shared is None:
+            with self._lock:
+                return self._generations.get(path, 0)
+        key = GENERATION_KEY_PREFIX + path
+        try:
+            generation = self.shared.get(key)
+            if generation is None:
+                # Nunca recomeça de um valor já usado, mesmo que a chave tenha sido despejada
+                generation = time.time_ns()
+                if not self.shared.add(key, generation, timeout=None):
+                    generation = self.shared.get(key, generation)
+            return generation
+        except Exception:
+            return None
+
+    def get(self, endpoint):
+        """Devolve a resposta em cache ou None se não existir, tiver expirado ou sido invalidada"""
+        generation = self.generation(endpoint)
+        with self._lock:
+            entry = self._entries.get(endpoint)
+            if entry is not None:
+                expires_at, entry_generation, value = entry
+                if expires_at > time.monotonic() and entry_generation == generation:
+                    self._entries.move_to_end(endpoint)
+                    self.hits += 1
+                    return value
+                del self._entries[endpoint]
+
+        value = self._get_shared(endpoint, generation)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.shared_hits += 1
+        return value
+
+    def _get_shared(self, endpoint, generation):
+        if self.shared is None or self.ttl_for(endpoint) <= 0 or generation is None:
+            return None
+        try:
+            entry = self.shared.get(SHARED_KEY_PREFIX + endpoint)
+        except Exception:
+            return None
+        if not entry or len(entry) != 3:
+            return None
+        # O backend guarda a hora de expiração real para o LRU local herdar o TTL restante
+        expires_at_wall, entry_generation, value = entry
+        remaining = expires_at_wall - time.time()
+        if remaining <= 0 or entry_generation != generation:
+            return None
+        self._set_local(endpoint, value, remaining, generation)
+        return value
+
+    def set(self, endpoint, value, generation=None, ttl=None):
+        """Guarda a resposta se o endpoint tiver TTL, despejando as menos usadas
+
+        ``generation`` é a lida antes do fetch: se o endpoint foi invalidado
+        entretanto, a resposta já nasceu desatualizada e não é guardada.
+        ``ttl`` substitui o TTL do endpoint para esta entrada.
+        """
+        if ttl is None:
+            ttl = self.ttl_for(endpoint)
+        if ttl <= 0:
+            return
+        current = self.generation(endpoint)
+        if current is None or (generation is not None and generation != current):
+            return
+        self._set_local(endpoint, value, ttl, current)
+        if self.shared is not None:
+            try:
+                self.shared.set(SHARED_KEY_PREFIX + endpoint, (time.time() + ttl, current, value), timeout=ttl)
+            except Exception:
+                pass
+
+    def _set_local(self, endpoint, value, ttl, generation):
+        with self._lock:
+            self._entries[endpoint] = (time.monotonic() + ttl, generation, value)
+            self._entries.move_to_end(endpoint)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *endpoints):
+        """Invalida os endpoints indicados (e as suas variantes) em todos os workers; sem argumentos, tudo"""
+        paths = set(endpoints) if endpoints else set(self.ttls)
+        with self._lock:
+            if not endpoints:
+                paths.update(endpoint_path(key) for key in self._entries)
+                self._entries.clear()
+            else:
+                for key in list(self._entries):
+                    if endpoint_path(key) in paths:
+                        del self._entries[key]
+            if self.shared is None:
+                for path in paths:
+                    self._generations[path] = self._generations.get(path, 0) + 1
+                return
+        generation = time.time_ns()
+        try:
+            self.shared.set_many({GENERATION_KEY_PREFIX + path: generation for path in paths}, timeout=None)
+        except Exception:
+            pass
+
+    def mark_failed(self, endpoint, error):
+        """Regista por ``failure_ttl`` s que o fetch do endpoint falhou (só no cache partilhado)"""
+        if self.shared is None or self.failure_ttl <= 0:
+            return
+        try:
+            self.shared.set(FAILURE_KEY_PREFIX + endpoint, error, timeout=self.failure_ttl)
+        except Exception:
+            pass
+
+    def recent_failure(self, endpoint):
+        """Erro do último fetch falhado do endpoint, se ainda estiver marcado; senão None"""
+        if self.shared is None or self.failure_ttl <= 0:
+            return None
+        try:
+            return self.shared.get(FAILURE_KEY_PREFIX + endpoint)
+        except Exception:
+            return None
+
+    @contextmanager
+    def fetch_lock(self, endpoint, timeout=None):
+        """Lock entre processos (flock) para só um worker ir ao upstream por endpoint
+
+        Devolve True se o lock foi obtido. Com ``timeout`` a espera é limitada
+        e, esgotada, devolve False: o chamador segue sem lock.
+        """
+        if self.lock_dir is None:
+            yield True
+            return
+        os.makedirs(self.lock_dir, exist_ok=True)
+        name = hashlib.sha1(endpoint.encode('utf-8')).hexdigest()
+        with open(os.path.join(self.lock_dir, f'{name}.lock'), 'a') as handle:
+            acquired = _flock(handle, timeout)
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def stats(self):
+        """Contadores de hits/misses para monitorização"""
+        with self._lock:
+            hits = self.hits + self.shared_hits
+            total = hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'shared': self.shared is not None,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(hits / total, 3) if total else 0.0,
+            }
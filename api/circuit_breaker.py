@@ -0,0 +1,108 @@
+import random
+import re
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_ID_SEGMENT = re.compile(r'/[^/?]*\d[^/?]*')
+
+
+def endpoint_key(method, endpoint):
+    """Chave estável por endpoint: sem query string e com ids trocados por {id}"""
+    path = _ID_SEGMENT.sub('/{id}', endpoint.split('?', 1)[0])
+    return f"{method.upper()} {path}"
+
+
+def backoff_delay(attempt, base=0.5, cap=4.0):
+    """Backoff exponencial com jitter total (0..min(cap, base * 2^attempt))"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Circuit breaker de um endpoint
+
+    Fechado: os requests passam. Após ``failure_threshold`` falhas seguidas
+    abre e falha de imediato durante ``reset_timeout`` segundos. Depois passa
+    a meio-aberto e deixa passar ``half_open_max_calls`` requests de teste:
+    um sucesso fecha o circuito, uma falha volta a abri-lo.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, half_open_max_calls=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.half_open_calls = 0
+        self.rejected = 0
+
+    def allow_request(self):
+        """Indica se o request pode seguir para o upstream"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self.half_open_calls = 0
+            if self.state == HALF_OPEN:
+                if self.half_open_calls >= self.half_open_max_calls:
+                    self.rejected += 1
+                    return False
+                self.half_open_calls += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self.half_open_calls = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.half_open_calls = 0
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'retry_in': retry_in,
+            }
+
+
+class CircuitBreakerRegistry:
+    """Um circuit breaker por endpoint, criado a pedido"""
+
+    def __init__(self, **breaker_options):
+        self.breaker_options = breaker_options
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, method, endpoint):
+        key = endpoint_key(method, endpoint)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(**self.breaker_options)
+            return breaker
+
+    def snapshot(self):
+        """Estado de todos os circuitos, para monitorização"""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {key: breaker.snapshot() for key, breaker in sorted(breakers.items())}
@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Sonda periódica e barata da API EcoGás
+
+    Em vez de descarregar o catálogo de produtos a cada página, uma thread
+    em segundo plano faz um HEAD ao upstream a cada ``interval`` segundos e
+    guarda o último estado conhecido em memória.
+    """
+
+    def __init__(self, session, url, interval=30, timeout=5):
+        self.session = session
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._state = {
+            'api_status': 'unknown',
+            'latency_ms': None,
+            'status_code': None,
+            'last_check': None,
+            'last_success': None,
+            'consecutive_failures': 0,
+            'error': None,
+        }
+
+    def probe(self):
+        """Executa uma sonda e atualiza o estado"""
+        started = time.monotonic()
+        status_code = None
+        error = None
+        try:
+            response = self.session.head(self.url, timeout=self.timeout, allow_redirects=False)
+            status_code = response.status_code
+            # Qualquer resposta abaixo de 500 significa que o serviço está de pé
+            online = status_code < 500
+            if not online:
+                error = f'HTTP {status_code}'
+        except requests.exceptions.RequestException as e:
+            online = False
+            error = e.__class__.__name__
+        latency_ms = round((time.monotonic() - started) * 1000, 1)
+        now = time.time()
+
+        with self._lock:
+            self._state.update({
+                'api_status': 'online' if online else 'offline',
+                'latency_ms': latency_ms,
+                'status_code': status_code,
+                'last_check': now,
+                'error': error,
+            })
+            if online:
+                self._state['last_success'] = now
+                self._state['consecutive_failures'] = 0
+            else:
+                self._state['consecutive_failures'] += 1
+
+        if not online:
+            logger.warning('health probe failed: %s (%s ms)', error, latency_ms)
+        return online
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.probe()
+            except Exception:
+                logger.exception('health probe crashed')
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Arranca a thread de sondagem (idempotente; seguro após fork do gunicorn)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='ecogas-health', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self):
+        """Último estado conhecido, sem fazer nenhum request"""
+        self.start()
+        with self._lock:
+            state = dict(self._state)
+        last_success = state['last_success']
+        state['seconds_since_success'] = (
+            round(time.time() - last_success, 1) if last_success is not None else None
+        )
+        return state
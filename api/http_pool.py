@@ -0,0 +1,60 @@
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter com TCP keep-alive e descarte de ligações inativas
+
+    O Render fecha ligações inativas do lado do servidor; se o pool não for
+    usado durante ``idle_timeout`` segundos, as ligações são descartadas antes
+    do próximo envio em vez de falharem com um reset.
+    """
+
+    def __init__(self, idle_timeout=60, tcp_keepalive=True, **kwargs):
+        self.idle_timeout = idle_timeout
+        self.tcp_keepalive = tcp_keepalive
+        self._last_used = time.monotonic()
+        self._idle_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.tcp_keepalive:
+            kwargs['socket_options'] = HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+            ]
+        super().init_poolmanager(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        with self._idle_lock:
+            now = time.monotonic()
+            if self.idle_timeout and now - self._last_used > self.idle_timeout:
+                self.poolmanager.clear()
+            self._last_used = now
+        return super().send(request, *args, **kwargs)
+
+
+def build_session(pool_connections=10, pool_maxsize=32, pool_block=False,
+                  keep_alive=True, idle_timeout=60):
+    """Sessão requests partilhada por todos os clientes de um worker"""
+    session = requests.Session()
+    adapter = PooledHTTPAdapter(
+        idle_timeout=idle_timeout,
+        tcp_keepalive=keep_alive,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block,
+        max_retries=0,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': 'EcoGas-Admin/1.0.0',
+        'Content-Type': 'application/json',
+        'Connection': 'keep-alive' if keep_alive else 'close',
+    })
+    return session
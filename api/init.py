@@ -1,3 +1,3 @@
-from .advanced_hybrid_client import advanced_hybrid_api
+from .advanced_hybrid_client import advanced_hybrid_api, api_clients, client_for_request
 
-__all__ = ['advanced_hybrid_api']
\ No newline at end of file
+__all__ = ['advanced_hybrid_api', 'api_clients', 'client_for_request']
\ No newline at end of file
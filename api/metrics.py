@@ -0,0 +1,100 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+
+
+def percentile(sorted_values, fraction):
+    """Percentil pelo método nearest-rank sobre uma lista já ordenada"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, now=None):
+    """Resumo de amostras (instante, duração em ms, erro)"""
+    now = time.monotonic() if now is None else now
+    durations = sorted(duration for _, duration, _ in samples)
+    errors = sum(1 for _, _, error in samples if error)
+    count = len(durations)
+    return {
+        'samples': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'p50_ms': _round(percentile(durations, 0.50)),
+        'p95_ms': _round(percentile(durations, 0.95)),
+        'p99_ms': _round(percentile(durations, 0.99)),
+        'max_ms': _round(durations[-1] if durations else None),
+        'per_minute': sum(1 for at, _, _ in samples if now - at <= 60),
+    }
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+class _Series:
+    __slots__ = ('samples', 'count', 'errors')
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+
+
+class MetricsCollector:
+    """Latências e erros por grupo (upstream, views) e por nome, em memória do processo
+
+    Cada série guarda só as últimas ``window`` amostras num ring buffer, por
+    isso a memória é limitada e os percentis refletem o tráfego recente. Os
+    totais (``count``/``errors``) contam desde o arranque do processo.
+    """
+
+    def __init__(self, window=1024):
+        self.window = window
+        self.started_at = time.time()
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, group, name, duration_ms, error=False):
+        """Regista uma duração em ms"""
+        with self._lock:
+            series = self._series.get((group, name))
+            if series is None:
+                series = self._series[(group, name)] = _Series(self.window)
+            series.samples.append((time.monotonic(), duration_ms, error))
+            series.count += 1
+            if error:
+                series.errors += 1
+
+    def snapshot(self):
+        """Resumo p50/p95/p99 por série e agregado por grupo"""
+        with self._lock:
+            copies = {
+                key: (list(series.samples), series.count, series.errors)
+                for key, series in self._series.items()
+            }
+        now = time.monotonic()
+        groups = {}
+        for (group, name), (samples, count, errors) in sorted(copies.items()):
+            entry = groups.setdefault(group, {'all': None, 'by_name': {}, '_samples': [], 'count': 0, 'errors': 0})
+            entry['by_name'][name] = {**summarize(samples, now), 'count': count, 'total_errors': errors}
+            entry['_samples'].extend(samples)
+            entry['count'] += count
+            entry['errors'] += errors
+        for entry in groups.values():
+            entry['all'] = {**summarize(entry.pop('_samples'), now),
+                            'count': entry.pop('count'), 'total_errors': entry.pop('errors')}
+        return {
+            # Cada worker tem o seu coletor; o pid diz de qual veio o resumo
+            'pid': os.getpid(),
+            'uptime_seconds': int(time.time() - self.started_at),
+            'window': self.window,
+            'groups': groups,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
@@ -0,0 +1,269 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+# Buckets (segundos) iguais aos do cliente oficial do Prometheus
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Estado somado dos workers que já terminaram
+DEAD_FILE = 'dead.json'
+LOCK_FILE = '.lock'
+
+# nome -> (tipo, ajuda)
+METRICS = {
+    'ecogas_upstream_requests_total': ('counter', 'Requests à API EcoGás por endpoint e status'),
+    'ecogas_upstream_request_duration_seconds': ('histogram', 'Latência dos requests à API EcoGás'),
+    'ecogas_upstream_retries_total': ('counter', 'Novas tentativas após falha de rede'),
+    'ecogas_upstream_timeouts_total': ('counter', 'Requests à API EcoGás que excederam o timeout'),
+    'ecogas_view_requests_total': ('counter', 'Requests às views do dashboard por status'),
+    'ecogas_view_duration_seconds': ('histogram', 'Tempo das views do dashboard'),
+    'ecogas_session_writes_total': ('counter', 'Escritas de sessões na base de dados'),
+    'ecogas_login_attempts_total': ('counter', 'Tentativas de login na API por resultado'),
+}
+
+
+def _labels_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class PrometheusStore:
+    """Contadores e histogramas no formato do Prometheus, somados entre processos
+
+    Cada processo acumula em memória e grava o seu estado em
+    ``<directory>/<pid>.json`` no máximo a cada ``flush_interval`` segundos.
+    O scrape lê e soma os ficheiros de todos os workers vivos e o
+    ``dead.json``. Quando um worker termina, ``retire`` soma o estado dele
+    ao ``dead.json`` e apaga o ``<pid>.json``: os contadores nunca andam
+    para trás, mesmo que o PID seja reutilizado, e o número de ficheiros
+    não cresce com a reciclagem dos workers. Sem ``directory`` só o
+    processo atual é exposto.
+    """
+
+    def __init__(self, directory=None, flush_interval=5.0, buckets=DEFAULT_BUCKETS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._counters = {}
+        self._histograms = {}
+        self._last_flush = 0.0
+        self._retired = False
+
+    def _check_fork(self):
+        # Com preload do gunicorn o estado do master não pode ser contado em cada worker
+        if os.getpid() != self._pid:
+            self._reset()
+
+    def inc(self, name, labels=None, value=1):
+        with self._lock:
+            self._check_fork()
+            key = (name, _labels_key(labels))
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._maybe_flush()
+
+    def observe(self, name, seconds, labels=None):
+        with self._lock:
+            self._check_fork()
+            key = (name, _labels_key(labels))
+            entry = self._histograms.get(key)
+            if entry is None:
+                # contagens por bucket (não cumulativas), soma, total
+                entry = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += seconds
+            entry[2] += 1
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _state(self):
+        with self._lock:
+            self._check_fork()
+            return {
+                'buckets': list(self.buckets),
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(labels), [list(entry[0]), entry[1], entry[2]]]
+                               for (name, labels), entry in self._histograms.items()],
+            }
+
+    def _write(self, path, state):
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as handle:
+            json.dump(state, handle, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def flush(self):
+        """Grava o estado deste processo de forma atómica"""
+        if not self.directory or self._retired:
+            return
+        self._last_flush = time.monotonic()
+        state = self._state()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._write(os.path.join(self.directory, f'{self._pid}.json'), state)
+        except OSError:
+            pass
+
+    @contextmanager
+    def _directory_lock(self, exclusive):
+        """flock do diretório: o scrape (partilhado) nunca vê um worker contado duas vezes ou nenhuma"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def retire(self, pid=None):
+        """Soma o estado de um worker que terminou ao ``dead.json`` e apaga o ``<pid>.json``
+
+        Sem ``pid`` retira este processo (hook ``worker_exit``), que deixa de
+        gravar. Com ``pid`` lê o último estado gravado por esse worker (hook
+        ``child_exit`` do master, também para workers mortos pelo timeout).
+        """
+        if not self.directory:
+            return
+        own = pid is None
+        if own:
+            state, pid = self._state(), self._pid
+            self._retired = True
+        path = os.path.join(self.directory, f'{pid}.json')
+        try:
+            with self._directory_lock(exclusive=True):
+                if not own:
+                    try:
+                        with open(path) as handle:
+                            state = json.load(handle)
+                    except FileNotFoundError:
+                        # Já retirado pelo próprio worker
+                        return
+                    except ValueError:
+                        state = None
+                dead_path = os.path.join(self.directory, DEAD_FILE)
+                states = [state] if state is not None else []
+                try:
+                    with open(dead_path) as handle:
+                        states.append(json.load(handle))
+                except (OSError, ValueError):
+                    pass
+                self._write(dead_path, self._serialize(*self._merge(states)))
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        except OSError:
+            pass
+
+    def _states(self):
+        if not self.directory:
+            return [self._state()]
+        self.flush()
+        states = []
+        try:
+            with self._directory_lock(exclusive=False):
+                for name in os.listdir(self.directory):
+                    if not name.endswith('.json'):
+                        continue
+                    try:
+                        with open(os.path.join(self.directory, name)) as handle:
+                            states.append(json.load(handle))
+                    except (OSError, ValueError):
+                        continue
+        except OSError:
+            return [self._state()]
+        return states
+
+    def _serialize(self, counters, histograms):
+        return {
+            'buckets': list(self.buckets),
+            'counters': [[name, [list(pair) for pair in labels], value]
+                         for (name, labels), value in counters.items()],
+            'histograms': [[name, [list(pair) for pair in labels], entry]
+                           for (name, labels), entry in histograms.items()],
+        }
+
+    def collect(self):
+        """Soma os estados de todos os processos: (contadores, histogramas)"""
+        return self._merge(self._states())
+
+    def _merge(self, states):
+        counters, histograms = {}, {}
+        for state in states:
+            if tuple(state.get('buckets', ())) != self.buckets:
+                continue
+            for name, labels, value in state['counters']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, (bucket_counts, total, count) in state['histograms']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                entry = histograms.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+                for index, bucket_count in enumerate(bucket_counts):
+                    entry[0][index] += bucket_count
+                entry[1] += total
+                entry[2] += count
+        return counters, histograms
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus (0.0.4)"""
+        counters, histograms = self.collect()
+        samples = {}
+        for (name, labels), value in sorted(counters.items()):
+            samples.setdefault(name, []).append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for (name, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), bucket_counts + [count]):
+                cumulative = count if bound == math.inf else cumulative + bucket_count
+                bucket_labels = labels + (('le', _format_value(bound)),)
+                lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+        output = []
+        for name, (kind, help_text) in METRICS.items():
+            output.append(f'# HELP {name} {help_text}')
+            output.append(f'# TYPE {name} {kind}')
+            output.extend(samples.pop(name, []))
+        for name, lines in sorted(samples.items()):
+            output.append(f'# TYPE {name} untyped')
+            output.extend(lines)
+        return '\n'.join(output) + '\n'
@@ -0,0 +1,216 @@
+"""Registos tipados e compactos para as respostas da API EcoGás
+
+Cada registo guarda apenas o dict original e, a partir do primeiro acesso,
+uma lista com os valores já convertidos. A conversão de cada campo (datas,
+valores monetários, registos aninhados) só acontece quando o campo é lido,
+por isso uma lista grande em que a view só mostra uma página custa pouco.
+"""
+
+from collections.abc import Sequence
+from decimal import Decimal, InvalidOperation
+
+from django.utils.dateparse import parse_datetime
+
+_UNSET = object()
+
+
+def to_datetime(value):
+    if not isinstance(value, str):
+        return None
+    try:
+        return parse_datetime(value)
+    except ValueError:
+        return None
+
+
+def to_decimal(value):
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError, TypeError):
+        return None
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Field:
+    """Campo de um registo, convertido a pedido e memorizado"""
+
+    __slots__ = ('key', 'convert', 'default', 'index')
+
+    def __init__(self, key=None, convert=None, default=None):
+        self.key = key
+        self.convert = convert
+        self.default = default
+        self.index = None
+
+    def __set_name__(self, owner, name):
+        if self.key is None:
+            self.key = name
+
+    def __get__(self, record, owner=None):
+        if record is None:
+            return self
+        values = record._values
+        if values is None:
+            values = record._values = [_UNSET] * len(type(record)._fields)
+        value = values[self.index]
+        if value is _UNSET:
+            raw = record._raw.get(self.key)
+            if raw is None:
+                value = self.default
+            elif self.convert is not None:
+                value = self.convert(raw)
+            else:
+                value = raw
+            values[self.index] = value
+        return value
+
+
+class Record:
+    """Base dos registos: atributos tipados por cima do dict da API
+
+    ``get()`` devolve o valor original (como num dict) e é o que os filtros
+    usam; os atributos devolvem o valor convertido e são o que os templates
+    usam. Chaves não declaradas continuam acessíveis como atributo.
+    """
+
+    __slots__ = ('_raw', '_values')
+    _fields = ()
+    payload_key = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = list(cls._fields)
+        for value in cls.__dict__.values():
+            if isinstance(value, Field):
+                value.index = len(fields)
+                fields.append(value)
+        cls._fields = tuple(fields)
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._values = None
+
+    def __getattr__(self, name):
+        # Só é chamado para nomes que não são campos declarados
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._raw[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def get(self, key, default=None):
+        return self._raw.get(key, default)
+
+    def to_dict(self):
+        return self._raw
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self._raw.get('id')!r}>"
+
+    @classmethod
+    def list_from(cls, payload):
+        """Lista preguiçosa de registos a partir da resposta da API (lista ou {"<chave>": [...]})"""
+        return RecordList(unwrap(payload, cls.payload_key) or [], cls)
+
+
+class RecordList(Sequence):
+    """Sequência que só cria o registo de cada item quando ele é lido"""
+
+    __slots__ = ('_items', '_cls')
+
+    def __init__(self, items, cls):
+        self._items = items
+        self._cls = cls
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RecordList(self._items[index], self._cls)
+        return self._cls(self._items[index])
+
+    def __iter__(self):
+        cls = self._cls
+        for item in self._items:
+            yield cls(item)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def to_dicts(self):
+        return self._items
+
+
+def unwrap(payload, key):
+    """Extrai a lista de registos de uma resposta; None se o formato for inesperado"""
+    if isinstance(payload, list):
+        return payload
+    if key and isinstance(payload, dict) and isinstance(payload.get(key), list):
+        return payload[key]
+    return None
+
+
+def _order(value):
+    return Order(value) if isinstance(value, dict) else value
+
+
+class Order(Record):
+    __slots__ = ()
+    payload_key = 'orders'
+
+    id = Field()
+    status = Field(default='')
+    customer_name = Field(default='')
+    customer_email = Field(default='')
+    customer_phone = Field(default='')
+    product_name = Field(default='')
+    product_description = Field(default='')
+    quantity = Field(convert=to_int)
+    total_amount = Field(convert=to_decimal)
+    created_at = Field(convert=to_datetime)
+    updated_at = Field(convert=to_datetime)
+
+
+class User(Record):
+    __slots__ = ()
+    payload_key = 'users'
+
+    id = Field()
+    name = Field(default='')
+    email = Field(default='')
+    phone = Field(default='')
+    role = Field(default='')
+    created_at = Field(convert=to_datetime)
+
+
+class Product(Record):
+    __slots__ = ()
+    payload_key = 'products'
+
+    id = Field()
+    name = Field(default='')
+    description = Field(default='')
+    type = Field(default='')
+    price = Field(convert=to_decimal)
+    weight = Field()
+    stock_quantity = Field(convert=to_int)
+
+
+class Delivery(Record):
+    __slots__ = ()
+    payload_key = 'deliveries'
+
+    id = Field()
+    status = Field(default='')
+    order = Field(convert=_order)
+    delivery_person = Field()
+    current_location = Field()
+    created_at = Field(convert=to_datetime)
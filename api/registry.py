@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ClientRegistry:
+    """Um cliente EcoGás por sessão Django, com o token do respetivo usuário
+
+    Os clientes partilham o pool HTTP, o cache e os circuit breakers do
+    cliente base; só o token é individual. Clientes inativos há mais de
+    ``idle_timeout`` segundos ou além de ``max_clients`` são descartados.
+    """
+
+    def __init__(self, base_client, max_clients=1000, idle_timeout=3600):
+        self.base_client = base_client
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_key, token=None):
+        """Cliente da sessão; é recriado a partir do token se o worker ainda não o conhecer"""
+        if not session_key:
+            return self.base_client.for_token(token)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.get(session_key)
+            if entry is not None and (token is None or entry[0].token == token):
+                client = entry[0]
+                self._clients[session_key] = (client, now)
+                self._clients.move_to_end(session_key)
+                return client
+            client = self.base_client.for_token(token)
+            self._store(session_key, client, now)
+            return client
+
+    def register(self, session_key, client):
+        """Associa um cliente já autenticado a uma sessão (após o login)"""
+        if not session_key:
+            return
+        with self._lock:
+            self._store(session_key, client, time.monotonic())
+
+    def discard(self, session_key):
+        with self._lock:
+            self._clients.pop(session_key, None)
+
+    def _store(self, session_key, client, now):
+        self._clients[session_key] = (client, now)
+        self._clients.move_to_end(session_key)
+        while self._clients:
+            oldest_key, (_, last_used) = next(iter(self._clients.items()))
+            if len(self._clients) <= self.max_clients and now - last_used <= self.idle_timeout:
+                break
+            del self._clients[oldest_key]
+
+    def __len__(self):
+        return len(self._clients)
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+from .cache import endpoint_path
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    """Última resposta boa de cada endpoint, guardada em disco
+
+    Cada endpoint fica num ficheiro ``<sha1>.snap`` com o JSON comprimido
+    (zlib). Os ficheiros só são lidos no primeiro ``get`` (não no import,
+    para os comandos do manage.py e o master do gunicorn não pagarem a
+    leitura), por isso um worker novo tem logo dados para mostrar enquanto
+    o upstream acorda. Depois da primeira resposta do upstream neste
+    processo (``upstream_seen``) o cliente só volta a servi-los com o
+    upstream em baixo.
+
+    As chaves dos endpoints de admin incluem o hash do token, e cada login
+    novo cria ficheiros novos: os que passam de ``max_age`` são apagados e
+    acima de ``max_files`` vão-se os mais antigos.
+    """
+
+    def __init__(self, directory, max_age=86400, save_interval=60, max_files=500):
+        self.directory = directory
+        self.max_age = max_age
+        self.save_interval = save_interval
+        self.max_files = max_files
+        self._entries = {}
+        self._last_write = {}
+        self._refreshing = set()
+        self.upstream_seen = False
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _path(self, endpoint):
+        name = hashlib.sha1(endpoint.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{name}.snap')
+
+    def _files(self):
+        """[(mtime, path)] dos ficheiros ``.snap``, do mais recente para o mais antigo"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        files = []
+        for name in names:
+            if not name.endswith('.snap'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        files.sort(reverse=True)
+        return files
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self.load_all()
+                self._loaded = True
+
+    def load_all(self):
+        """Carrega os snapshots do disco que ainda não passaram de ``max_age``
+
+        Apaga os expirados e os que ficam além de ``max_files``. Entradas já
+        em memória mais recentes que as do disco são mantidas.
+        """
+        loaded = removed = 0
+        now = time.time()
+        for index, (mtime, path) in enumerate(self._files()):
+            # O mtime é a hora da escrita: os expirados saem sem descomprimir
+            if index >= self.max_files or now - mtime > self.max_age:
+                removed += self._remove(path)
+                continue
+            try:
+                with open(path, 'rb') as handle:
+                    record = json.loads(zlib.decompress(handle.read()))
+                endpoint, saved_at, payload = record['endpoint'], record['saved_at'], record['payload']
+            except (OSError, ValueError, KeyError, zlib.error):
+                continue
+            if now - saved_at > self.max_age:
+                removed += self._remove(path)
+                continue
+            with self._lock:
+                current = self._entries.get(endpoint)
+                if current is None or current[0] < saved_at:
+                    self._entries[endpoint] = (saved_at, payload)
+            loaded += 1
+        if loaded or removed:
+            logger.info("snapshot_loaded entries=%s removed=%s dir=%s", loaded, removed, self.directory,
+                        extra={'event': 'snapshot_loaded', 'entries': loaded, 'removed': removed})
+        return loaded
+
+    def prune(self):
+        """Apaga os ficheiros além de ``max_files`` (os mais antigos) e os expirados"""
+        now = time.time()
+        removed = 0
+        for index, (mtime, path) in enumerate(self._files()):
+            if index >= self.max_files or now - mtime > self.max_age:
+                removed += self._remove(path)
+        return removed
+
+    def mark_upstream_seen(self):
+        """O upstream respondeu neste processo: acabou o arranque a frio"""
+        self.upstream_seen = True
+
+    def get(self, endpoint):
+        """(saved_at, payload) guardado para o endpoint ou None"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._entries.get(endpoint)
+            if entry is None:
+                return None
+            saved_at, payload = entry
+            if time.time() - saved_at > self.max_age:
+                del self._entries[endpoint]
+                return None
+            return entry
+
+    def save(self, endpoint, payload):
+        """Guarda a resposta; o ficheiro só é reescrito a cada ``save_interval`` segundos"""
+        now = time.time()
+        with self._lock:
+            self._entries[endpoint] = (now, payload)
+            if now - self._last_write.get(endpoint, 0) < self.save_interval:
+                return
+            self._last_write[endpoint] = now
+        try:
+            data = zlib.compress(json.dumps(
+                {'endpoint': endpoint, 'saved_at': now, 'payload': payload},
+                separators=(',', ':'), default=str,
+            ).encode('utf-8'))
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(endpoint)
+            created = not os.path.exists(path)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as handle:
+                handle.write(data)
+            os.replace(tmp_path, path)
+            if created:
+                # Só um ficheiro novo pode passar o limite
+                self.prune()
+        except (OSError, TypeError, ValueError):
+            logger.warning("snapshot_write_failed endpoint=%s", endpoint,
+                           extra={'event': 'snapshot_write_failed', 'endpoint': endpoint})
+
+    def discard(self, *endpoints):
+        """Deixa de servir os endpoints indicados (e variantes com query string); sem argumentos, todos"""
+        # Carrega antes, senão a leitura preguiçosa traria de volta o que se descartou
+        self._ensure_loaded()
+        with self._lock:
+            if not endpoints:
+                self._entries.clear()
+                return
+            for key in list(self._entries):
+                if endpoint_path(key) in endpoints:
+                    del self._entries[key]
+
+    def begin_refresh(self, endpoint):
+        """True se não houver já uma atualização em curso para o endpoint"""
+        with self._lock:
+            if endpoint in self._refreshing:
+                return False
+            self._refreshing.add(endpoint)
+            return True
+
+    def end_refresh(self, endpoint):
+        with self._lock:
+            self._refreshing.discard(endpoint)
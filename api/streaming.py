@@ -0,0 +1,118 @@
+"""Leitura incremental de listas JSON grandes
+
+Em vez de carregar a resposta inteira e fazer ``json.loads``, os itens do
+array são decodificados um a um à medida que os blocos chegam da rede.
+"""
+
+import codecs
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+_NUMBER_CHARS = '0123456789.eE+-'
+
+# Quanto texto já consumido deixamos acumular antes de compactar o buffer
+_COMPACT_AT = 1 << 16
+
+
+class _Buffer:
+    """Texto ainda não consumido, alimentado por um iterador de blocos de bytes"""
+
+    def __init__(self, chunks, encoding='utf-8'):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Lê mais um bloco; devolve False quando a fonte terminou"""
+        if self.eof:
+            return False
+        if self.pos > _COMPACT_AT:
+            self.text = self.text[self.pos:]
+            self.pos = 0
+        for chunk in self.chunks:
+            if chunk:
+                self.text += self.decoder.decode(chunk)
+                return True
+        self.text += self.decoder.decode(b'', final=True)
+        self.eof = True
+        return False
+
+    def peek(self):
+        """Próximo caractere não branco (sem o consumir); '' no fim"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f'JSON inválido: esperado {char!r} na posição {self.pos}')
+        self.pos += 1
+
+    def value(self):
+        """Decodifica o próximo valor JSON completo, lendo mais blocos se for preciso"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # Um número no fim do buffer pode continuar no bloco seguinte ("1" + ".5", "1." + "5")
+            if not self.eof and self._number_may_continue(value, end):
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+    def _number_may_continue(self, value, end):
+        """True se ``value`` for um número e o resto do buffer ainda puder fazer parte dele"""
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return False
+        for index in range(end, len(self.text)):
+            if self.text[index] not in _NUMBER_CHARS:
+                return False
+        return True
+
+
+def iter_json_array(chunks, key=None, encoding='utf-8'):
+    """Gera os itens de uma lista JSON a partir de blocos de bytes
+
+    Aceita uma lista no topo ou, com ``key``, a lista em ``{"<key>": [...]}``.
+    Se o formato não for nenhum destes, não gera nada.
+    """
+    buf = _Buffer(chunks, encoding)
+    first = buf.peek()
+    if first == '{' and key:
+        buf.pos += 1
+        while True:
+            if buf.peek() == '}':
+                return
+            name = buf.value()
+            buf.expect(':')
+            if name == key and buf.peek() == '[':
+                break
+            buf.value()
+            if buf.peek() == ',':
+                buf.pos += 1
+    elif first != '[':
+        return
+
+    buf.expect('[')
+    if buf.peek() == ']':
+        return
+    while True:
+        yield buf.value()
+        separator = buf.peek()
+        buf.pos += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f'JSON inválido: esperado "," ou "]" na posição {buf.pos - 1}')
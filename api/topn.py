@@ -0,0 +1,45 @@
+import heapq
+import itertools
+
+
+def order_recency(record):
+    """Chave de ordenação por created_at (ISO 8601 compara bem como texto)"""
+    if not isinstance(record, dict):
+        return ''
+    return str(record.get('created_at') or '')
+
+
+class TopN:
+    """Os ``n`` maiores itens de um fluxo, guardando só ``n`` em memória
+
+    Cada ``offer`` custa O(log n), por isso a lista completa pode ser lida em
+    streaming sem nunca ser materializada.
+    """
+
+    def __init__(self, n, key):
+        self.n = n
+        self.key = key
+        self._heap = []
+        self._seq = itertools.count()
+
+    def offer(self, item):
+        if self.n <= 0:
+            return
+        # O contador desempata chaves iguais sem comparar os itens
+        entry = (self.key(item), next(self._seq), item)
+        if len(self._heap) < self.n:
+            heapq.heappush(self._heap, entry)
+        elif entry[0] > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def extend(self, items):
+        for item in items:
+            self.offer(item)
+        return self
+
+    def items(self):
+        """Do maior para o menor"""
+        return [item for _, _, item in sorted(self._heap, reverse=True)]
+
+    def __len__(self):
+        return len(self._heap)
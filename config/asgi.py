@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Importado depois do setup do Django (o módulo usa os modelos)
+from dashboard.live import DisconnectWatcher  # noqa: E402
+
+application = DisconnectWatcher(django_application)
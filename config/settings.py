@@ -1,282 +1,26 @@
 """
 Django settings for config project.
 
-Generated by 'django-admin startproject' using Django 5.2.7.
-
-For more information on this file, see
-https://docs.djangoproject.com/en/5.2/topics/settings/
-
-For the full list of settings and their values, see
-https://docs.djangoproject.com/en/5.2/ref/settings/
-
-
-from pathlib import Path
-
-# Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
-
-
-# Quick-start development settings - unsuitable for production
-# See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
-
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-uttg+o2ufdnq@d0pxvu4r*bla7wvdp&57xtpuu=_#9obxg^3ly'
-
-# SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
-
-ALLOWED_HOSTS = []
-
-
-# Application definition
-
-INSTALLED_APPS = [
-    'django.contrib.admin',
-    'django.contrib.auth',
-    'django.contrib.contenttypes',
-    'django.contrib.sessions',
-    'django.contrib.messages',
-    'django.contrib.staticfiles',
-]
-
-MIDDLEWARE = [
-    'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
-]
-
-ROOT_URLCONF = 'config.urls'
-
-TEMPLATES = [
-    {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
-        'APP_DIRS': True,
-        'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-            ],
-        },
-    },
-]
-
-WSGI_APPLICATION = 'config.wsgi.application'
-
-
-# Database
-# https://docs.djangoproject.com/en/5.2/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
-
-
-# Password validation
-# https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
-
-AUTH_PASSWORD_VALIDATORS = [
-    {
-        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
-    },
-]
-
-
-# Internationalization
-# https://docs.djangoproject.com/en/5.2/topics/i18n/
-
-LANGUAGE_CODE = 'en-us'
-
-TIME_ZONE = 'UTC'
-
-USE_I18N = True
-
-USE_TZ = True
-
-
-# Static files (CSS, JavaScript, Images)
-# https://docs.djangoproject.com/en/5.2/howto/static-files/
-
-STATIC_URL = 'static/'
-
-# Default primary key field type
-# https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
-
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+Módulo único: tudo o que muda entre ambientes vem de variáveis de ambiente
+(ou de um .env local). Importado uma vez no master do gunicorn (preload_app).
+"""
 
 import os
 from pathlib import Path
-from dotenv import load_dotenv
-
-load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-uttg+o2ufdnq@d0pxvu4r*bla7wvdp&57xtpuu=_#9obxg^3ly')
-
-# DEBUG deve ser False em produção
-DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
-
-# Adicione seu domínio do Render
-ALLOWED_HOSTS = [
-    'ecogas-django-admin.onrender.com',
-    'localhost',
-    '127.0.0.1'
-]
-
-# EcoGás API Configuration
-ECO_GAS_API_URL = os.getenv('ECO_GAS_API_URL', 'https://api-ecogas.onrender.com')
+# Variáveis de um .env local; em produção vêm do ambiente do Render
+if (BASE_DIR / '.env').exists():
+    from dotenv import load_dotenv
 
-INSTALLED_APPS = [
-    'django.contrib.admin',
-    'django.contrib.auth',
-    'django.contrib.contenttypes',
-    'django.contrib.sessions',
-    'django.contrib.messages',
-    'django.contrib.staticfiles',
-    'dashboard',
-    'api',
-]
-
-MIDDLEWARE = [
-    'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
-]
-
-ROOT_URLCONF = 'config.urls'
-
-TEMPLATES = [
-    {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
-        'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.debug',
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-            ],
-        },
-    },
-]
-
-WSGI_APPLICATION = 'config.wsgi.application'
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
-
-AUTH_PASSWORD_VALIDATORS = [
-    {
-        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
-    },
-]
-
-LANGUAGE_CODE = 'pt-ao'
-TIME_ZONE = 'Africa/Luanda'
-USE_I18N = True
-USE_TZ = True
-
-STATIC_URL = '/static/'
-STATICFILES_DIRS = [BASE_DIR / 'static']
-STATIC_ROOT = BASE_DIR / 'staticfiles'
-
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-
-LOGIN_URL = '/login/'
-LOGIN_REDIRECT_URL = '/dashboard/'
-LOGOUT_REDIRECT_URL = '/login/'
-
-# WhiteNoise para arquivos estáticos
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
-
-# Configurações de segurança para produção
-if not DEBUG:
-    SECURE_BROWSER_XSS_FILTER = True
-    SECURE_CONTENT_TYPE_NOSNIFF = True
-    SECURE_SSL_REDIRECT = True
-    SESSION_COOKIE_SECURE = True
-    CSRF_COOKIE_SECURE = True
-    SECURE_HSTS_SECONDS = 31536000  # 1 year
-    SECURE_HSTS_INCLUDE_SUBDOMAINS = True
-    SECURE_HSTS_PRELOAD = True
-    SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
-
-# Configurações de sessão
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
-SESSION_COOKIE_AGE = 1209600  # 2 semanas
-SESSION_SAVE_EVERY_REQUEST = True
-
-# Logging para debug
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
-        },
-    },
-    'root': {
-        'handlers': ['console'],
-        'level': 'INFO',
-    },
-    'loggers': {
-        'django': {
-            'handlers': ['console'],
-            'level': 'INFO',
-            'propagate': False,
-        },
-    },
-}
-
-Django settings for config project.
-"""
-
-from pathlib import Path
-
-BASE_DIR = Path(__file__).resolve().parent.parent
+    load_dotenv(BASE_DIR / '.env')
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-uttg+o2ufdnq@d0pxvu4r*bla7wvdp&57xtpuu=_#9obxg^3ly'
+SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-uttg+o2ufdnq@d0pxvu4r*bla7wvdp&57xtpuu=_#9obxg^3ly')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = False
+DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 
 ALLOWED_HOSTS = [
     'ecogas-django-admin.onrender.com',
@@ -286,7 +30,7 @@ ALLOWED_HOSTS = [
 ]
 
 # EcoGás API Configuration
-ECO_GAS_API_URL = 'https://api-ecogas.onrender.com'
+ECO_GAS_API_URL = os.getenv('ECO_GAS_API_URL', 'https://api-ecogas.onrender.com')
 
 # Application definition
 INSTALLED_APPS = [
@@ -303,6 +47,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'dashboard.middleware.ViewMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -317,8 +62,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Templates compilados uma vez por processo (no master, com o preload do gunicorn)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -388,10 +139,52 @@ SECURE_HSTS_INCLUDE_SUBDOMAINS = True
 SECURE_HSTS_PRELOAD = True
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
+# Cache partilhado entre os workers do gunicorn (sobrevive a reinícios)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_DIR', str(BASE_DIR / '.cache' / 'django')),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+        },
+    },
+}
+
+# Cache das respostas da API EcoGás (alias de CACHES; None desliga o nível partilhado)
+ECO_GAS_SHARED_CACHE = 'default'
+# Diretório de locks para um só worker ir ao upstream por endpoint (None desliga)
+ECO_GAS_FETCH_LOCK_DIR = os.getenv('ECO_GAS_FETCH_LOCK_DIR', str(BASE_DIR / '.cache' / 'locks'))
+# Espera máxima (s) por esse lock; depois o worker vai ao upstream sem lock, com uma só tentativa
+ECO_GAS_FETCH_LOCK_TIMEOUT = 5
+# Segundos durante os quais uma falha do upstream é devolvida aos workers que esperavam pelo mesmo fetch
+ECO_GAS_FETCH_FAILURE_TTL = 5
+# Estado de cada worker para o /metrics do Prometheus (None expõe só o processo que responde)
+ECO_GAS_PROMETHEUS_DIR = os.getenv('ECO_GAS_PROMETHEUS_DIR', str(BASE_DIR / '.cache' / 'prometheus'))
+# O /metrics exige "Authorization: Bearer <token>"; sem token só existe com DEBUG
+ECO_GAS_METRICS_TOKEN = os.getenv('ECO_GAS_METRICS_TOKEN')
+if ECO_GAS_METRICS_TOKEN:
+    # O Prometheus faz scrape direto ao worker, sem passar pelo proxy HTTPS
+    SECURE_REDIRECT_EXEMPT = [r'^metrics$']
+# Última resposta boa de cada endpoint, servida (desatualizada) enquanto o upstream acorda (None desliga)
+ECO_GAS_SNAPSHOT_DIR = os.getenv('ECO_GAS_SNAPSHOT_DIR', str(BASE_DIR / '.cache' / 'snapshots'))
+ECO_GAS_SNAPSHOT_MAX_AGE = 86400  # snapshots mais antigos são ignorados
+ECO_GAS_SNAPSHOT_SAVE_INTERVAL = 60  # intervalo mínimo entre escritas em disco do mesmo endpoint
+ECO_GAS_SNAPSHOT_MAX_FILES = 500  # acima disto os snapshots mais antigos são apagados (há um por token e endpoint)
+# Idade máxima (s) do espelho local (manage.py sync_ecogas) para as listas o lerem em vez da API; 0 desliga
+ECO_GAS_MIRROR_MAX_AGE = int(os.getenv('ECO_GAS_MIRROR_MAX_AGE', 120))
+# Linhas de tabela renderizadas guardadas por worker ({% rowcache %})
+ECO_GAS_FRAGMENT_CACHE_MAX_ENTRIES = 5000
+# Atualização de status em lote: PATCHes em paralelo e pedidos por lote
+ECO_GAS_BULK_MAX_WORKERS = 8
+ECO_GAS_BULK_MAX_ITEMS = 500
+
 # Configurações de sessão
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Leituras pelo cache; a BD só é escrita quando a sessão muda ou a cada ECO_GAS_SESSION_REFRESH_INTERVAL
+SESSION_ENGINE = 'dashboard.session_backend'
 SESSION_COOKIE_AGE = 1209600  # 2 semanas
 SESSION_SAVE_EVERY_REQUEST = True
+ECO_GAS_SESSION_REFRESH_INTERVAL = 3600
 
 # Logging para debug
 LOGGING = {
@@ -424,6 +217,11 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'api': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
@@ -1,3 +1,13 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import UserSession
+
+
+@admin.register(UserSession)
+class UserSessionAdmin(admin.ModelAdmin):
+    """Auditoria de logins (gravada em lote por dashboard.audit)"""
+    list_display = ('user', 'login_time', 'ip_address')
+    list_filter = ('login_time',)
+    search_fields = ('user__username', 'ip_address')
+    date_hierarchy = 'login_time'
+    list_select_related = ('user',)
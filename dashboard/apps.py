@@ -3,4 +3,23 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard'
-    verbose_name = 'Dashboard EcoGás'
\ No newline at end of file
+    verbose_name = 'Dashboard EcoGás'
+
+    def ready(self):
+        from django.contrib.auth.signals import user_logged_in
+        from django.contrib.sessions.models import Session
+        from django.db.models.signals import post_save
+
+        from .audit import record_login
+
+        post_save.connect(_count_session_write, sender=Session, dispatch_uid='ecogas_session_writes')
+        # O last_login passa a ser gravado em lote junto com o UserSession, fora do request
+        user_logged_in.disconnect(dispatch_uid='update_last_login')
+        user_logged_in.connect(record_login, dispatch_uid='ecogas_login_audit')
+
+
+def _count_session_write(sender, created, **kwargs):
+    """Cada gravação de sessão na BD conta para ecogas_session_writes_total"""
+    from api.advanced_hybrid_client import advanced_hybrid_api
+
+    advanced_hybrid_api.prometheus.inc('ecogas_session_writes_total', {'op': 'create' if created else 'update'})
\ No newline at end of file
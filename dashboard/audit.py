@@ -0,0 +1,132 @@
+"""Registo de logins em UserSession fora do caminho do request
+
+Os eventos de login vão para uma fila em memória e uma thread de fundo
+grava-os com ``bulk_create`` em lotes, atualizando também o ``last_login``
+dos usuários com um único ``bulk_update`` por lote.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .models import UserSession
+
+logger = logging.getLogger(__name__)
+
+
+def client_ip(request):
+    """IP do cliente (primeiro salto do X-Forwarded-For atrás do proxy do Render)"""
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR') or '0.0.0.0'
+
+
+class LoginAuditQueue:
+    """Fila de eventos de login gravados em lotes por uma thread de fundo"""
+
+    def __init__(self, batch_size=100, flush_interval=2.0, max_pending=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.recorded = 0
+        self.dropped = 0
+
+    def record(self, user, ip_address, when=None):
+        """Enfileira um login; nunca bloqueia o request"""
+        try:
+            self._queue.put_nowait((user.pk, ip_address, when or timezone.now()))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logger.warning('login audit queue cheia, evento descartado (user=%s)', user.pk)
+            return
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        # Sempre com o lock: a thread decide sair sob o mesmo lock (ver _run)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='login-audit', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval * 10)
+            except queue.Empty:
+                # Sem logins há algum tempo: a thread termina e volta a nascer no próximo.
+                # Um evento que chegue agora fica na fila: volta-se a ver sob o lock do _ensure_thread.
+                with self._lock:
+                    if not self._queue.empty():
+                        continue
+                    self._thread = None
+                connection.close()
+                return
+            # Junta o que chegar durante o intervalo num só lote
+            batch = [first] + self._drain(self.batch_size - 1, self.flush_interval)
+            self._write(batch)
+
+    def _drain(self, limit, wait):
+        events = []
+        deadline = time.monotonic() + wait
+        while len(events) < limit:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                events.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return events
+
+    def flush(self):
+        """Grava já tudo o que está pendente (usado ao terminar o processo)"""
+        batch = self._drain_nowait()
+        if batch:
+            self._write(batch)
+
+    def _drain_nowait(self):
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _write(self, batch):
+        with self._flush_lock:
+            close_old_connections()
+            try:
+                UserSession.objects.bulk_create(
+                    [UserSession(user_id=user_id, ip_address=ip, login_time=when) for user_id, ip, when in batch],
+                    batch_size=self.batch_size,
+                )
+                last_login = {}
+                for user_id, _, when in batch:
+                    last_login[user_id] = max(when, last_login.get(user_id, when))
+                users = list(User.objects.filter(pk__in=last_login).only('pk', 'last_login'))
+                for user in users:
+                    user.last_login = last_login[user.pk]
+                User.objects.bulk_update(users, ['last_login'])
+                self.recorded += len(batch)
+            except Exception:
+                logger.exception('falha ao gravar %s logins em UserSession', len(batch))
+
+
+login_audit = LoginAuditQueue()
+atexit.register(login_audit.flush)
+
+
+def record_login(sender, request, user, **kwargs):
+    """Receiver de user_logged_in: substitui o update_last_login síncrono do Django"""
+    login_audit.record(user, client_ip(request) if request is not None else '0.0.0.0')
@@ -0,0 +1,182 @@
+"""Deltas versionados das listas da API (pedidos e entregas)
+
+Para cada entidade guarda-se o hash e a versão em que cada registo mudou
+pela última vez, mais as remoções recentes. O cliente envia o token da
+versão que já tem e recebe só o que foi adicionado, alterado ou removido
+desde então. O estado vive no cache partilhado, por isso qualquer worker
+do gunicorn responde ao mesmo token.
+"""
+
+import secrets
+import threading
+from contextlib import contextmanager
+
+from api.records import unwrap
+
+from .sync import content_hash
+
+STATE_KEY_PREFIX = 'ecogas:delta:'
+
+# entidade -> (método do cliente, chave da lista na resposta)
+TRACKED = {
+    'orders': ('get_all_orders', 'orders'),
+    'deliveries': ('get_live_deliveries', 'deliveries'),
+}
+
+
+def _new_state():
+    return {
+        # Muda quando o estado se perde (reinício sem cache partilhado, despejo):
+        # tokens de outra época recebem a lista completa
+        'epoch': secrets.token_hex(4),
+        'version': 0,
+        'floor': 0,
+        'source': None,
+        'items': {},
+        'removed': {},
+    }
+
+
+def _record_id(record):
+    if isinstance(record, dict) and record.get('id') is not None:
+        return str(record['id'])
+    return None
+
+
+class DeltaTracker:
+    """Snapshot versionado de uma entidade"""
+
+    def __init__(self, entity, store=None, lock=None, max_removed=1000):
+        self.entity = entity
+        self.key = STATE_KEY_PREFIX + entity
+        self.store = store
+        self.lock = lock
+        self.max_removed = max_removed
+        self._local = None
+        self._seen = (None, None)
+        self._mutex = threading.Lock()
+
+    def _load(self):
+        if self.store is not None:
+            try:
+                return self.store.get(self.key)
+            except Exception:
+                pass
+        return self._local
+
+    def _save(self, state):
+        self._local = state
+        if self.store is not None:
+            try:
+                self.store.set(self.key, state, timeout=None)
+            except Exception:
+                pass
+
+    @contextmanager
+    def _locked(self):
+        with self._mutex:
+            if self.lock is None:
+                yield
+            else:
+                with self.lock(self.key):
+                    yield
+
+    def update(self, records):
+        """Aplica a lista atual ao snapshot; a versão só avança se algo mudou"""
+        seen_records, seen_source = self._seen
+        if records is seen_records:
+            # Mesmo payload do cache de respostas: só é preciso confirmar que
+            # nenhum outro worker aplicou entretanto uma lista diferente
+            state = self._load()
+            if state is not None and state['source'] == seen_source:
+                return state
+
+        hashes = {}
+        for record in records:
+            key = _record_id(record)
+            if key is not None:
+                hashes[key] = content_hash(record)
+
+        with self._locked():
+            state = self._load() or _new_state()
+            version = state['version'] + 1
+            items, removed = state['items'], state['removed']
+            dirty = False
+            for key, digest in hashes.items():
+                current = items.get(key)
+                if current is None or current[0] != digest:
+                    items[key] = (digest, version)
+                    removed.pop(key, None)
+                    dirty = True
+            for key in [key for key in items if key not in hashes]:
+                del items[key]
+                removed[key] = version
+                dirty = True
+            if dirty or state['source'] is None:
+                if dirty:
+                    state['version'] = version
+                state['source'] = secrets.token_hex(4)
+                self._trim(state)
+                self._save(state)
+            self._seen = (records, state['source'])
+        return state
+
+    def _trim(self, state):
+        removed = state['removed']
+        if len(removed) <= self.max_removed:
+            return
+        # Remoções esquecidas deixam de poder ser enviadas: tokens anteriores a elas fazem reset
+        oldest = sorted(removed.items(), key=lambda item: item[1])[:len(removed) - self.max_removed]
+        for key, _ in oldest:
+            del removed[key]
+        state['floor'] = max(state['floor'], oldest[-1][1])
+
+    def token(self, state):
+        return f"{state['epoch']}.{state['version']}"
+
+    def _since(self, token, state):
+        """Versão pedida, ou None se for preciso enviar a lista completa"""
+        epoch, _, version = (token or '').partition('.')
+        if epoch != state['epoch']:
+            return None
+        try:
+            version = int(version)
+        except ValueError:
+            return None
+        if version < state['floor'] or version > state['version']:
+            return None
+        return version
+
+    def changes(self, records, token=None):
+        """Corpo da resposta com o que mudou desde ``token`` (ou tudo, com reset)"""
+        state = self.update(records)
+        since = self._since(token, state)
+        if since is None:
+            changed = [record for record in records if _record_id(record) is not None]
+            removed = []
+        else:
+            items = state['items']
+            changed = [
+                record for record in records
+                if (key := _record_id(record)) is not None and items[key][1] > since
+            ]
+            removed = [key for key, version in state['removed'].items() if version > since]
+        return {
+            'version': self.token(state),
+            'reset': since is None,
+            'total': len(state['items']),
+            'changed': changed,
+            'removed': removed,
+        }
+
+
+def entity_changes(tracker, client, token=None):
+    """Busca a entidade e devolve (success, corpo do delta ou erro)"""
+    method_name, key = TRACKED[tracker.entity]
+    success, payload = getattr(client, method_name)()
+    if not success:
+        return False, payload
+    records = unwrap(payload, key)
+    if records is None:
+        return False, {'error': 'Formato de resposta inesperado'}
+    return True, tracker.changes(records, token)
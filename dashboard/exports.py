@@ -0,0 +1,95 @@
+"""Exportação em streaming (CSV e JSONL) das listas da API"""
+
+import csv
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+
+from .filters import DELIVERY_SEARCH_FIELDS, ORDER_SEARCH_FIELDS, filter_items, lookup
+
+# entidade -> método de streaming do cliente, colunas do CSV e campos de busca
+EXPORTS = {
+    'orders': {
+        'method': 'iter_all_orders',
+        'columns': (
+            'id', 'status', 'customer_name', 'customer_email', 'customer_phone',
+            'product_name', 'quantity', 'total_amount', 'created_at',
+        ),
+        'search_fields': ORDER_SEARCH_FIELDS,
+    },
+    'users': {
+        'method': 'iter_all_users',
+        'columns': ('id', 'name', 'email', 'phone', 'role', 'created_at'),
+        'search_fields': ('id', 'name', 'email', 'phone'),
+    },
+    'deliveries': {
+        'method': 'iter_live_deliveries',
+        'columns': (
+            'id', 'status', 'order.id', 'order.customer_name', 'order.customer_phone',
+            'delivery_person.name', 'delivery_person.phone', 'created_at',
+        ),
+        'search_fields': DELIVERY_SEARCH_FIELDS,
+    },
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class _Echo:
+    """Pseudo-ficheiro: o csv.writer devolve a linha em vez de a guardar"""
+
+    def write(self, value):
+        return value
+
+
+def _column(record, path):
+    value = lookup(record, path)
+    return '' if value is None else value
+
+
+def iter_csv(records, columns):
+    writer = csv.writer(_Echo())
+    # BOM para o Excel abrir acentos corretamente
+    yield '\ufeff' + writer.writerow(columns)
+    for record in records:
+        yield writer.writerow([_column(record, column) for column in columns])
+
+
+def iter_jsonl(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str) + '\n'
+
+
+def export_rows(records, entity, fmt, query):
+    """Gerador de linhas já filtradas, sem nunca materializar a lista"""
+    spec = EXPORTS[entity]
+    filtered = filter_items(records, query, spec['search_fields'])
+    if fmt == 'csv':
+        return iter_csv(filtered, spec['columns'])
+    return iter_jsonl(filtered)
+
+
+async def aiter_rows(rows, batch_size=500):
+    """Versão async do gerador de linhas, para servir a exportação sob ASGI
+
+    Sob ASGI o Django lê um iterador síncrono inteiro para memória antes de
+    enviar o primeiro byte. Aqui as linhas são lidas ``batch_size`` de cada
+    vez numa thread do pool e enviadas à medida que chegam.
+    """
+    rows = iter(rows)
+    next_batch = sync_to_async(lambda: list(itertools.islice(rows, batch_size)), thread_sensitive=False)
+    try:
+        while True:
+            batch = await next_batch()
+            if not batch:
+                return
+            yield ''.join(batch)
+    finally:
+        close = getattr(rows, 'close', None)
+        if close is not None:
+            # Fecha a ligação ao upstream se o download for interrompido
+            await sync_to_async(close, thread_sensitive=False)()
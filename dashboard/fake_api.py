@@ -0,0 +1,306 @@
+"""Servidor local que imita a API EcoGás, para medir desempenho sem ir ao Render
+
+Responde a /auth/login, /admin/stats, /admin/orders, /admin/users, /products,
+/admin/deliveries/live e PATCH /orders/<id>/status (os de admin e o PATCH
+exigem o token devolvido pelo login), com latência, taxa de
+erro, arranque a frio e tamanho dos payloads configuráveis. Os dados são
+gerados de forma determinística (``seed``) e codificados uma única vez.
+"""
+
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .filters import ORDER_STATUSES
+
+# Os mesmos que o template de entregas conhece
+DELIVERY_STATUSES = ('pending', 'accepted', 'on_route', 'delivered')
+TOKEN_PREFIX = 'fake-'
+
+
+def generate_data(orders=1000, users=100, products=20, deliveries=50, padding=0, seed=1):
+    """Payloads no formato da API real; ``padding`` acrescenta N bytes a cada registo"""
+    rnd = random.Random(seed)
+    notes = 'x' * padding
+    now = datetime(2025, 10, 1, tzinfo=timezone.utc)
+
+    def iso(offset_minutes):
+        return (now + timedelta(minutes=offset_minutes)).isoformat().replace('+00:00', 'Z')
+
+    product_list = [
+        {
+            'id': index,
+            'name': f'Botija {weight}kg',
+            'description': f'Gás butano {weight}kg',
+            'type': 'butano',
+            'price': f'{1000 + weight * 250}.00',
+            'weight': weight,
+            'stock_quantity': rnd.randint(0, 500),
+        }
+        for index, weight in enumerate([6, 12, 45] * max(1, products // 3), start=1)
+    ][:products]
+    user_list = [
+        {
+            'id': index,
+            'name': f'Cliente {index}',
+            'email': f'cliente{index}@ecogas.test',
+            'phone': f'+2449{rnd.randint(10000000, 99999999)}',
+            'role': 'admin' if index == 1 else rnd.choice(('client', 'client', 'courier')),
+            'created_at': iso(-rnd.randint(0, 60 * 24 * 365)),
+        }
+        for index in range(1, users + 1)
+    ]
+    order_list = []
+    for index in range(1, orders + 1):
+        customer = user_list[rnd.randrange(len(user_list))] if user_list else {}
+        product = product_list[rnd.randrange(len(product_list))] if product_list else {}
+        quantity = rnd.randint(1, 3)
+        created = -rnd.randint(0, 60 * 24 * 180)
+        order = {
+            'id': index,
+            'status': rnd.choice(ORDER_STATUSES),
+            'customer_name': customer.get('name', ''),
+            'customer_email': customer.get('email', ''),
+            'customer_phone': customer.get('phone', ''),
+            'product_name': product.get('name', ''),
+            'product_description': product.get('description', ''),
+            'quantity': quantity,
+            'total_amount': f"{float(product.get('price', 0)) * quantity:.2f}",
+            'created_at': iso(created),
+            'updated_at': iso(created + rnd.randint(0, 600)),
+        }
+        if notes:
+            order['notes'] = notes
+        order_list.append(order)
+    delivery_list = [
+        {
+            'id': index,
+            'status': rnd.choice(DELIVERY_STATUSES),
+            'order': order_list[rnd.randrange(len(order_list))] if order_list else None,
+            'delivery_person': {'name': f'Estafeta {index}', 'phone': f'+2449{rnd.randint(10000000, 99999999)}'},
+            'current_location': {'lat': -8.8 + rnd.random() / 10, 'lng': 13.2 + rnd.random() / 10},
+            'address': f'Rua {index}, Luanda',
+            'created_at': iso(-rnd.randint(0, 600)),
+        }
+        for index in range(1, deliveries + 1)
+    ]
+    stats = {
+        'total_orders': len(order_list),
+        'total_users': len(user_list),
+        'total_products': len(product_list),
+        'active_deliveries': len(delivery_list),
+        'pending_orders': sum(1 for order in order_list if order['status'] == 'pending'),
+        'total_revenue': f"{sum(float(order['total_amount']) for order in order_list):.2f}",
+    }
+    return {
+        'orders': order_list,
+        'users': user_list,
+        'products': product_list,
+        'deliveries': delivery_list,
+        'stats': stats,
+    }
+
+
+class FakeEcoGasAPI:
+    """Servidor HTTP com os endpoints da API EcoGás usados pelo dashboard"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=50, jitter_ms=10, error_rate=0.0,
+                 cold_start_ms=0, idle_timeout=900, support_limit=False, seed=1, **data_options):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.cold_start_ms = cold_start_ms
+        self.idle_timeout = idle_timeout
+        self.support_limit = support_limit
+        self.data = generate_data(seed=seed, **data_options)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._last_request = None
+        self.requests = 0
+        self.errors = 0
+        self._encode_bodies()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    def _encode_bodies(self):
+        # Corpos pré-codificados: o custo medido é o do cliente, não o do servidor falso
+        self.bodies = {
+            '/admin/orders': json.dumps({'orders': self.data['orders']}).encode(),
+            '/admin/users': json.dumps({'users': self.data['users']}).encode(),
+            '/products': json.dumps(self.data['products']).encode(),
+            '/admin/deliveries/live': json.dumps({'deliveries': self.data['deliveries']}).encode(),
+            '/admin/stats': json.dumps(self.data['stats']).encode(),
+        }
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Arranca numa thread de fundo e devolve o URL base"""
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fake-ecogas-api', daemon=True)
+        self._thread.start()
+        return self.url
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _delay(self):
+        """Latência simulada; o primeiro request após ``idle_timeout`` paga o arranque a frio"""
+        with self._lock:
+            now = time.monotonic()
+            cold = self._last_request is None or now - self._last_request > self.idle_timeout
+            self._last_request = now
+            self.requests += 1
+            delay = max(0.0, self._random.gauss(self.latency_ms, self.jitter_ms)) if self.latency_ms else 0.0
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if cold and self.cold_start_ms:
+            delay += self.cold_start_ms
+        if delay:
+            time.sleep(delay / 1000)
+        return fail
+
+    def _orders_body(self, query):
+        if not self.support_limit or 'limit' not in query:
+            return self.bodies['/admin/orders']
+        orders = self.data['orders']
+        sort = query.get('sort', [''])[0]
+        if sort.lstrip('-') in ('created_at', 'updated_at', 'id'):
+            orders = sorted(orders, key=lambda order: order[sort.lstrip('-')], reverse=sort.startswith('-'))
+        try:
+            limit = max(0, int(query['limit'][0]))
+        except ValueError:
+            limit = len(orders)
+        return json.dumps({'orders': orders[:limit]}).encode()
+
+    def _update_status(self, order_id, status):
+        with self._lock:
+            for order in self.data['orders']:
+                if str(order['id']) == order_id:
+                    order['status'] = status
+                    self.bodies['/admin/orders'] = json.dumps({'orders': self.data['orders']}).encode()
+                    return order
+        return None
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send(self, status, body):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_json(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    return json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    return {}
+
+            def _authorized(self):
+                return self.headers.get('Authorization', '').startswith(f'Bearer {TOKEN_PREFIX}')
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                if api._delay():
+                    return self._send(503, {'error': 'Serviço indisponível (erro simulado)'})
+                if parts.path.startswith('/admin/') and not self._authorized():
+                    return self._send(401, {'error': 'Token inválido'})
+                if parts.path == '/admin/orders':
+                    return self._send(200, api._orders_body(parse_qs(parts.query)))
+                body = api.bodies.get(parts.path)
+                if body is None:
+                    return self._send(404, {'error': 'Endpoint não encontrado'})
+                self._send(200, body)
+
+            def do_POST(self):
+                data = self._read_json()
+                if api._delay():
+                    return self._send(503, {'error': 'Serviço indisponível (erro simulado)'})
+                if self.path != '/auth/login':
+                    return self._send(404, {'error': 'Endpoint não encontrado'})
+                if not data.get('login') or not data.get('password'):
+                    return self._send(401, {'error': 'Credenciais inválidas'})
+                self._send(200, {
+                    'token': f"{TOKEN_PREFIX}{data['login']}",
+                    'user': {'name': 'Admin Benchmark', 'email': data['login'], 'role': 'admin'},
+                })
+
+            def do_PATCH(self):
+                data = self._read_json()
+                if api._delay():
+                    return self._send(503, {'error': 'Serviço indisponível (erro simulado)'})
+                parts = self.path.strip('/').split('/')
+                if len(parts) != 3 or parts[0] != 'orders' or parts[2] != 'status':
+                    return self._send(404, {'error': 'Endpoint não encontrado'})
+                if not self._authorized():
+                    return self._send(401, {'error': 'Token inválido'})
+                order = api._update_status(parts[1], data.get('status'))
+                if order is None:
+                    return self._send(404, {'error': 'Pedido não encontrado'})
+                self._send(200, {'order': order})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def add_fake_api_arguments(parser):
+    """Opções do servidor falso, partilhadas com o bench_views"""
+    parser.add_argument('--latency', type=float, default=50, help='Latência média por request (ms)')
+    parser.add_argument('--jitter', type=float, default=10, help='Desvio padrão da latência (ms)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fração de requests com 503 (0..1)')
+    parser.add_argument('--cold-start', type=float, default=0, help='Atraso extra após inatividade (ms)')
+    parser.add_argument('--idle-timeout', type=float, default=900, help='Inatividade que provoca arranque a frio (s)')
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--products', type=int, default=20)
+    parser.add_argument('--deliveries', type=int, default=50)
+    parser.add_argument('--padding', type=int, default=0, help='Bytes extra por pedido (payloads maiores)')
+    parser.add_argument('--support-limit', action='store_true', help='Aceitar ?limit=&sort= em /admin/orders')
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def fake_api_from_options(options, host='127.0.0.1', port=0):
+    """Cria o servidor a partir das opções de add_fake_api_arguments"""
+    return FakeEcoGasAPI(
+        host=host,
+        port=port,
+        latency_ms=options['latency'],
+        jitter_ms=options['jitter'],
+        error_rate=options['error_rate'],
+        cold_start_ms=options['cold_start'],
+        idle_timeout=options['idle_timeout'],
+        support_limit=options['support_limit'],
+        seed=options['seed'],
+        orders=options['orders'],
+        users=options['users'],
+        products=options['products'],
+        deliveries=options['deliveries'],
+        padding=options['padding'],
+    )
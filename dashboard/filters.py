@@ -0,0 +1,119 @@
+"""Filtragem, ordenação e paginação no servidor para as listas do dashboard"""
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+ORDER_STATUSES = ('pending', 'accepted', 'on_route', 'delivered', 'cancelled')
+ORDER_SEARCH_FIELDS = ('id', 'customer_name', 'customer_email', 'customer_phone', 'product_name')
+ORDER_SORT_FIELDS = ('created_at', 'id', 'status', 'customer_name', 'total_amount', 'quantity')
+# Os mesmos campos que a busca da página de entregas ("Buscar pedido, cliente...")
+DELIVERY_SEARCH_FIELDS = ('order.id', 'order.customer_name')
+
+
+def _to_int(value, default, minimum=0, maximum=None):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    value = max(minimum, value)
+    return min(value, maximum) if maximum is not None else value
+
+
+def parse_list_query(params, sort_fields=ORDER_SORT_FIELDS, default_sort='-created_at'):
+    """Lê status, q, date_from, date_to, sort, limit e offset de request.GET"""
+    sort = params.get('sort') or default_sort
+    if sort.lstrip('-') not in sort_fields:
+        sort = default_sort
+    return {
+        'status': (params.get('status') or '').strip(),
+        'q': (params.get('q') or '').strip(),
+        'date_from': (params.get('date_from') or '').strip(),
+        'date_to': (params.get('date_to') or '').strip(),
+        'sort': sort,
+        'limit': _to_int(params.get('limit'), DEFAULT_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE),
+        'offset': _to_int(params.get('offset'), 0),
+    }
+
+
+def lookup(item, path):
+    """Valor de ``path`` no registo; caminhos com ponto descem nos dicts aninhados (``order.id``)"""
+    value = item
+    for part in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _sort_key(field):
+    def key(item):
+        value = item.get(field)
+        if isinstance(value, (int, float)):
+            return (0, value, '')
+        try:
+            return (0, float(value), '')
+        except (TypeError, ValueError):
+            return (1, 0, str(value).lower())
+    return key
+
+
+def filter_items(items, query, search_fields=ORDER_SEARCH_FIELDS, date_field='created_at'):
+    """Aplica os filtros (sem paginação) e devolve um gerador"""
+    status = query['status']
+    needle = query['q'].lower()
+    # Datas ISO comparam-se como texto; o limite superior inclui o dia inteiro
+    date_from = query['date_from']
+    date_to = query['date_to']
+
+    for item in items:
+        if status and item.get('status') != status:
+            continue
+        if needle and not any(needle in str(lookup(item, field) or '').lower() for field in search_fields):
+            continue
+        if date_from or date_to:
+            created = str(item.get(date_field) or '')
+            if date_from and created < date_from:
+                continue
+            if date_to and created[:len(date_to)] > date_to:
+                continue
+        yield item
+
+
+def apply_list_query(items, query, search_fields=ORDER_SEARCH_FIELDS, date_field='created_at'):
+    """Filtra, ordena e pagina uma lista de registos da API"""
+    field = query['sort'].lstrip('-')
+    matched, missing = [], []
+    for item in filter_items(items, query, search_fields, date_field):
+        (missing if item.get(field) in (None, '') else matched).append(item)
+    # Registos sem valor no campo de ordenação ficam sempre no fim
+    matched.sort(key=_sort_key(field), reverse=query['sort'].startswith('-'))
+    matched.extend(missing)
+
+    offset, limit = query['offset'], query['limit']
+    return paginate(matched[offset:offset + limit], len(matched), offset, limit)
+
+
+def paginate(results, total, offset, limit):
+    """Metadados de paginação de uma página já cortada"""
+    return {
+        'results': results,
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'start': offset + 1 if results else 0,
+        'end': offset + len(results),
+        'has_previous': offset > 0,
+        'has_next': offset + limit < total,
+        'previous_offset': max(0, offset - limit),
+        'next_offset': offset + limit,
+    }
+
+
+def count_by_status(items, statuses=ORDER_STATUSES):
+    """Contagem por status sobre a lista completa (não só a página)"""
+    counts = dict.fromkeys(statuses, 0)
+    for item in items:
+        status = item.get('status')
+        if status in counts:
+            counts[status] += 1
+    return counts
@@ -0,0 +1,220 @@
+"""Difusão das entregas em tempo real por Server-Sent Events
+
+Um único ciclo de polling por processo busca ``/admin/deliveries/live`` a
+cada ``interval`` segundos enquanto houver browsers ligados e envia a cada
+um apenas as entregas que mudaram desde o poll anterior. Só funciona
+sob ASGI; sob WSGI a view responde 204 e o browser faz polling de
+``/changes/deliveries/``.
+
+O handler ASGI do Django não lê o canal ``receive`` durante o streaming e o
+uvicorn descarta em silêncio os envios para uma ligação fechada; sem
+``DisconnectWatcher`` o stream de um separador fechado nunca terminaria.
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+from api.records import unwrap
+
+from .sync import content_hash
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(event, data):
+    """Serializa um evento SSE"""
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def diff_snapshots(previous, current):
+    """Compara dois snapshots {id: (hash, registo)} e devolve (alterados, removidos)"""
+    changed = [record for key, (digest, record) in current.items()
+               if key not in previous or previous[key][0] != digest]
+    removed = [key for key in previous if key not in current]
+    return changed, removed
+
+
+class DeliveryBroadcaster:
+    """Poller partilhado por todos os subscritores de um event loop"""
+
+    def __init__(self, interval=5, queue_size=32):
+        self.interval = interval
+        self.queue_size = queue_size
+        self.snapshot = {}
+        self.version = 0
+        # fila do subscritor -> cliente EcoGás da sessão dele
+        self._subscribers = {}
+        self._task = None
+        self._loop = None
+        self._ready = None
+
+    def _bind_loop(self):
+        # Sob WSGI cada request tem o seu loop; o estado de um loop antigo não serve
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._task = None
+            self._subscribers = {}
+            self._ready = asyncio.Event()
+            if self.snapshot:
+                self._ready.set()
+
+    def subscribe(self, client):
+        """Regista um browser e o cliente EcoGás da sessão dele"""
+        self._bind_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[queue] = client
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._poll_loop())
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.pop(queue, None)
+
+    def poll_client(self):
+        """Cliente de um subscritor ainda ligado (o mais recente); nunca o de um browser que saiu"""
+        clients = list(self._subscribers.values())
+        return clients[-1] if clients else None
+
+    async def wait_ready(self, timeout):
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _poll_loop(self):
+        while self._subscribers:
+            try:
+                await self.poll_once()
+            except Exception:
+                logger.exception('live deliveries poll crashed')
+            await asyncio.sleep(self.interval)
+
+    async def poll_once(self):
+        client = self.poll_client()
+        if client is None:
+            return
+        success, payload = await asyncio.to_thread(client.get_live_deliveries)
+        if not success:
+            self._publish('status', {'ok': False, 'error': payload.get('error')})
+            return
+        current = {}
+        for record in unwrap(payload, 'deliveries') or []:
+            if isinstance(record, dict) and record.get('id') is not None:
+                current[str(record['id'])] = (content_hash(record), record)
+
+        changed, removed = diff_snapshots(self.snapshot, current)
+        first_poll = not self._ready.is_set()
+        self.snapshot = current
+        self._ready.set()
+        # No primeiro poll os subscritores recebem tudo pelo snapshot inicial
+        if first_poll:
+            self.version += 1
+        elif changed or removed:
+            self.version += 1
+            self._publish('delta', {'version': self.version, 'changed': changed, 'removed': removed})
+
+    def _publish(self, event, data):
+        message = format_event(event, data)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Browser lento: a ligação é fechada e o EventSource volta a ligar com um snapshot completo
+                self._subscribers.pop(queue, None)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    def snapshot_event(self):
+        records = [record for _, record in self.snapshot.values()]
+        return format_event('snapshot', {'version': self.version, 'deliveries': records})
+
+
+DISCONNECTED_SCOPE_KEY = 'ecogas.disconnected'
+
+
+class DisconnectWatcher:
+    """Middleware ASGI que marca no scope quando o browser fecha a ligação
+
+    Depois de o corpo do request ser lido, uma tarefa fica à escuta do
+    ``http.disconnect`` e ativa o ``asyncio.Event`` em
+    ``scope['ecogas.disconnected']``, que o ``event_stream`` acompanha.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        disconnected = asyncio.Event()
+        scope = {**scope, DISCONNECTED_SCOPE_KEY: disconnected}
+        watcher = None
+
+        async def watch():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        async def app_receive():
+            nonlocal watcher
+            if watcher is not None:
+                # O canal pertence ao watcher; a app só pode receber o disconnect
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+            elif not message.get('more_body', False):
+                watcher = asyncio.create_task(watch())
+            return message
+
+        try:
+            await self.app(scope, app_receive, send)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+
+async def event_stream(broadcaster, client, heartbeat=15, disconnected=None, max_duration=None):
+    """Gerador async com o snapshot inicial seguido dos deltas
+
+    Termina quando ``disconnected`` (o evento do ``DisconnectWatcher``) é
+    ativado ou, em qualquer caso, ao fim de ``max_duration`` segundos; o
+    EventSource volta então a ligar sozinho se o browser ainda lá estiver.
+    """
+    queue = broadcaster.subscribe(client)
+    closed = asyncio.ensure_future((disconnected or asyncio.Event()).wait())
+    deadline = time.monotonic() + max_duration if max_duration else None
+    try:
+        await broadcaster.wait_ready(timeout=broadcaster.interval * 2)
+        yield f"retry: {broadcaster.interval * 1000}\n\n"
+        yield broadcaster.snapshot_event()
+        while True:
+            timeout = heartbeat
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    return
+            message = asyncio.ensure_future(queue.get())
+            await asyncio.wait({message, closed}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if closed.done():
+                message.cancel()
+                return
+            if not message.done():
+                message.cancel()
+                if deadline is None or time.monotonic() < deadline:
+                    # Comentário SSE para manter proxies e o balanceador do Render ligados
+                    yield ': ping\n\n'
+                continue
+            message = message.result()
+            if message is None:
+                return
+            yield message
+    finally:
+        closed.cancel()
+        broadcaster.unsubscribe(queue)
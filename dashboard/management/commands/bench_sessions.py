@@ -0,0 +1,97 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models.signals import post_save
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+ENGINES = ('django.contrib.sessions.backends.db', 'dashboard.session_backend')
+
+
+class Command(BaseCommand):
+    help = 'Compara as escritas de sessões na BD entre o backend db e o dashboard.session_backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=5, help='Admins simultâneos (sessões)')
+        parser.add_argument('--requests', type=int, default=500, help='Requests por engine')
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument(
+            '--modify-every', type=int, default=25,
+            help='A cada N requests a view altera a sessão (0 nunca)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['requests']} requests, {options['sessions']} sessões, "
+            f"{options['threads']} threads, alteração a cada {options['modify_every'] or '∞'} requests"
+        )
+        results = {}
+        for engine in ENGINES:
+            with override_settings(SESSION_ENGINE=engine, SESSION_SAVE_EVERY_REQUEST=True):
+                results[engine] = self.run_engine(options)
+            writes, elapsed = results[engine]
+            self.stdout.write(
+                f"{engine}: {writes} escritas na BD, {elapsed:.2f}s "
+                f"({options['requests'] / elapsed:.0f} req/s)"
+            )
+        baseline = results[ENGINES[0]][0]
+        if baseline:
+            reduction = 1 - results[ENGINES[1]][0] / baseline
+            self.stdout.write(self.style.SUCCESS(f'Redução de escritas: {reduction:.1%}'))
+
+    def run_engine(self, options):
+        store_class = import_module(settings.SESSION_ENGINE).SessionStore
+        keys = []
+        for index in range(options['sessions']):
+            store = store_class()
+            store['auth_token'] = f'bench-{index}'
+            store.create()
+            keys.append(store.session_key)
+
+        counter = {'writes': 0}
+
+        def count_write(sender, **kwargs):
+            counter['writes'] += 1
+
+        def view(request):
+            request.session.get('auth_token')
+            if options['modify_every'] and request.bench_index % options['modify_every'] == 0:
+                request.session['last_action'] = request.bench_index
+            return HttpResponse('ok')
+
+        middleware = SessionMiddleware(view)
+        factory = RequestFactory()
+
+        def one_request(index):
+            request = factory.get('/')
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = keys[index % len(keys)]
+            request.bench_index = index
+            middleware(request)
+
+        def worker(indexes):
+            try:
+                for index in indexes:
+                    one_request(index)
+            finally:
+                connection.close()
+
+        threads = max(1, options['threads'])
+        chunks = [range(start, options['requests'], threads) for start in range(threads)]
+        post_save.connect(count_write, sender=Session, dispatch_uid='bench_sessions')
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                list(pool.map(worker, chunks))
+        finally:
+            elapsed = time.perf_counter() - started
+            post_save.disconnect(sender=Session, dispatch_uid='bench_sessions')
+            for key in keys:
+                store_class(key).delete()
+        return counter['writes'], elapsed
@@ -0,0 +1,204 @@
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import NoReverseMatch, reverse
+
+from api.advanced_hybrid_client import advanced_hybrid_api
+from api.metrics import percentile
+
+from dashboard.audit import record_login
+from dashboard.fake_api import add_fake_api_arguments, fake_api_from_options
+
+DEFAULT_VIEWS = ('dashboard', 'orders', 'orders_data', 'users', 'products', 'deliveries', 'system_status')
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede latência e throughput das views do dashboard contra uma API EcoGás falsa local '
+        '(numa base de dados temporária, como a dos testes, apagada no fim)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--view', action='append', dest='views',
+            help=f"Nome da URL ou caminho a medir (pode repetir; por omissão {', '.join(DEFAULT_VIEWS)})",
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Requests medidos por view')
+        parser.add_argument('--concurrency', type=int, default=8, help='Browsers simultâneos (threads)')
+        parser.add_argument('--warmup', type=int, default=5, help='Requests por view antes de medir')
+        parser.add_argument('--no-cache', action='store_true', help='Desliga o cache de respostas da API')
+        parser.add_argument('--api-url', help='Usar uma API já a correr em vez do servidor falso')
+        parser.add_argument('--json', dest='json_path', help='Grava os resultados neste ficheiro')
+        parser.add_argument('--max-p95', type=float, help='Falha se alguma view tiver p95 acima disto (ms)')
+        add_fake_api_arguments(parser)
+
+    def handle(self, *args, **options):
+        if getattr(staticfiles_storage, 'manifest_name', None) and not staticfiles_storage.hashed_files:
+            raise CommandError('Manifesto de estáticos em falta: corra "python manage.py collectstatic" antes')
+        fake = None
+        api_url = options['api_url']
+        if not api_url:
+            fake = fake_api_from_options(options)
+            api_url = fake.start()
+        paths = [self._path(view) for view in options['views'] or DEFAULT_VIEWS]
+
+        self.stdout.write(
+            f"API {api_url} | {options['requests']} requests/view, concorrência {options['concurrency']}, "
+            f"cache {'desligado' if options['no_cache'] else 'ligado'}"
+        )
+        previous = (advanced_hybrid_api.base_url, advanced_hybrid_api.health.url,
+                    advanced_hybrid_api.cache.ttls, advanced_hybrid_api.cache.default_ttl)
+        advanced_hybrid_api.base_url = api_url
+        advanced_hybrid_api.health.url = api_url + getattr(settings, 'ECO_GAS_HEALTH_PATH', '/')
+        if options['no_cache']:
+            advanced_hybrid_api.cache.ttls, advanced_hybrid_api.cache.default_ttl = {}, 0
+        advanced_hybrid_api.invalidate_cache()
+
+        # O login cria usuários e sessões: nunca na base de dados configurada
+        old_db_name = self._create_scratch_database()
+        # A fila de auditoria grava numa thread própria, que pode sobreviver à BD temporária
+        user_logged_in.disconnect(dispatch_uid='ecogas_login_audit')
+        results = []
+        try:
+            with override_settings(
+                ECO_GAS_API_URL=api_url,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                SECURE_SSL_REDIRECT=False,
+            ):
+                for name, path in paths:
+                    upstream_before = fake.requests if fake else None
+                    result = self.run_view(name, path, options)
+                    if fake:
+                        result['upstream_requests'] = fake.requests - upstream_before
+                    results.append(result)
+                    self.report(result)
+        finally:
+            (advanced_hybrid_api.base_url, advanced_hybrid_api.health.url,
+             advanced_hybrid_api.cache.ttls, advanced_hybrid_api.cache.default_ttl) = previous
+            advanced_hybrid_api.invalidate_cache()
+            user_logged_in.connect(record_login, dispatch_uid='ecogas_login_audit')
+            self._destroy_scratch_database(old_db_name)
+            if fake:
+                fake.stop()
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump({'options': self._serializable(options), 'results': results}, handle, indent=2)
+        if options['max_p95'] is not None:
+            slow = [r['view'] for r in results if r['p95_ms'] is not None and r['p95_ms'] > options['max_p95']]
+            if slow:
+                raise CommandError(f"p95 acima de {options['max_p95']}ms: {', '.join(slow)}")
+
+    def _create_scratch_database(self):
+        """Cria e migra uma BD temporária e aponta a ligação para ela; devolve o nome original"""
+        test_settings = connection.settings_dict['TEST']
+        self._test_db_name = test_settings.get('NAME')
+        if connection.vendor == 'sqlite' and not self._test_db_name:
+            # Em ficheiro, não em memória: as threads do benchmark abrem cada uma a sua ligação
+            handle, path = tempfile.mkstemp(prefix='ecogas-bench-', suffix='.sqlite3')
+            os.close(handle)
+            test_settings['NAME'] = path
+        return connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    def _destroy_scratch_database(self, old_name):
+        """Apaga a BD temporária (com os usuários e sessões do benchmark) e repõe a original"""
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        connection.settings_dict['TEST']['NAME'] = self._test_db_name
+
+    def _path(self, view):
+        if view.startswith('/'):
+            return view, view
+        try:
+            return view, reverse(view)
+        except NoReverseMatch:
+            raise CommandError(f'View desconhecida: {view}')
+
+    def _serializable(self, options):
+        return {key: value for key, value in options.items()
+                if isinstance(value, (str, int, float, bool, list, type(None)))}
+
+    def _login(self):
+        client = Client()
+        response = client.post(reverse('login'), {'email': 'bench@ecogas.test', 'password': 'bench'})
+        if response.status_code != 302:
+            raise CommandError(f'Login de benchmark falhou (HTTP {response.status_code})')
+        return client
+
+    def run_view(self, name, path, options):
+        for _ in range(options['warmup']):
+            self._login().get(path)
+
+        total = options['requests']
+        counter = itertools.count()
+        latencies, errors = [], []
+        failures = []
+
+        def worker():
+            try:
+                client = self._login()
+                while next(counter) < total:
+                    started = time.perf_counter()
+                    try:
+                        response = client.get(path)
+                        # Consumir respostas em streaming para medir o request completo
+                        if response.streaming:
+                            for _ in response.streaming_content:
+                                pass
+                        failed = response.status_code >= 400
+                    except Exception:
+                        failed = True
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if failed:
+                        errors.append(1)
+            except Exception as e:
+                failures.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(max(1, options['concurrency']))]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if failures:
+            raise CommandError(f'{name}: {failures[0]}')
+
+        ordered = sorted(latencies)
+        return {
+            'view': name,
+            'path': path,
+            'requests': len(ordered),
+            'errors': len(errors),
+            'seconds': round(elapsed, 3),
+            'throughput_rps': round(len(ordered) / elapsed, 1) if elapsed else None,
+            'p50_ms': _round(percentile(ordered, 0.50)),
+            'p95_ms': _round(percentile(ordered, 0.95)),
+            'p99_ms': _round(percentile(ordered, 0.99)),
+            'max_ms': _round(ordered[-1] if ordered else None),
+        }
+
+    def report(self, result):
+        upstream = result.get('upstream_requests')
+        self.stdout.write(
+            f"{result['view']:<15} {result['throughput_rps']:>8} req/s  "
+            f"p50 {result['p50_ms']:>7}ms  p95 {result['p95_ms']:>7}ms  p99 {result['p99_ms']:>7}ms  "
+            f"erros {result['errors']}"
+            + (f'  upstream {upstream}' if upstream is not None else '')
+        )
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
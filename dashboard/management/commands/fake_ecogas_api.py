@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.fake_api import add_fake_api_arguments, fake_api_from_options
+
+
+class Command(BaseCommand):
+    help = 'Servidor local que imita a API EcoGás (usar com ECO_GAS_API_URL=http://127.0.0.1:<porta>)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        add_fake_api_arguments(parser)
+
+    def handle(self, *args, **options):
+        api = fake_api_from_options(options, host=options['host'], port=options['port'])
+        sizes = ', '.join(f'{path} {len(body) / 1024:.0f}KB' for path, body in api.bodies.items())
+        self.stdout.write(f'API EcoGás falsa em {api.url} ({sizes})')
+        try:
+            api.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            api.server.server_close()
+            self.stdout.write(f'{api.requests} requests servidos, {api.errors} erros simulados')
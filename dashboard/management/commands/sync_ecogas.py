@@ -0,0 +1,65 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.advanced_hybrid_client import EcoGasRealAPI
+from dashboard.sync import ENTITIES, sync_entity
+
+
+class Command(BaseCommand):
+    help = (
+        'Sincroniza pedidos, usuários, produtos e entregas da API EcoGás para as tabelas locais '
+        '(a senha vem sempre de ECO_GAS_SYNC_PASSWORD)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--entity', action='append', choices=sorted(ENTITIES),
+            help='Entidade a sincronizar (pode repetir; por omissão todas)',
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Modo worker: repete a sincronização a cada N segundos',
+        )
+        parser.add_argument('--email', default=os.getenv('ECO_GAS_SYNC_EMAIL'))
+
+    def handle(self, *args, **options):
+        # Sem --password: os argumentos da linha de comandos ficam visíveis no ps
+        self.email = options['email']
+        self.password = os.getenv('ECO_GAS_SYNC_PASSWORD')
+        if not self.email or not self.password:
+            raise CommandError('Indique --email (ou ECO_GAS_SYNC_EMAIL) e ECO_GAS_SYNC_PASSWORD')
+
+        client = EcoGasRealAPI()
+        success, result = self._login(client)
+        if not success:
+            raise CommandError(f"Falha no login: {result.get('error')}")
+
+        entities = options['entity'] or list(ENTITIES)
+        while True:
+            for entity in entities:
+                started = time.monotonic()
+                success, result = sync_entity(client, entity)
+                if not success and result.get('status') == 401:
+                    # Token expirado: novo login e uma nova tentativa no mesmo ciclo
+                    self.stderr.write(f'{entity}: token expirado, a autenticar de novo')
+                    relogged, error = self._login(client)
+                    if relogged:
+                        success, result = sync_entity(client, entity)
+                    else:
+                        result = error
+                elapsed = time.monotonic() - started
+                if not success:
+                    self.stderr.write(f"{entity}: falhou: {result.get('error')} ({elapsed:.2f}s)")
+                else:
+                    self.stdout.write(
+                        f"{entity}: {result['created']} novos, {result['updated']} alterados, "
+                        f"{result['unchanged']} iguais, {result['deleted']} removidos ({elapsed:.2f}s)"
+                    )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def _login(self, client):
+        return client.login(self.email, self.password)
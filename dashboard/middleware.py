@@ -0,0 +1,55 @@
+"""Middleware do dashboard"""
+
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from api.advanced_hybrid_client import advanced_hybrid_api
+
+
+class ViewMetricsMiddleware:
+    """Regista nas métricas (painel e Prometheus) o tempo de cada view (até a resposta estar pronta)
+
+    Em respostas em streaming mede-se só até ao início do corpo.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.metrics = advanced_hybrid_api.metrics
+        self.prometheus = advanced_hybrid_api.prometheus
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        except Exception:
+            self._record(request, started, 500)
+            raise
+        self._record(request, started, response.status_code)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        except Exception:
+            self._record(request, started, 500)
+            raise
+        self._record(request, started, response.status_code)
+        return response
+
+    def _record(self, request, started, status):
+        match = getattr(request, 'resolver_match', None)
+        # Rotas por nome para não criar uma série por URL (ids, 404s)
+        name = match.url_name or match.view_name if match else 'unresolved'
+        elapsed = time.perf_counter() - started
+        self.metrics.observe('views', name, elapsed * 1000, error=status >= 500)
+        self.prometheus.inc('ecogas_view_requests_total', {'view': name, 'status': str(status)})
+        self.prometheus.observe('ecogas_view_duration_seconds', elapsed, {'view': name})
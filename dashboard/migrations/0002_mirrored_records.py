@@ -0,0 +1,90 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MirroredDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remote_id', models.CharField(max_length=64, unique=True)),
+                ('data', models.JSONField(default=dict)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('remote_updated_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(blank=True, db_index=True, max_length=32)),
+                ('order_remote_id', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('remote_created_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Entrega (espelho)',
+                'verbose_name_plural': 'Entregas (espelho)',
+            },
+        ),
+        migrations.CreateModel(
+            name='MirroredProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remote_id', models.CharField(max_length=64, unique=True)),
+                ('data', models.JSONField(default=dict)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('remote_updated_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('type', models.CharField(blank=True, max_length=64)),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True)),
+                ('stock_quantity', models.IntegerField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Produto (espelho)',
+                'verbose_name_plural': 'Produtos (espelho)',
+            },
+        ),
+        migrations.CreateModel(
+            name='MirroredUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remote_id', models.CharField(max_length=64, unique=True)),
+                ('data', models.JSONField(default=dict)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('remote_updated_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('email', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('role', models.CharField(blank=True, db_index=True, max_length=32)),
+                ('remote_created_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Usuário (espelho)',
+                'verbose_name_plural': 'Usuários (espelho)',
+            },
+        ),
+        migrations.CreateModel(
+            name='MirroredOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remote_id', models.CharField(max_length=64, unique=True)),
+                ('data', models.JSONField(default=dict)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('remote_updated_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(blank=True, db_index=True, max_length=32)),
+                ('customer_name', models.CharField(blank=True, max_length=255)),
+                ('customer_email', models.CharField(blank=True, max_length=255)),
+                ('total_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True)),
+                ('remote_created_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Pedido (espelho)',
+                'verbose_name_plural': 'Pedidos (espelho)',
+                'indexes': [models.Index(fields=['status', '-remote_created_at'], name='dashboard_m_status_2c3c39_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:39
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_mirrored_records'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usersession',
+            name='login_time',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
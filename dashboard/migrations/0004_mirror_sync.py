@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_user_session_login_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MirrorSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=32, unique=True)),
+                ('synced_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Sincronização do espelho',
+                'verbose_name_plural': 'Sincronizações do espelho',
+            },
+        ),
+    ]
@@ -1,12 +1,158 @@
+from decimal import Decimal, InvalidOperation
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 
 class UserSession(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    login_time = models.DateTimeField(auto_now_add=True)
+    # Preenchido pela fila de auditoria com a hora real do login (a gravação é em lote)
+    login_time = models.DateTimeField(default=timezone.now, db_index=True)
     ip_address = models.GenericIPAddressField()
     
     class Meta:
         verbose_name = 'Sessão de Usuário'
-        verbose_name_plural = 'Sessões de Usuários'
\ No newline at end of file
+        verbose_name_plural = 'Sessões de Usuários'
+
+class MirroredRecord(models.Model):
+    """Cópia local de um registo da API EcoGás
+
+    ``data`` guarda o payload completo; as colunas indexadas das subclasses
+    servem apenas para filtrar e ordenar sem ir à API.
+    """
+    remote_id = models.CharField(max_length=64, unique=True)
+    data = models.JSONField(default=dict)
+    content_hash = models.CharField(max_length=64)
+    remote_updated_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    synced_at = models.DateTimeField(auto_now=True)
+
+    # Nome da chave quando a API devolve {"<chave>": [...]} em vez de uma lista
+    payload_key = None
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def columns_from_record(cls, record):
+        """Colunas indexadas extraídas do payload da API"""
+        return {}
+
+
+class MirroredOrder(MirroredRecord):
+    status = models.CharField(max_length=32, blank=True, db_index=True)
+    customer_name = models.CharField(max_length=255, blank=True)
+    customer_email = models.CharField(max_length=255, blank=True)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    remote_created_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    payload_key = 'orders'
+
+    class Meta:
+        verbose_name = 'Pedido (espelho)'
+        verbose_name_plural = 'Pedidos (espelho)'
+        indexes = [models.Index(fields=['status', '-remote_created_at'])]
+
+    @classmethod
+    def columns_from_record(cls, record):
+        return {
+            'status': str(record.get('status') or '')[:32],
+            'customer_name': str(record.get('customer_name') or '')[:255],
+            'customer_email': str(record.get('customer_email') or '')[:255],
+            'total_amount': _to_decimal(record.get('total_amount')),
+            'remote_created_at': _to_datetime(record.get('created_at')),
+        }
+
+
+class MirroredUser(MirroredRecord):
+    name = models.CharField(max_length=255, blank=True)
+    email = models.CharField(max_length=255, blank=True, db_index=True)
+    role = models.CharField(max_length=32, blank=True, db_index=True)
+    remote_created_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    payload_key = 'users'
+
+    class Meta:
+        verbose_name = 'Usuário (espelho)'
+        verbose_name_plural = 'Usuários (espelho)'
+
+    @classmethod
+    def columns_from_record(cls, record):
+        return {
+            'name': str(record.get('name') or '')[:255],
+            'email': str(record.get('email') or '')[:255],
+            'role': str(record.get('role') or '')[:32],
+            'remote_created_at': _to_datetime(record.get('created_at')),
+        }
+
+
+class MirroredProduct(MirroredRecord):
+    name = models.CharField(max_length=255, blank=True, db_index=True)
+    type = models.CharField(max_length=64, blank=True)
+    price = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    stock_quantity = models.IntegerField(null=True, blank=True)
+
+    payload_key = 'products'
+
+    class Meta:
+        verbose_name = 'Produto (espelho)'
+        verbose_name_plural = 'Produtos (espelho)'
+
+    @classmethod
+    def columns_from_record(cls, record):
+        stock = record.get('stock_quantity')
+        return {
+            'name': str(record.get('name') or '')[:255],
+            'type': str(record.get('type') or '')[:64],
+            'price': _to_decimal(record.get('price')),
+            'stock_quantity': stock if isinstance(stock, int) else None,
+        }
+
+
+class MirroredDelivery(MirroredRecord):
+    status = models.CharField(max_length=32, blank=True, db_index=True)
+    order_remote_id = models.CharField(max_length=64, blank=True, db_index=True)
+    remote_created_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    payload_key = 'deliveries'
+
+    class Meta:
+        verbose_name = 'Entrega (espelho)'
+        verbose_name_plural = 'Entregas (espelho)'
+
+    @classmethod
+    def columns_from_record(cls, record):
+        order = record.get('order')
+        order_id = order.get('id') if isinstance(order, dict) else record.get('order_id')
+        return {
+            'status': str(record.get('status') or '')[:32],
+            'order_remote_id': str(order_id or '')[:64],
+            'remote_created_at': _to_datetime(record.get('created_at')),
+        }
+
+
+class MirrorSync(models.Model):
+    """Hora da última sincronização completa de cada entidade (frescura do espelho)"""
+    entity = models.CharField(max_length=32, unique=True)
+    synced_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Sincronização do espelho'
+        verbose_name_plural = 'Sincronizações do espelho'
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError, TypeError):
+        return None
+
+
+def _to_datetime(value):
+    if not isinstance(value, str):
+        return None
+    try:
+        return parse_datetime(value)
+    except ValueError:
+        return None
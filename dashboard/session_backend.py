@@ -0,0 +1,67 @@
+"""Sessões em cache com poucas escritas na base de dados
+
+Com ``SESSION_SAVE_EVERY_REQUEST`` o middleware grava a sessão em todos os
+requests só para empurrar a expiração. Aqui as leituras vêm do cache
+(como no ``cached_db``) e a gravação na BD só acontece quando os dados
+mudaram ou quando a última escrita tem mais de
+``ECO_GAS_SESSION_REFRESH_INTERVAL`` segundos. A expiração guardada na BD
+fica no máximo esse intervalo atrás da do cookie.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+KEY_PREFIX = 'ecogas.sessions.'
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._loaded_digest = None
+
+    @property
+    def refresh_interval(self):
+        return getattr(settings, 'ECO_GAS_SESSION_REFRESH_INTERVAL', 3600)
+
+    def _digest(self, data):
+        return hashlib.sha1(self.serializer().dumps(data)).hexdigest()
+
+    def load(self):
+        data = super().load()
+        self._loaded_digest = self._digest(data)
+        return data
+
+    def _written_key(self):
+        return self.cache_key + ':written'
+
+    def _write_is_redundant(self):
+        """Dados iguais aos carregados e escrita recente: a gravação pode ser saltada"""
+        data = self._get_session()
+        if self._loaded_digest is None or self._digest(data) != self._loaded_digest:
+            return False
+        try:
+            # A marca expira ao fim do intervalo e obriga a uma nova escrita
+            return self._cache.get(self._written_key()) is not None
+        except Exception:
+            return False
+
+    def save(self, must_create=False):
+        if not must_create and self.session_key is not None and self._write_is_redundant():
+            return
+        super().save(must_create)
+        self._loaded_digest = self._digest(self._session)
+        try:
+            self._cache.set(self._written_key(), True, self.refresh_interval)
+        except Exception:
+            pass
+
+    def delete(self, session_key=None):
+        if session_key is None and self.session_key is not None:
+            session_key = self.session_key
+        super().delete(session_key)
+        if session_key is not None:
+            self._cache.delete(self.cache_key_prefix + session_key + ':written')
@@ -0,0 +1,281 @@
+"""Sincronização incremental das entidades da API EcoGás para as tabelas espelho
+
+As views leem o espelho enquanto a última sincronização completa da
+entidade for mais recente que ``ECO_GAS_MIRROR_MAX_AGE``; fora disso (ou
+sem worker de sincronização a correr) vão à API como antes.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from api.records import unwrap
+
+from .filters import ORDER_STATUSES, paginate
+from .models import MirrorSync, MirroredDelivery, MirroredOrder, MirroredProduct, MirroredUser
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+# entidade -> (modelo, nome do método do cliente)
+ENTITIES = {
+    'orders': (MirroredOrder, 'get_all_orders'),
+    'users': (MirroredUser, 'get_all_users'),
+    'products': (MirroredProduct, 'get_products'),
+    'deliveries': (MirroredDelivery, 'get_live_deliveries'),
+}
+
+# Campo de ordenação da lista de pedidos -> (coluna do espelho, '' conta como vazio)
+ORDER_SORT_COLUMNS = {
+    'created_at': ('remote_created_at', False),
+    'id': ('data__id', False),
+    'status': ('status', True),
+    'customer_name': ('customer_name', True),
+    'total_amount': ('total_amount', False),
+    'quantity': ('data__quantity', False),
+}
+ORDER_SEARCH_LOOKUPS = (
+    'remote_id__icontains',
+    'customer_name__icontains',
+    'customer_email__icontains',
+    'data__customer_phone__icontains',
+    'data__product_name__icontains',
+)
+
+
+def content_hash(record):
+    """Hash estável do payload, independente da ordem das chaves"""
+    encoded = json.dumps(record, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def _updated_at(record):
+    value = record.get('updated_at')
+    if not isinstance(value, str):
+        return None
+    try:
+        updated = parse_datetime(value)
+    except ValueError:
+        return None
+    if updated is not None and timezone.is_naive(updated):
+        updated = timezone.make_aware(updated, dt_timezone.utc)
+    return updated
+
+
+def sync_records(model, records, delete_missing=True):
+    """Aplica a lista completa da API ao modelo espelho
+
+    Registos com ``updated_at`` igual ao guardado são ignorados sem calcular
+    o hash; os restantes só são escritos se o hash do conteúdo mudou.
+    """
+    existing = {
+        remote_id: (pk, stored_hash, stored_updated)
+        for pk, remote_id, stored_hash, stored_updated in model.objects.values_list(
+            'pk', 'remote_id', 'content_hash', 'remote_updated_at'
+        )
+    }
+    column_names = None
+    to_create, to_update = [], []
+    seen = set()
+    unchanged = 0
+
+    for record in records:
+        if not isinstance(record, dict) or record.get('id') in (None, ''):
+            continue
+        remote_id = str(record['id'])
+        seen.add(remote_id)
+        updated_at = _updated_at(record)
+        current = existing.get(remote_id)
+
+        if current and updated_at is not None and current[2] == updated_at:
+            unchanged += 1
+            continue
+        record_hash = content_hash(record)
+        if current and current[1] == record_hash:
+            unchanged += 1
+            continue
+
+        columns = model.columns_from_record(record)
+        column_names = column_names or list(columns)
+        instance = model(
+            remote_id=remote_id,
+            data=record,
+            content_hash=record_hash,
+            remote_updated_at=updated_at,
+            **columns,
+        )
+        if current:
+            instance.pk = current[0]
+            to_update.append(instance)
+        else:
+            to_create.append(instance)
+
+    missing = [pk for remote_id, (pk, _, _) in existing.items() if remote_id not in seen]
+
+    with transaction.atomic():
+        if to_create:
+            model.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        if to_update:
+            # bulk_update não passa pelo auto_now, por isso synced_at é preenchido à mão
+            now = timezone.now()
+            for instance in to_update:
+                instance.synced_at = now
+            model.objects.bulk_update(
+                to_update,
+                ['data', 'content_hash', 'remote_updated_at', 'synced_at', *(column_names or [])],
+                batch_size=BATCH_SIZE,
+            )
+        if delete_missing and missing:
+            model.objects.filter(pk__in=missing).delete()
+
+    return {
+        'created': len(to_create),
+        'updated': len(to_update),
+        'unchanged': unchanged,
+        'deleted': len(missing) if delete_missing else 0,
+    }
+
+
+def sync_entity(client, entity):
+    """Busca uma entidade na API e sincroniza-a: (success, contadores ou erro)
+
+    O erro traz o ``status`` HTTP quando a API o devolveu (401 = token
+    expirado). O pedido não passa pelo cache de respostas: cada ciclo vê a
+    API e não mexe no cache partilhado com os workers web.
+    """
+    model, method_name = ENTITIES[entity]
+    success, payload = getattr(client, method_name)(use_cache=False)
+    if not success:
+        logger.warning('sync %s falhou: %s', entity, payload.get('error'))
+        return False, payload
+    records = unwrap(payload, model.payload_key)
+    if records is None:
+        # Formato inesperado: não apagar o espelho por engano
+        logger.warning('sync %s: formato de resposta inesperado', entity)
+        return False, {'error': 'Formato de resposta inesperado'}
+    result = sync_records(model, records)
+    MirrorSync.objects.update_or_create(entity=entity, defaults={'synced_at': timezone.now()})
+    logger.info('sync %s: %s', entity, result)
+    return True, result
+
+
+def mark_stale(*entities):
+    """O espelho destas entidades deixou de refletir a API (ex.: status alterado pelo dashboard)"""
+    MirrorSync.objects.filter(entity__in=entities).delete()
+
+
+def is_fresh(entity, max_age):
+    """A última sincronização completa da entidade tem menos de ``max_age`` s"""
+    if not max_age:
+        return False
+    synced_at = MirrorSync.objects.filter(entity=entity).values_list('synced_at', flat=True).first()
+    return synced_at is not None and (timezone.now() - synced_at).total_seconds() <= max_age
+
+
+def fresh_records(entity, max_age):
+    """Payloads do espelho se a última sincronização tiver menos de ``max_age`` s; senão None"""
+    if not is_fresh(entity, max_age):
+        return None
+    model = ENTITIES[entity][0]
+    return list(model.objects.order_by('pk').values_list('data', flat=True))
+
+
+def _day_start(value):
+    """Meia-noite UTC de uma data ISO (as datas da API estão em UTC); None se não for só uma data"""
+    try:
+        day = parse_date(value)
+    except ValueError:
+        return None
+    if day is None:
+        return None
+    return datetime.combine(day, dt_time.min, tzinfo=dt_timezone.utc)
+
+
+def _orders_queryset(query):
+    """Filtros da lista de pedidos sobre as colunas do espelho; None se não forem expressáveis em SQL"""
+    queryset = MirroredOrder.objects.all()
+    if query['q']:
+        search = Q()
+        for lookup in ORDER_SEARCH_LOOKUPS:
+            search |= Q(**{lookup: query['q']})
+        queryset = queryset.filter(search)
+    # Como em filter_items, date_to inclui o dia inteiro; outros formatos ficam para o filtro em Python
+    if query['date_from']:
+        start = _day_start(query['date_from'])
+        if start is None:
+            return None
+        queryset = queryset.filter(remote_created_at__gte=start)
+    if query['date_to']:
+        end = _day_start(query['date_to'])
+        if end is None:
+            return None
+        queryset = queryset.filter(remote_created_at__lt=end + timedelta(days=1))
+    return queryset
+
+
+def orders_page(query, max_age):
+    """Página de pedidos lida do espelho: (page, status_counts, total) ou None se não estiver fresco
+
+    Filtro, ordenação e paginação correm na BD sobre as colunas indexadas
+    (status, remote_created_at); só os payloads da página são carregados.
+    A semântica é a de ``apply_list_query``: registos sem valor no campo de
+    ordenação ficam sempre no fim.
+    """
+    if not is_fresh('orders', max_age):
+        return None
+    filtered = _orders_queryset(query)
+    if filtered is None:
+        return None
+    if query['status']:
+        filtered = filtered.filter(status=query['status'])
+    column, blank_is_empty = ORDER_SORT_COLUMNS[query['sort'].lstrip('-')]
+    empty = Q(**{f'{column}__isnull': True})
+    if blank_is_empty:
+        empty |= Q(**{column: ''})
+    ordered = filtered.annotate(
+        _empty=Case(When(empty, then=Value(1)), default=Value(0), output_field=IntegerField()),
+    ).order_by(
+        '_empty',
+        F(column).desc() if query['sort'].startswith('-') else F(column).asc(),
+        'pk',
+    )
+    offset, limit = query['offset'], query['limit']
+    results = list(ordered.values_list('data', flat=True)[offset:offset + limit])
+    page = paginate(results, filtered.count(), offset, limit)
+
+    # Contagens sobre a lista completa, como count_by_status
+    status_counts = dict.fromkeys(ORDER_STATUSES, 0)
+    total = 0
+    for status, count in MirroredOrder.objects.values_list('status').annotate(count=Count('pk')).order_by():
+        total += count
+        if status in status_counts:
+            status_counts[status] = count
+    return page, status_counts, total
+
+
+def recent_orders(n, max_age):
+    """Os n pedidos mais recentes do espelho, pelo índice de remote_created_at; None se não estiver fresco"""
+    if not is_fresh('orders', max_age):
+        return None
+    ordered = MirroredOrder.objects.order_by(F('remote_created_at').desc(nulls_last=True), 'pk')
+    return list(ordered.values_list('data', flat=True)[:n])
+
+
+def read_entity(client, entity, max_age):
+    """(success, payload) da entidade: do espelho se estiver fresco, senão da API
+
+    O espelho é preenchido com a conta do worker de sincronização, por isso
+    só é servido a sessões com token aceite pela API.
+    """
+    if client.token:
+        records = fresh_records(entity, max_age)
+        if records is not None:
+            return True, records
+    return getattr(client, ENTITIES[entity][1])()
@@ -0,0 +1,107 @@
+"""Cache de fragmentos por linha para as tabelas grandes
+
+    {% load row_cache %}
+    {% for order in orders %}
+        {% rowcache 'orders' order %}<tr>...</tr>{% endrowcache %}
+    {% endfor %}
+
+Cada linha renderizada fica num LRU em memória do worker, com a chave
+(fragmento, id do registo, hash do conteúdo). Voltar a mostrar uma lista em
+que quase nada mudou só renderiza as linhas que mudaram; uma linha alterada
+tem hash novo e a versão antiga acaba por sair do LRU. O bloco só pode
+depender do registo: nada de ``{% csrf_token %}`` ou do usuário do request.
+"""
+
+import threading
+from collections import OrderedDict
+
+from django import template
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from dashboard.sync import content_hash
+
+register = template.Library()
+
+
+class FragmentCache:
+    """LRU de fragmentos HTML já renderizados"""
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def set(self, key, html):
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+fragments = FragmentCache(max_entries=getattr(settings, 'ECO_GAS_FRAGMENT_CACHE_MAX_ENTRIES', 5000))
+
+
+def fragment_key(name, record):
+    """(fragmento, id, hash do conteúdo) de um registo tipado ou dict da API"""
+    raw = record.to_dict() if hasattr(record, 'to_dict') else record
+    return name, str(raw.get('id')), content_hash(raw)
+
+
+class RowCacheNode(template.Node):
+    def __init__(self, nodelist, name, record):
+        self.nodelist = nodelist
+        self.name = name
+        self.record = record
+
+    def render(self, context):
+        record = self.record.resolve(context)
+        if not record:
+            return self.nodelist.render(context)
+        key = fragment_key(self.name.resolve(context), record)
+        html = fragments.get(key)
+        if html is None:
+            html = self.nodelist.render(context)
+            fragments.set(key, html)
+        return mark_safe(html)
+
+
+@register.tag
+def rowcache(parser, token):
+    """{% rowcache '<fragmento>' <registo> %} ... {% endrowcache %}"""
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' recebe o nome do fragmento e o registo: {{% rowcache 'orders' order %}}"
+        )
+    nodelist = parser.parse(('endrowcache',))
+    parser.delete_first_token()
+    return RowCacheNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
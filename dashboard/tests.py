@@ -1,3 +1,1267 @@
-from django.test import TestCase
+import asyncio
+import copy
+import csv
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta, timezone as datetime_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import requests
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.core.signals import request_started
+from django.db import close_old_connections, connection
+from django.template import Context, Template, TemplateSyntaxError
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from api.advanced_hybrid_client import EcoGasRealAPI
+from api.cache import ResponseCache
+from api.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, backoff_delay
+from api.health import HealthMonitor
+from api.metrics import MetricsCollector, percentile, summarize
+from api.prometheus import PrometheusStore
+from api.records import Delivery, Order, RecordList, User as UserRecord, unwrap
+from api.registry import ClientRegistry
+from api.singleflight import SingleFlight
+from api.snapshot import SnapshotStore
+from api.streaming import iter_json_array
+
+from .audit import LoginAuditQueue, client_ip
+from .deltas import TRACKED, DeltaTracker
+from .fake_api import FakeEcoGasAPI, generate_data
+from .filters import ORDER_STATUSES, apply_list_query, count_by_status, parse_list_query
+from .live import DeliveryBroadcaster, DisconnectWatcher, event_stream
+from .models import MirroredOrder, MirrorSync, UserSession
+from .session_backend import SessionStore
+from .sync import orders_page, recent_orders, sync_entity, sync_records
+from .templatetags.row_cache import FragmentCache
+
+TOKEN = 'fake-admin@ecogas.test'
+
+
+def chunked(data, size):
+    """Divide ``data`` em blocos de ``size`` bytes, como o iter_content"""
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+class FakeApiMixin:
+    """Uma API EcoGás falsa por classe de testes e clientes isolados (sem cache partilhado nem disco)"""
+
+    fake_options = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        options = {'latency_ms': 0, 'jitter_ms': 0, 'orders': 30, 'users': 5, 'deliveries': 5}
+        cls.fake = FakeEcoGasAPI(**{**options, **cls.fake_options})
+        cls.fake.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fake.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        # Durante todo o teste: os clientes por token leem o URL das settings quando são criados
+        isolated = self.settings(
+            ECO_GAS_API_URL=self.fake.url,
+            ECO_GAS_SHARED_CACHE=None,
+            ECO_GAS_FETCH_LOCK_DIR=None,
+            ECO_GAS_SNAPSHOT_DIR=None,
+            ECO_GAS_PROMETHEUS_DIR=None,
+            ECO_GAS_RETRY_BACKOFF_BASE=0,
+        )
+        isolated.enable()
+        self.addCleanup(isolated.disable)
+
+    def make_base(self, **settings_overrides):
+        with self.settings(**settings_overrides):
+            return EcoGasRealAPI()
+
+    def make_client(self, token=TOKEN, **settings_overrides):
+        return self.make_base(**settings_overrides).for_token(token)
+
+
+class ViewTestMixin(FakeApiMixin):
+    """Views servidas por um cliente base próprio do teste
+
+    O cliente global foi criado no import com o cache em ficheiros, o
+    diretório do Prometheus e os snapshots da árvore de trabalho; aqui as
+    views, o middleware e as sessões usam um cliente e um cache só do teste.
+    """
+
+    def setUp(self):
+        super().setUp()
+        caches = self.settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            # Páginas HTML renderizam sem o manifesto do collectstatic
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        )
+        caches.enable()
+        self.addCleanup(caches.disable)
+        self.api = self.make_base()
+        registry = ClientRegistry(self.api)
+        patches = [
+            mock.patch('api.advanced_hybrid_client.advanced_hybrid_api', self.api),
+            mock.patch('dashboard.middleware.advanced_hybrid_api', self.api),
+            mock.patch('dashboard.views.advanced_hybrid_api', self.api),
+            mock.patch('dashboard.views.api_clients', registry),
+            mock.patch('dashboard.views.client_for_request',
+                       lambda request: registry.get(request.session.session_key, request.session.get('auth_token'))),
+            # A fila de auditoria gravaria noutra ligação, fora da transação do teste
+            mock.patch('dashboard.audit.login_audit.record'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def login(self, token=TOKEN):
+        user = User.objects.create(username='admin@ecogas.test', is_staff=True)
+        self.client.force_login(user)
+        session = self.client.session
+        session['auth_token'] = token
+        session.save()
+        return user
+
+
+class IterJsonArrayTests(SimpleTestCase):
+    """Parser incremental de listas JSON, com a resposta cortada em todos os pontos possíveis"""
+
+    def assertParsesInChunks(self, document, key=None):
+        data = json.dumps(document).encode('utf-8')
+        expected = document[key] if key else document
+        for size in range(1, len(data) + 1):
+            with self.subTest(size=size):
+                self.assertEqual(list(iter_json_array(chunked(data, size), key)), expected)
+
+    def test_numbers_split_across_chunks(self):
+        self.assertEqual(list(iter_json_array([b'[1', b'.5,2]'])), [1.5, 2])
+        self.assertEqual(list(iter_json_array([b'[1.', b'5e', b'-3,2', b'0]'])), [0.0015, 20])
+        self.assertParsesInChunks([1, -2, 3.25, 1e-07, 12345678901234567890, 0, -0.5])
+
+    def test_literals_and_strings(self):
+        self.assertParsesInChunks([True, False, None, '', 'Botija 12kg', 'ç "aspas" \\ ã', 7])
+
+    def test_objects_under_key(self):
+        orders = [
+            {'id': index, 'status': 'pending', 'total_amount': f'{index * 1250}.00', 'weight': 12.5,
+             'customer_name': 'João', 'created_at': f'2025-10-0{index}T10:00:00Z'}
+            for index in range(1, 4)
+        ]
+        self.assertParsesInChunks({'count': 3, 'meta': {'page': [1, 2]}, 'orders': orders}, key='orders')
+
+    def test_multibyte_characters_split_between_chunks(self):
+        data = json.dumps(['ãéç€'], ensure_ascii=False).encode('utf-8')
+        for size in range(1, len(data) + 1):
+            with self.subTest(size=size):
+                self.assertEqual(list(iter_json_array(chunked(data, size))), ['ãéç€'])
+
+    def test_empty_and_other_formats(self):
+        self.assertEqual(list(iter_json_array([b'[', b' ]'])), [])
+        self.assertEqual(list(iter_json_array([b'{"orders": []}'], 'orders')), [])
+        self.assertEqual(list(iter_json_array([b'{"users": [1]}'], 'orders')), [])
+        self.assertEqual(list(iter_json_array([b'"texto"'])), [])
+
+    def test_invalid_json_raises(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'[1 2]']))
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'[{"id": 1}', b', {"id": ']))
+
+
+class FakeApiTests(ViewTestMixin, TestCase):
+    """A API falsa fala o mesmo contrato que o dashboard espera"""
+
+    def test_generated_orders_use_dashboard_statuses(self):
+        orders = generate_data(orders=200, users=10, deliveries=0, seed=3)['orders']
+        self.assertLessEqual({order['status'] for order in orders}, set(ORDER_STATUSES))
+
+    def test_admin_endpoints_require_the_login_token(self):
+        success, error = self.make_client(token=None).get_all_orders()
+        self.assertFalse(success)
+        self.assertEqual(error['status'], 401)
+        success, payload = self.make_client().get_all_orders()
+        self.assertTrue(success)
+        self.assertEqual(payload['orders'], self.fake.data['orders'])
+
+    def test_login_view_against_fake_api(self):
+        response = self.client.post(reverse('login'), {'email': 'bench@ecogas.test', 'password': 'x'}, secure=True)
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertEqual(self.client.session['auth_token'], 'fake-bench@ecogas.test')
+        response = self.client.get(reverse('orders_data'), secure=True)
+        self.assertEqual(response.json()['total'], len(self.fake.data['orders']))
+
+
+class ResponseCacheTests(SimpleTestCase):
+    """TTL por endpoint e despejo LRU do cache de respostas"""
+
+    def test_entries_expire_after_their_endpoint_ttl(self):
+        cache = ResponseCache(ttls={'/admin/orders': 0.05, '/products': 300})
+        cache.set('/admin/orders?recent=5', ['a'])
+        cache.set('/products', ['p'])
+        cache.set('/admin/users', ['u'])
+        self.assertEqual(cache.get('/admin/orders?recent=5'), ['a'])
+        # Sem TTL configurado o endpoint não fica em cache
+        self.assertIsNone(cache.get('/admin/users'))
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('/admin/orders?recent=5'))
+        self.assertEqual(cache.get('/products'), ['p'])
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResponseCache(ttls={'/products': 300}, max_entries=2)
+        cache.set('/products?page=1', 1)
+        cache.set('/products?page=2', 2)
+        self.assertEqual(cache.get('/products?page=1'), 1)
+        cache.set('/products?page=3', 3)
+        self.assertIsNone(cache.get('/products?page=2'))
+        self.assertEqual((cache.get('/products?page=1'), cache.get('/products?page=3')), (1, 3))
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['evictions'], stats['hits'], stats['misses']), (2, 1, 3, 1))
+        self.assertEqual(stats['hit_ratio'], 0.75)
+
+    def test_invalidate_drops_every_variant_of_an_endpoint(self):
+        cache = ResponseCache(ttls={'/admin/orders': 60, '/products': 60})
+        cache.set('/admin/orders#abc', 1)
+        cache.set('/admin/orders?recent=5#abc', 2)
+        cache.set('/products', 3)
+        cache.invalidate('/admin/orders')
+        self.assertIsNone(cache.get('/admin/orders#abc'))
+        self.assertIsNone(cache.get('/admin/orders?recent=5#abc'))
+        self.assertEqual(cache.get('/products'), 3)
+
+
+class HealthMonitorTests(FakeApiMixin, SimpleTestCase):
+    """Sonda HEAD em segundo plano em vez de um GET por página"""
+
+    def test_probe_records_online_and_offline(self):
+        session = requests.Session()
+        monitor = HealthMonitor(session, self.fake.url + '/', interval=60)
+        self.assertTrue(monitor.probe())
+        state = monitor._state
+        self.assertEqual((state['api_status'], state['status_code'], state['consecutive_failures']), ('online', 200, 0))
+
+        # Porta fechada: sem resposta
+        monitor.url = 'http://127.0.0.1:9/'
+        self.assertFalse(monitor.probe())
+        self.assertFalse(monitor.probe())
+        state = monitor._state
+        self.assertEqual((state['api_status'], state['consecutive_failures']), ('offline', 2))
+        self.assertEqual(state['error'], 'ConnectionError')
+        self.assertIsNotNone(state['last_success'])
+
+    def test_system_status_never_calls_the_upstream(self):
+        client = self.make_client()
+        requests_before = self.fake.requests
+        for _ in range(5):
+            status = client.get_system_status()
+        client.health.stop()
+        self.assertEqual(self.fake.requests, requests_before)
+        self.assertIn(status['api_status'], ('unknown', 'online'))
+        self.assertTrue(status['authenticated'])
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_opens_after_threshold_and_closes_after_successful_probe(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow_request())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        # Só um request de teste de cada vez
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.snapshot()['rejected'], 2)
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow_request())
+
+    def test_backoff_is_capped_full_jitter(self):
+        for attempt in range(8):
+            with self.subTest(attempt=attempt):
+                delays = [backoff_delay(attempt, base=0.5, cap=4.0) for _ in range(50)]
+                self.assertTrue(all(0 <= delay <= min(4.0, 0.5 * 2 ** attempt) for delay in delays))
+
+
+class CircuitBreakerClientTests(FakeApiMixin, SimpleTestCase):
+    fake_options = {'error_rate': 1.0}
+
+    def test_failing_upstream_opens_circuit(self):
+        client = self.make_client(ECO_GAS_BREAKER_FAILURE_THRESHOLD=3, ECO_GAS_BREAKER_RESET_TIMEOUT=60)
+        for _ in range(3):
+            success, error = client._make_request('/admin/orders', max_retries=0, use_cache=False)
+            self.assertFalse(success)
+        requests_before = self.fake.requests
+        success, error = client._make_request('/admin/orders', max_retries=0, use_cache=False)
+        self.assertFalse(success)
+        self.assertIn('circuito aberto', error['error'])
+        self.assertEqual(self.fake.requests, requests_before)
+        self.assertEqual(client.get_circuit_status()['GET /admin/orders']['state'], OPEN)
+
+
+class ListQueryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.orders = generate_data(orders=60, users=10, deliveries=0, seed=3)['orders']
+
+    def test_parse_defaults_and_limits(self):
+        query = parse_list_query({})
+        self.assertEqual((query['sort'], query['limit'], query['offset']), ('-created_at', 50, 0))
+        query = parse_list_query({'sort': 'senha', 'limit': '100000', 'offset': '-5'})
+        self.assertEqual((query['sort'], query['limit'], query['offset']), ('-created_at', 500, 0))
+
+    def test_status_filter_matches_counts(self):
+        counts = count_by_status(self.orders)
+        self.assertEqual(sum(counts.values()), len(self.orders))
+        for status in ORDER_STATUSES:
+            with self.subTest(status=status):
+                page = apply_list_query(self.orders, parse_list_query({'status': status, 'limit': '500'}))
+                self.assertEqual(page['total'], counts[status])
+                self.assertTrue(all(order['status'] == status for order in page['results']))
+
+    def test_search_sort_and_pagination(self):
+        email = self.orders[0]['customer_email']
+        page = apply_list_query(self.orders, parse_list_query({'q': email.upper(), 'limit': '500'}))
+        self.assertTrue(page['results'])
+        self.assertTrue(all(order['customer_email'] == email for order in page['results']))
+
+        page = apply_list_query(self.orders, parse_list_query({'sort': 'total_amount', 'limit': '500'}))
+        amounts = [float(order['total_amount']) for order in page['results']]
+        self.assertEqual(amounts, sorted(amounts))
+
+        page = apply_list_query(self.orders, parse_list_query({'limit': '25', 'offset': '50'}))
+        self.assertEqual((page['start'], page['end'], page['total']), (51, 60, 60))
+        self.assertTrue(page['has_previous'])
+        self.assertFalse(page['has_next'])
+
+
+class OrdersDataViewTests(ViewTestMixin, TestCase):
+
+    def test_filters_sorting_and_paging_in_json(self):
+        self.login()
+        orders = self.fake.data['orders']
+        status = orders[0]['status']
+        response = self.client.get(reverse('orders_data'), {'status': status, 'sort': 'id', 'limit': 3},
+                                   secure=True)
+        body = response.json()
+        expected = sorted((order for order in orders if order['status'] == status), key=lambda order: order['id'])
+        self.assertEqual(body['total'], len(expected))
+        self.assertEqual(body['results'], expected[:3])
+        self.assertEqual(body['status_counts'], count_by_status(orders))
+
+
+class OrderStatusViewTests(ViewTestMixin, TestCase):
+    """Atualização de status (um pedido e em lote) contra a API falsa"""
+
+    INVALID_IDS = ['../x', 'a/b', '?q', '1/../../admin', '5#x', ' 5', '-1', '', None, True, 1.5, {'id': 1}]
+
+    def setUp(self):
+        super().setUp()
+        self.login()
+
+    def fake_status(self, order_id):
+        return next(order['status'] for order in self.fake.data['orders'] if order['id'] == order_id)
+
+    def post_bulk(self, payload):
+        return self.client.post(reverse('bulk_update_order_status'), json.dumps(payload),
+                                content_type='application/json', secure=True)
+
+    def test_bulk_updates_every_order(self):
+        response = self.post_bulk({'order_ids': [1, '2', 3], 'status': 'cancelled'})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['success'], body['updated'], body['failed']), (True, 3, 0))
+        self.assertEqual([self.fake_status(order_id) for order_id in (1, 2, 3)], ['cancelled'] * 3)
+
+    def test_bulk_reports_failures_per_order(self):
+        response = self.post_bulk({'updates': [
+            {'order_id': 4, 'status': 'on_route'},
+            {'order_id': 99999, 'status': 'delivered'},
+        ]})
+        body = response.json()
+        self.assertEqual((body['success'], body['updated'], body['failed']), (False, 1, 1))
+        self.assertEqual(self.fake_status(4), 'on_route')
+        self.assertFalse(body['results'][1]['success'])
+        self.assertTrue(body['results'][1]['error'])
+
+    def test_bulk_rejects_invalid_payloads_without_calling_the_api(self):
+        requests_before = self.fake.requests
+        payloads = [{'order_ids': [1], 'status': 'in_transit'}, {'updates': 'x'}, {},
+                    {'order_ids': list(range(1000)), 'status': 'pending'}]
+        payloads += [{'order_ids': [1, order_id], 'status': 'pending'} for order_id in self.INVALID_IDS]
+        payloads += [{'updates': [{'order_id': order_id, 'status': 'pending'}]} for order_id in self.INVALID_IDS]
+        for payload in payloads:
+            with self.subTest(payload=str(payload)[:60]):
+                response = self.post_bulk(payload)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+        self.assertEqual(self.fake.requests, requests_before)
+
+    def test_single_update(self):
+        url = reverse('update_order_status', args=[5])
+        response = self.client.post(url, {'status': 'accepted'}, secure=True)
+        self.assertEqual(response.json(), {'success': True, 'order_id': '5', 'status': 'accepted'})
+        self.assertEqual(self.fake_status(5), 'accepted')
+
+        requests_before = self.fake.requests
+        response = self.client.post(url, {'status': 'bogus'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+        self.assertEqual(self.fake.requests, requests_before)
+
+    def test_single_update_rejects_ids_that_are_not_digits(self):
+        requests_before = self.fake.requests
+        for order_id in ['..', 'abc', '?q', '%3F', '5x', '-1']:
+            with self.subTest(order_id=order_id):
+                url = reverse('update_order_status', args=[order_id])
+                response = self.client.post(url, {'status': 'accepted'}, secure=True)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+        self.assertEqual(self.fake.requests, requests_before)
+
+    def test_client_refuses_invalid_ids(self):
+        client = self.make_client()
+        requests_before = self.fake.requests
+        for order_id in self.INVALID_IDS:
+            with self.subTest(order_id=order_id):
+                success, result = client.update_order_status(order_id, 'pending')
+                self.assertFalse(success)
+                self.assertIn('order_id inválido', result['error'])
+        results = client.bulk_update_order_status([('../x', 'pending'), ('a/b', 'pending')])
+        self.assertEqual([item['success'] for item in results], [False, False])
+        self.assertEqual(self.fake.requests, requests_before)
+
+
+class MirrorTests(FakeApiMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.orders = generate_data(orders=60, users=10, deliveries=0, seed=5)['orders']
+        sync_records(MirroredOrder, self.orders)
+        MirrorSync.objects.create(entity='orders', synced_at=timezone.now())
+
+    def test_sync_counts_only_real_changes(self):
+        changed = copy.deepcopy(self.orders[1:])
+        changed[0]['status'] = 'cancelled'
+        changed[0]['updated_at'] = '2099-01-01T00:00:00Z'
+        result = sync_records(MirroredOrder, changed)
+        self.assertEqual(result, {'created': 0, 'updated': 1, 'unchanged': 58, 'deleted': 1})
+        self.assertEqual(MirroredOrder.objects.get(remote_id=str(changed[0]['id'])).status, 'cancelled')
+
+    def test_page_from_database_matches_python_filters(self):
+        created = sorted(order['created_at'] for order in self.orders)
+        queries = [
+            {},
+            {'status': 'pending', 'sort': 'id'},
+            {'q': self.orders[0]['customer_email'].upper(), 'sort': '-total_amount'},
+            {'q': self.orders[3]['customer_phone'][-4:], 'sort': 'quantity'},
+            {'sort': 'customer_name', 'limit': '7', 'offset': '14'},
+            {'sort': '-status', 'limit': '10', 'offset': '55'},
+            {'date_from': created[10][:10], 'date_to': created[40][:10], 'sort': 'created_at'},
+        ]
+        for params in queries:
+            with self.subTest(params=params):
+                query = parse_list_query(params)
+                page, status_counts, total = orders_page(query, max_age=60)
+                self.assertEqual(page, apply_list_query(self.orders, query))
+                self.assertEqual(status_counts, count_by_status(self.orders))
+                self.assertEqual(total, len(self.orders))
+
+    def test_stale_mirror_or_free_form_dates_fall_back_to_the_api(self):
+        self.assertIsNone(orders_page(parse_list_query({'date_from': '2025-01'}), max_age=60))
+        MirrorSync.objects.update(synced_at=timezone.now() - timedelta(seconds=120))
+        self.assertIsNone(orders_page(parse_list_query({}), max_age=60))
+
+    def test_sync_command_logs_in_again_after_401(self):
+        get_all_orders = EcoGasRealAPI.get_all_orders
+        responses = iter([(False, {'error': 'Não autorizado', 'status': 401})])
+
+        def expired_once(client, **kwargs):
+            return next(responses, None) or get_all_orders(client, **kwargs)
+
+        with mock.patch.dict('os.environ', {'ECO_GAS_SYNC_PASSWORD': 'segredo'}), \
+                mock.patch.object(EcoGasRealAPI, 'get_all_orders', expired_once), \
+                mock.patch.object(EcoGasRealAPI, 'login', autospec=True, side_effect=EcoGasRealAPI.login) as login:
+            call_command('sync_ecogas', entity=['orders'], email='sync@ecogas.test', stdout=StringIO(),
+                         stderr=StringIO())
+        self.assertEqual(login.call_count, 2)
+        self.assertEqual(MirroredOrder.objects.count(), len(self.fake.data['orders']))
+
+    def test_sync_command_needs_the_password_in_the_environment(self):
+        with mock.patch.dict('os.environ', {}, clear=True):
+            with self.assertRaises(CommandError):
+                call_command('sync_ecogas', email='sync@ecogas.test')
+
+
+class MirroredOrdersViewTests(ViewTestMixin, TestCase):
+
+    def test_orders_page_is_served_from_the_mirror(self):
+        self.login()
+        self.assertTrue(sync_entity(self.make_client(), 'orders')[0])
+        with mock.patch.object(EcoGasRealAPI, 'get_all_orders', side_effect=AssertionError('sem API')):
+            body = self.client.get(reverse('orders_data'), {'sort': 'id', 'limit': 5}, secure=True).json()
+            response = self.client.get(reverse('orders'), {'status': 'pending'}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body['results'], self.fake.data['orders'][:5])
+        self.assertEqual(body['total'], len(self.fake.data['orders']))
+
+
+class ClientRegistryTests(FakeApiMixin, SimpleTestCase):
+    """Um cliente por sessão; cache e pool partilhados, mas nunca entre tokens"""
+
+    def test_one_client_per_session_sharing_base_resources(self):
+        base = self.make_base()
+        registry = ClientRegistry(base, max_clients=2)
+        first = registry.get('sessao-1', TOKEN)
+        self.assertIs(registry.get('sessao-1'), first)
+        self.assertIs(first.cache, base.cache)
+        # Token novo na mesma sessão (novo login): cliente novo
+        self.assertIsNot(registry.get('sessao-1', 'fake-outro@ecogas.test'), first)
+        registry.get('sessao-2', TOKEN)
+        registry.get('sessao-3', TOKEN)
+        self.assertEqual(len(registry), 2)
+
+    def test_cached_admin_data_is_not_served_to_other_tokens(self):
+        client = self.make_client()
+        self.assertTrue(client.get_all_orders()[0])
+        success, error = client.for_token(None).get_all_orders()
+        self.assertFalse(success)
+        self.assertEqual(error['status'], 401)
+        # O endpoint público continua partilhado
+        self.assertTrue(client.get_products()[0])
+        requests_before = self.fake.requests
+        self.assertTrue(client.for_token(None).get_products()[0])
+        self.assertEqual(self.fake.requests, requests_before)
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return 'payload'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('k', fetch))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while flight.stats()['coalesced'] < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['payload'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats()['executed'], 1)
+
+    def test_error_reaches_every_waiter(self):
+        flight = SingleFlight()
+        with self.assertRaises(RuntimeError):
+            flight.do('k', lambda: (_ for _ in ()).throw(RuntimeError('falhou')))
+        # A chave é libertada: a chamada seguinte volta a executar
+        self.assertEqual(flight.do('k', lambda: 1), 1)
+
+
+class CoalescingClientTests(FakeApiMixin, SimpleTestCase):
+
+    fake_options = {'latency_ms': 100}
+
+    def test_concurrent_requests_coalesce_per_token(self):
+        client = self.make_client()
+        callers = [client, client.for_token(TOKEN), client.for_token('fake-outro@ecogas.test')]
+        requests_before = self.fake.requests
+        threads = [threading.Thread(target=caller.get_all_orders) for caller in callers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.fake.requests - requests_before, 2)
+
+
+class SharedCacheTests(FakeApiMixin, SimpleTestCase):
+    """Cache partilhado entre workers: gerações, lock limitado e marca de falha"""
+
+    def setUp(self):
+        super().setUp()
+        self.shared = LocMemCache(f'ecogas-{self.id()}', {})
+        self.lock_dir = tempfile.mkdtemp(prefix='ecogas-locks-')
+        self.addCleanup(shutil.rmtree, self.lock_dir, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return ResponseCache(ttls={'/admin/orders': 60}, shared=self.shared, lock_dir=self.lock_dir, **options)
+
+    def test_invalidation_reaches_every_worker(self):
+        worker_a, worker_b = self.make_cache(), self.make_cache()
+        worker_a.set('/admin/orders', ['a'])
+        self.assertEqual(worker_b.get('/admin/orders'), ['a'])
+        worker_b.invalidate('/admin/orders')
+        self.assertIsNone(worker_a.get('/admin/orders'))
+
+        # Resposta pedida antes de uma invalidação noutro worker já nasceu velha
+        generation = worker_a.generation('/admin/orders')
+        worker_b.invalidate('/admin/orders')
+        worker_a.set('/admin/orders', ['velho'], generation)
+        self.assertIsNone(worker_b.get('/admin/orders'))
+
+    def test_lock_wait_is_bounded(self):
+        cache = self.make_cache()
+        with cache.fetch_lock('/admin/orders') as holder:
+            started = time.monotonic()
+            with cache.fetch_lock('/admin/orders', timeout=0.1) as waiter:
+                self.assertEqual((holder, waiter), (True, False))
+            self.assertLess(time.monotonic() - started, 1)
+        with cache.fetch_lock('/admin/orders', timeout=0.1) as acquired:
+            self.assertTrue(acquired)
+
+    def test_waiters_get_the_failure_instead_of_retrying(self):
+        down = self.settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            ECO_GAS_API_URL='http://127.0.0.1:9',
+            ECO_GAS_SHARED_CACHE='default',
+            ECO_GAS_FETCH_LOCK_DIR=self.lock_dir,
+        )
+        with down:
+            client = self.make_client()
+            with mock.patch.object(client.session, 'get', wraps=client.session.get) as session_get:
+                first = client.get_all_orders()
+                attempts = session_get.call_count
+                second = client.for_token(TOKEN).get_all_orders()
+        self.assertFalse(first[0])
+        self.assertGreater(attempts, 1)
+        self.assertEqual(second, first)
+        self.assertEqual(session_get.call_count, attempts)
+
+
+class RecordTests(SimpleTestCase):
+
+    def setUp(self):
+        self.data = generate_data(orders=3, users=2, deliveries=2, seed=7)
+
+    def test_fields_are_converted_on_first_read(self):
+        raw = dict(self.data['orders'][0], quantity='2', total_amount='1500.50', nota='livre')
+        order = Order(raw)
+        self.assertIsNone(order._values)
+        self.assertEqual(order.total_amount, Decimal('1500.50'))
+        self.assertEqual(order.quantity, 2)
+        self.assertEqual(order.created_at.tzinfo, datetime_timezone.utc)
+        # Chaves não declaradas continuam acessíveis; get() devolve o valor original
+        self.assertEqual(order.nota, 'livre')
+        self.assertEqual(order.get('total_amount'), '1500.50')
+        self.assertIs(order.to_dict(), raw)
+        with self.assertRaises(AttributeError):
+            order.inexistente
+
+    def test_missing_and_invalid_values(self):
+        order = Order({'id': 1, 'total_amount': 'n/a', 'created_at': 'ontem'})
+        self.assertEqual(order.status, '')
+        self.assertIsNone(order.total_amount)
+        self.assertIsNone(order.created_at)
+        self.assertIsNone(order.quantity)
+
+    def test_nested_order_in_delivery(self):
+        delivery = Delivery(self.data['deliveries'][0])
+        self.assertIsInstance(delivery.order, Order)
+        self.assertEqual(delivery.order.id, self.data['deliveries'][0]['order']['id'])
+
+    def test_lists_unwrap_payloads_lazily(self):
+        self.assertEqual(len(Order.list_from({'orders': self.data['orders']})), 3)
+        self.assertEqual(len(Order.list_from(self.data['orders'])), 3)
+        self.assertFalse(Order.list_from({'erro': 'x'}))
+        self.assertFalse(Order.list_from(None))
+        records = UserRecord.list_from(self.data['users'])
+        page = records[1:]
+        self.assertIsInstance(page, RecordList)
+        self.assertEqual([user.id for user in page], [self.data['users'][1]['id']])
+        self.assertIs(records.to_dicts(), self.data['users'])
+        self.assertIsNone(unwrap({'users': 'x'}, 'users'))
+
+
+class StreamListTests(FakeApiMixin, SimpleTestCase):
+    """Listas lidas em streaming da API falsa"""
+
+    def test_orders_in_small_chunks(self):
+        client = self.make_client()
+        for chunk_size in (1, 7, 4096):
+            with self.subTest(chunk_size=chunk_size):
+                success, records = client.stream_list('/admin/orders', key='orders', chunk_size=chunk_size)
+                self.assertTrue(success)
+                self.assertEqual(list(records), self.fake.data['orders'])
+
+    def test_error_status_is_reported(self):
+        success, error = self.make_client(token=None).stream_list('/admin/orders', key='orders')
+        self.assertFalse(success)
+        self.assertEqual(error['error'], 'HTTP 401')
+
+
+
+class ExportTests(ViewTestMixin, TestCase):
+
+    ROW = re.compile(
+        r'class="delivery-row" data-delivery-id="(\d+)".*?class="fw-bold text-primary">([^<]*)<.*?class="fw-semibold">([^<]*)<',
+        re.S,
+    )
+
+    def export_ids(self, entity, params):
+        response = self.client.get(reverse('export', args=[entity, 'csv']), params, secure=True)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf-8').lstrip('﻿')
+        return [row[0] for row in list(csv.reader(StringIO(content)))[1:]]
+
+    def test_orders_export_uses_the_list_filters(self):
+        self.login()
+        orders = self.fake.data['orders']
+        status = orders[0]['status']
+        expected = [str(order['id']) for order in orders if order['status'] == status]
+        self.assertEqual(self.export_ids('orders', {'status': status}), expected)
+
+    def test_deliveries_export_matches_the_page_search(self):
+        self.login()
+        deliveries = self.fake.data['deliveries']
+        page = self.client.get(reverse('deliveries'), secure=True).content.decode('utf-8')
+        rows = self.ROW.findall(page)
+        self.assertEqual(len(rows), len(deliveries))
+        for q in (deliveries[0]['order']['customer_name'].upper(), str(deliveries[1]['order']['id'])):
+            with self.subTest(q=q):
+                # A regra do applyFilters() da página: número do pedido ou nome do cliente
+                shown = [
+                    delivery_id for delivery_id, order_id, customer in rows
+                    if q.lower() in order_id.lower() or q.lower() in customer.lower()
+                ]
+                self.assertTrue(shown)
+                self.assertEqual(self.export_ids('deliveries', {'q': q}), shown)
+
+
+class LiveDeliveriesTests(ViewTestMixin, TestCase):
+    """SSE sob ASGI: um browser que fecha o separador sai dos subscritores"""
+
+    def setUp(self):
+        super().setUp()
+        # Como o test client: o handler ASGI não pode fechar a ligação da transação do teste
+        request_started.disconnect(close_old_connections)
+        self.addCleanup(request_started.connect, close_old_connections)
+        self.broadcaster = DeliveryBroadcaster(interval=0.05)
+        patch = mock.patch('dashboard.views.live_deliveries', self.broadcaster)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.login()
+
+    async def open_streams(self, count):
+        app = DisconnectWatcher(ASGIHandler())
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'https', 'path': reverse('deliveries_stream'), 'raw_path': b'', 'query_string': b'',
+            'root_path': '', 'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 443),
+        }
+        streams = []
+        for _ in range(count):
+            inbox = asyncio.Queue()
+            inbox.put_nowait({'type': 'http.request', 'body': b'', 'more_body': False})
+            snapshot = asyncio.Event()
+
+            async def send(message, snapshot=snapshot):
+                if b'event: snapshot' in message.get('body', b''):
+                    snapshot.set()
+
+            task = asyncio.create_task(app(scope, inbox.get, send))
+            await asyncio.wait_for(snapshot.wait(), 5)
+            streams.append((inbox, task))
+        return streams
+
+    def test_disconnected_browsers_are_unsubscribed(self):
+        async def scenario():
+            streams = await self.open_streams(3)
+            self.assertEqual(len(self.broadcaster._subscribers), 3)
+            for inbox, task in streams:
+                inbox.put_nowait({'type': 'http.disconnect'})
+                await asyncio.wait_for(task, 5)
+            await asyncio.sleep(self.broadcaster.interval * 3)
+            # Sem subscritores o poll ao upstream também para
+            self.assertTrue(self.broadcaster._task.done())
+
+        async_to_sync(scenario)()
+        self.assertEqual(self.broadcaster._subscribers, {})
+        self.assertIsNone(self.broadcaster.poll_client())
+
+    def test_stream_ends_after_max_duration(self):
+        async def scenario():
+            started = time.monotonic()
+            chunks = [chunk async for chunk in event_stream(
+                self.broadcaster, self.make_client(), heartbeat=0.05, max_duration=0.3,
+            )]
+            self.assertLess(time.monotonic() - started, 2)
+            self.assertTrue(chunks[1].startswith('event: snapshot'))
+            self.assertIn(': ping\n\n', chunks)
+
+        async_to_sync(scenario)()
+        self.assertEqual(self.broadcaster._subscribers, {})
+
+
+class DeltaTrackerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tracker = DeltaTracker('orders')
+        self.orders = generate_data(orders=10, users=3, deliveries=0)['orders']
+
+    def test_first_call_is_a_reset_with_everything(self):
+        body = self.tracker.changes(self.orders)
+        self.assertTrue(body['reset'])
+        self.assertEqual(body['total'], 10)
+        self.assertEqual(body['changed'], self.orders)
+
+    def test_only_changed_and_removed_records_since_token(self):
+        token = self.tracker.changes(self.orders)['version']
+        current = copy.deepcopy(self.orders[1:])
+        current[0]['status'] = 'cancelled'
+
+        body = self.tracker.changes(current, token)
+        self.assertFalse(body['reset'])
+        self.assertEqual(body['changed'], [current[0]])
+        self.assertEqual(body['removed'], [str(self.orders[0]['id'])])
+
+        unchanged = self.tracker.changes(current, body['version'])
+        self.assertEqual((unchanged['changed'], unchanged['removed']), ([], []))
+        self.assertEqual(unchanged['version'], body['version'])
+
+    def test_unknown_token_gets_a_reset(self):
+        self.tracker.changes(self.orders)
+        for token in ('x', 'outra-epoca.1', None):
+            with self.subTest(token=token):
+                self.assertTrue(self.tracker.changes(self.orders, token)['reset'])
+
+
+    def test_workers_sharing_the_store_answer_the_same_token(self):
+        store = LocMemCache(f'ecogas-{self.id()}', {})
+        worker_a, worker_b = DeltaTracker('orders', store=store), DeltaTracker('orders', store=store)
+        token = worker_a.changes(self.orders)['version']
+        current = copy.deepcopy(self.orders)
+        current[2]['notes'] = 'Entregar depois das 18h'
+        body = worker_b.changes(current, token)
+        self.assertFalse(body['reset'])
+        self.assertEqual(body['changed'], [current[2]])
+
+
+class ChangesViewTests(ViewTestMixin, TestCase):
+
+    def test_changes_since_version(self):
+        self.login()
+        trackers = {entity: DeltaTracker(entity) for entity in TRACKED}
+        with mock.patch('dashboard.views.delta_trackers', trackers):
+            first = self.client.get(reverse('changes', args=['orders']), secure=True).json()
+            again = self.client.get(reverse('changes', args=['orders']), {'since': first['version']},
+                                    secure=True).json()
+            missing = self.client.get(reverse('changes', args=['pagamentos']), secure=True)
+        self.assertTrue(first['reset'])
+        self.assertEqual(first['total'], len(self.fake.data['orders']))
+        self.assertEqual((again['reset'], again['changed'], again['removed']), (False, [], []))
+        self.assertEqual(missing.status_code, 404)
+
+
+class MetricsTests(SimpleTestCase):
+
+    def test_nearest_rank_percentiles(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, f) for f in (0.5, 0.95, 0.99)], [50, 95, 99])
+        self.assertEqual(percentile([7], 0.99), 7)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_summary_counts_errors_and_recent_rate(self):
+        now = 1000.0
+        samples = [(now - 120, 10.0, False), (now - 5, 20.0, True), (now - 1, 30.0, False)]
+        summary = summarize(samples, now)
+        self.assertEqual((summary['samples'], summary['errors'], summary['per_minute']), (3, 1, 2))
+        self.assertEqual((summary['p50_ms'], summary['max_ms']), (20.0, 30.0))
+        self.assertEqual(summary['error_rate'], 0.3333)
+
+    def test_collector_keeps_a_bounded_window_per_series(self):
+        collector = MetricsCollector(window=4)
+        for duration in range(10):
+            collector.observe('upstream', 'GET /admin/orders', duration, error=duration == 0)
+        collector.observe('views', 'orders', 5)
+        snapshot = collector.snapshot()
+        series = snapshot['groups']['upstream']['by_name']['GET /admin/orders']
+        self.assertEqual((series['samples'], series['count'], series['total_errors']), (4, 10, 1))
+        self.assertEqual(series['p50_ms'], 7)
+        self.assertEqual(snapshot['groups']['views']['all']['count'], 1)
+        self.assertEqual(snapshot['pid'], os.getpid())
+
+
+class SystemStatusViewTests(ViewTestMixin, TestCase):
+
+    def test_metrics_json_and_escaped_endpoint_names(self):
+        self.login()
+        planted = '<img src=x onerror=alert(1)>'
+        self.api.metrics.observe('upstream', f'GET /orders/{planted}/status', 12)
+        body = self.client.get(reverse('system_metrics'), secure=True).json()
+        self.assertEqual(body['metrics']['pid'], os.getpid())
+        self.assertIn(f'GET /orders/{planted}/status', body['metrics']['groups']['upstream']['by_name'])
+
+        page = self.client.get(reverse('system_status'), secure=True)
+        self.assertEqual(page.status_code, 200)
+        self.assertNotContains(page, planted)
+
+
+class PrometheusStoreTests(SimpleTestCase):
+    """Métricas somadas entre workers, incluindo os que já foram reciclados"""
+
+    NAME = 'ecogas_upstream_requests_total'
+    LABELS = {'endpoint': 'GET /admin/orders', 'status': '200'}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='ecogas-prometheus-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.scraper = PrometheusStore(self.directory)
+
+    def run_worker(self, pid, requests_count, retire=True):
+        with mock.patch('api.prometheus.os.getpid', return_value=pid):
+            store = PrometheusStore(self.directory, flush_interval=0)
+            store.inc(self.NAME, self.LABELS, requests_count)
+            store.observe('ecogas_upstream_request_duration_seconds', 0.03, {'endpoint': 'GET /admin/orders'})
+            if retire:
+                store.retire()
+
+    def total(self):
+        counters, _ = self.scraper.collect()
+        return counters.get((self.NAME, tuple(sorted(self.LABELS.items()))), 0)
+
+    def files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def test_recycled_workers_fold_into_dead_file(self):
+        self.run_worker(1001, 5)
+        self.run_worker(1002, 3)
+        self.assertEqual(self.total(), 8)
+        self.assertEqual(self.files(), sorted(['dead.json', f'{os.getpid()}.json']))
+
+    def test_reused_pid_never_makes_counters_go_backwards(self):
+        self.run_worker(1001, 5)
+        self.run_worker(1001, 2, retire=False)
+        self.assertEqual(self.total(), 7)
+
+    def test_master_retires_workers_killed_before_worker_exit(self):
+        self.run_worker(1003, 4, retire=False)
+        self.scraper.retire(1003)
+        self.scraper.retire(1003)
+        self.assertEqual(self.total(), 4)
+        self.assertNotIn('1003.json', self.files())
+
+    def test_render_text_format(self):
+        self.run_worker(1001, 5)
+        self.run_worker(1002, 1)
+        text = self.scraper.render()
+        self.assertIn('# TYPE ecogas_upstream_requests_total counter', text)
+        self.assertIn('ecogas_upstream_requests_total{endpoint="GET /admin/orders",status="200"} 6', text)
+        self.assertIn('ecogas_upstream_request_duration_seconds_bucket{endpoint="GET /admin/orders",le="0.05"} 2',
+                      text)
+        self.assertIn('ecogas_upstream_request_duration_seconds_count{endpoint="GET /admin/orders"} 2', text)
+
+
+class FragmentCacheTests(SimpleTestCase):
+    """LRU de linhas renderizadas e o {% rowcache %}"""
+
+    TEMPLATE = ("{% load row_cache %}{% for order in orders %}"
+                "{% rowcache 'orders' order %}<tr>{{ order.id }}:{{ order.status }}:{{ render }}</tr>{% endrowcache %}"
+                "{% endfor %}")
+
+    def setUp(self):
+        self.cache = FragmentCache(max_entries=10)
+        patch = mock.patch('dashboard.templatetags.row_cache.fragments', self.cache)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.renders = 0
+
+    def render(self, orders):
+        def count():
+            self.renders += 1
+            return ''
+        return Template(self.TEMPLATE).render(Context({'orders': orders, 'render': count}))
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = FragmentCache(max_entries=2)
+        cache.set('a', '<tr>a</tr>')
+        cache.set('b', '<tr>b</tr>')
+        self.assertEqual(cache.get('a'), '<tr>a</tr>')
+        cache.set('c', '<tr>c</tr>')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), '<tr>a</tr>')
+        self.assertEqual(cache.stats(), {'entries': 2, 'max_entries': 2, 'hits': 2, 'misses': 1,
+                                         'hit_ratio': 0.667})
+
+    def test_row_renders_once_per_content_hash(self):
+        orders = [{'id': 1, 'status': 'pending'}, {'id': 2, 'status': 'delivered'}]
+        first = self.render(orders)
+        self.assertEqual(first, '<tr>1:pending:</tr><tr>2:delivered:</tr>')
+        self.assertEqual(self.renders, 2)
+        self.assertEqual(self.render(copy.deepcopy(orders)), first)
+        self.assertEqual(self.renders, 2)
+        orders[0]['status'] = 'confirmed'
+        self.assertEqual(self.render(orders), '<tr>1:confirmed:</tr><tr>2:delivered:</tr>')
+        self.assertEqual(self.renders, 3)
+
+    def test_cached_row_is_not_escaped_twice(self):
+        orders = [{'id': 1, 'status': '<b>'}]
+        self.assertEqual(self.render(orders), '<tr>1:&lt;b&gt;:</tr>')
+        self.assertEqual(self.render(orders), '<tr>1:&lt;b&gt;:</tr>')
+
+    def test_wrong_arguments_fail_at_compile_time(self):
+        with self.assertRaises(TemplateSyntaxError):
+            Template("{% load row_cache %}{% rowcache order %}x{% endrowcache %}")
+
+
+class SnapshotStoreTests(SimpleTestCase):
+    """Snapshots em disco: leitura preguiçosa, expiração e limite de ficheiros"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='ecogas-snapshots-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def files(self):
+        return [name for name in os.listdir(self.directory) if name.endswith('.snap')]
+
+    def age(self, store, endpoint, seconds):
+        when = time.time() - seconds
+        os.utime(store._path(endpoint), (when, when))
+
+    def test_loads_lazily_on_first_get(self):
+        SnapshotStore(self.directory, save_interval=0).save('/products', [{'id': 1}])
+        store = SnapshotStore(self.directory)
+        self.assertFalse(store._loaded)
+        self.assertEqual(store.get('/products')[1], [{'id': 1}])
+
+    def test_expired_files_are_deleted(self):
+        writer = SnapshotStore(self.directory, save_interval=0)
+        writer.save('/products', [{'id': 1}])
+        writer.save('/admin/orders#abc', {'orders': []})
+        self.age(writer, '/products', 7200)
+        store = SnapshotStore(self.directory, max_age=3600)
+        self.assertIsNone(store.get('/products'))
+        self.assertIsNotNone(store.get('/admin/orders#abc'))
+        self.assertEqual(self.files(), [os.path.basename(writer._path('/admin/orders#abc'))])
+
+    def test_file_count_is_capped_keeping_the_newest(self):
+        writer = SnapshotStore(self.directory, save_interval=0, max_files=2)
+        for age, token in enumerate(['c', 'b', 'a']):
+            writer.save(f'/admin/orders#{token}', {'orders': [token]})
+            self.age(writer, f'/admin/orders#{token}', 100 - age * 10)
+        writer.save('/admin/orders#d', {'orders': ['d']})
+        self.assertEqual(sorted(self.files()), sorted(
+            os.path.basename(writer._path(f'/admin/orders#{token}')) for token in 'ad'
+        ))
+        store = SnapshotStore(self.directory, max_files=1)
+        self.assertIsNotNone(store.get('/admin/orders#d'))
+        self.assertIsNone(store.get('/admin/orders#a'))
+        self.assertEqual(len(self.files()), 1)
+
+    def test_discard_before_load_does_not_resurrect(self):
+        SnapshotStore(self.directory, save_interval=0).save('/admin/orders#abc', {'orders': []})
+        store = SnapshotStore(self.directory)
+        store.discard('/admin/orders')
+        self.assertIsNone(store.get('/admin/orders#abc'))
+
+    def test_newer_entry_in_memory_wins_over_disk(self):
+        SnapshotStore(self.directory, save_interval=0).save('/products', [{'id': 1}])
+        store = SnapshotStore(self.directory, save_interval=3600)
+        store._last_write['/products'] = time.time()
+        store.save('/products', [{'id': 2}])
+        self.assertEqual(store.get('/products')[1], [{'id': 2}])
+
+
+class SnapshotClientTests(FakeApiMixin, SimpleTestCase):
+    """Cliente novo com o upstream em baixo serve o último snapshot"""
+
+    def test_cold_start_serves_snapshot_when_upstream_is_down(self):
+        directory = tempfile.mkdtemp(prefix='ecogas-snapshots-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        options = {'ECO_GAS_SNAPSHOT_DIR': directory, 'ECO_GAS_SNAPSHOT_SAVE_INTERVAL': 0}
+        success, payload = self.make_client(**options).get_all_orders()
+        self.assertTrue(success)
+        with self.settings(ECO_GAS_API_URL='http://127.0.0.1:9'):
+            base = self.make_base(**options)
+            self.assertFalse(base.snapshots._loaded)
+            success, served = base.for_token(TOKEN).get_all_orders()
+        self.assertTrue(success)
+        self.assertEqual(served, payload)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SessionBackendTests(TestCase):
+    """Sessões só são gravadas na BD quando mudam ou a última escrita ficou velha"""
+
+    def session_writes(self, action):
+        with CaptureQueriesContext(connection) as queries:
+            action()
+        return sum(
+            1 for query in queries
+            if 'django_session' in query['sql'] and query['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE'))
+        )
+
+    def new_session(self):
+        session = SessionStore()
+        session['auth_token'] = TOKEN
+        session.create()
+        return session.session_key
+
+    def test_unchanged_session_is_not_written_again(self):
+        key = self.new_session()
+        session = SessionStore(key)
+        self.assertEqual(session['auth_token'], TOKEN)
+        self.assertEqual(self.session_writes(session.save), 0)
+
+    def test_changed_data_is_written(self):
+        key = self.new_session()
+        session = SessionStore(key)
+        session['user_data'] = {'name': 'Admin'}
+        self.assertEqual(self.session_writes(session.save), 1)
+        self.assertEqual(SessionStore(key)['user_data'], {'name': 'Admin'})
+
+    def test_expiry_is_refreshed_after_the_interval(self):
+        with self.settings(ECO_GAS_SESSION_REFRESH_INTERVAL=0):
+            key = self.new_session()
+            session = SessionStore(key)
+            session.load()
+            self.assertEqual(self.session_writes(session.save), 1)
+
+
+class LoginAuditTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='admin@ecogas.test')
+
+    def test_pending_logins_are_written_in_one_batch(self):
+        audit = LoginAuditQueue(batch_size=10)
+        first = timezone.now() - timedelta(minutes=5)
+        latest = timezone.now()
+        with mock.patch.object(audit, '_ensure_thread'):
+            audit.record(self.user, '10.0.0.1', first)
+            audit.record(self.user, '10.0.0.2', latest)
+        with self.assertNumQueries(3):
+            audit.flush()
+        self.assertEqual(audit.recorded, 2)
+        self.assertEqual(
+            sorted(UserSession.objects.values_list('ip_address', flat=True)), ['10.0.0.1', '10.0.0.2'],
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, latest)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        audit = LoginAuditQueue(max_pending=1)
+        with mock.patch.object(audit, '_ensure_thread'), self.assertLogs('dashboard.audit', 'WARNING'):
+            audit.record(self.user, '10.0.0.1')
+            audit.record(self.user, '10.0.0.2')
+        self.assertEqual(audit.dropped, 1)
+
+    def test_worker_thread_batches_then_exits_when_idle(self):
+        audit = LoginAuditQueue(flush_interval=0.01)
+        batches = []
+        with mock.patch.object(audit, '_write', side_effect=batches.append), \
+                mock.patch('dashboard.audit.connection'):
+            for ip in ('10.0.0.1', '10.0.0.2'):
+                audit.record(self.user, ip)
+            thread = audit._thread
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+            self.assertIsNone(audit._thread)
+            audit.record(self.user, '10.0.0.3')
+            audit._thread.join(5)
+        self.assertEqual([event[1] for batch in batches for event in batch], ['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+
+    def test_client_ip_uses_first_forwarded_hop(self):
+        request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR='203.0.113.7, 10.0.0.1', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(client_ip(request), '203.0.113.7')
+        self.assertEqual(client_ip(RequestFactory().get('/', REMOTE_ADDR='10.0.0.9')), '10.0.0.9')
+
+
+class RecentOrdersTests(FakeApiMixin, SimpleTestCase):
+    """Top-N dos pedidos recentes com e sem suporte de limit no upstream"""
+
+    def setUp(self):
+        super().setUp()
+        shared = self.settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            ECO_GAS_SHARED_CACHE='default',
+        )
+        shared.enable()
+        self.addCleanup(shared.disable)
+        # O LocMemCache guarda os dados por location entre testes
+        caches['default'].clear()
+        self.expected = sorted(self.fake.data['orders'], key=lambda order: order['created_at'], reverse=True)[:5]
+
+    def test_upstream_limit_is_used_when_supported(self):
+        self.fake.support_limit = True
+        self.addCleanup(setattr, self.fake, 'support_limit', False)
+        client = self.make_client()
+        requests_before = self.fake.requests
+        self.assertEqual(client.get_recent_orders(5), (True, self.expected))
+        self.assertTrue(client.capabilities['orders_limit'])
+        self.assertEqual(self.fake.requests - requests_before, 1)
+
+    def test_fallback_probe_is_shared_and_cached_longer(self):
+        client = self.make_client()
+        self.assertEqual(client.get_recent_orders(5), (True, self.expected))
+        self.assertIs(client.capabilities['orders_limit'], False)
+        cache_key = client._cache_key('/admin/orders?recent=5')
+        expires_at = client.cache._entries[cache_key][0]
+        self.assertGreater(expires_at - time.monotonic(), client.cache.ttl_for('/admin/orders'))
+
+        # Outro worker: sabe pelo cache partilhado que o limit é ignorado e não volta a sondar
+        other = self.make_client()
+        other.cache.invalidate('/admin/orders')
+        requests_before = self.fake.requests
+        self.assertEqual(other.get_recent_orders(5), (True, self.expected))
+        self.assertEqual(self.fake.requests - requests_before, 1)
+
+    def test_fallback_reuses_the_cached_order_list(self):
+        client = self.make_client()
+        client.capabilities['orders_limit'] = False
+        self.assertTrue(client.get_all_orders()[0])
+        requests_before = self.fake.requests
+        self.assertEqual(client.get_recent_orders(5), (True, self.expected))
+        self.assertEqual(self.fake.requests, requests_before)
+
+
+class DashboardViewTests(ViewTestMixin, TestCase):
+
+    def test_recent_orders_come_from_a_fresh_mirror(self):
+        self.login()
+        self.assertTrue(sync_entity(self.make_client(), 'orders')[0])
+        newest = max(self.fake.data['orders'], key=lambda order: order['created_at'])
+        self.assertEqual(recent_orders(1, max_age=60), [newest])
+        with mock.patch.object(EcoGasRealAPI, 'get_recent_orders', side_effect=AssertionError('sem API')):
+            response = self.client.get(reverse('dashboard'), secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([order.id for order in response.context['recent_orders']][:1], [newest['id']])
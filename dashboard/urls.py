@@ -14,9 +14,16 @@ urlpatterns = [
     # Resto das URLs...
     path('logout/', views.logout_view, name='logout'),
     path('orders/', views.orders_view, name='orders'),
+    path('orders/data/', views.orders_data, name='orders_data'),
     path('users/', views.users_view, name='users'),
     path('deliveries/', views.deliveries_view, name='deliveries'),
+    path('deliveries/stream/', views.deliveries_stream, name='deliveries_stream'),
     path('products/', views.products_view, name='products'),
     path('api/update-order-status/<str:order_id>/', views.update_order_status, name='update_order_status'),
+    path('api/update-order-status/', views.bulk_update_order_status, name='bulk_update_order_status'),
+    path('changes/<str:entity>/', views.changes_view, name='changes'),
+    path('export/<str:entity>.<str:fmt>', views.export_view, name='export'),
     path('system-status/', views.system_status_view, name='system_status'),
+    path('system-status/metrics/', views.system_metrics, name='system_metrics'),
+    path('metrics', views.prometheus_metrics, name='prometheus_metrics'),
 ]
\ No newline at end of file
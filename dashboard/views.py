@@ -1,10 +1,71 @@
+import json
+import logging
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import login, logout
 from django.contrib.auth.models import User
+from django.db import IntegrityError
+
+from api.advanced_hybrid_client import (
+    AsyncEcoGasRealAPI, advanced_hybrid_api, api_clients, client_for_request, valid_order_id,
+)
+from api.records import Delivery, Order, Product, RecordList, User as UserRecord
+
+from .deltas import TRACKED, DeltaTracker, entity_changes
+from .exports import CONTENT_TYPES, EXPORTS, aiter_rows, export_rows
+from .live import DISCONNECTED_SCOPE_KEY, DeliveryBroadcaster, event_stream
+from .sync import mark_stale, orders_page, read_entity, recent_orders
+from .filters import ORDER_STATUSES, apply_list_query, count_by_status, parse_list_query
+
+logger = logging.getLogger(__name__)
+
+# Um único poll de entregas por processo, partilhado por todos os browsers ligados
+live_deliveries = DeliveryBroadcaster(interval=getattr(settings, 'LIVE_DELIVERIES_INTERVAL', 5))
+
+# Snapshots versionados para /changes/<entidade>/, no mesmo cache partilhado das respostas
+delta_trackers = {
+    entity: DeltaTracker(
+        entity,
+        store=advanced_hybrid_api.cache.shared,
+        lock=advanced_hybrid_api.cache.fetch_lock,
+    )
+    for entity in TRACKED
+}
 
-from api.advanced_hybrid_client import advanced_hybrid_api
+def async_login_required(view_func):
+    """Equivalente do @login_required para views async"""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        # request.user é carregado da BD, por isso é avaliado fora do event loop
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+def _mirror_max_age():
+    return getattr(settings, 'ECO_GAS_MIRROR_MAX_AGE', 120)
+
+def _read_entity(client, entity):
+    """Lista da entidade, do espelho local se a sincronização estiver em dia"""
+    return read_entity(client, entity, _mirror_max_age())
+
+async def _recent_orders(api, n=5):
+    """Os n pedidos mais recentes: do espelho se estiver em dia (sem ir à API), senão do cliente"""
+    if api.client.token:
+        records = await sync_to_async(recent_orders)(n, _mirror_max_age())
+        if records is not None:
+            return True, records
+    return await api.get_recent_orders(n)
 
 def login_view(request):
     """Sistema de login 100% real com API"""
@@ -15,31 +76,24 @@ def login_view(request):
         email = request.POST.get('email')
         password = request.POST.get('password')
         
-        print(f"🔐 Tentando autenticação real: {email}")
+        logger.info("Tentando autenticação real: %s", email)
         
-        # Autenticação real na API
-        success, result = advanced_hybrid_api.login(email, password)
+        # Autenticação real na API, com um cliente próprio para esta sessão
+        client = advanced_hybrid_api.for_token()
+        success, result = client.login(email, password)
         
         if success:
-            # Criar usuário local para sessão Django
-            user, created = User.objects.get_or_create(
-                username=email,
-                defaults={
-                    'email': email,
-                    'is_staff': True,
-                    'is_active': True,
-                    'first_name': result.get('user', {}).get('name', 'Admin')
-                }
-            )
-            
-            if created:
-                user.set_unusable_password()  # Não usamos senha local
-                user.save()
+            # Usuário local para a sessão Django (só escreve se for novo ou se o nome mudou)
+            user = _local_user(email, result.get('user', {}).get('name', 'Admin'))
             
             # Login no Django
             user.backend = 'django.contrib.auth.backends.ModelBackend'
             login(request, user)
             
+            # Token fica na sessão para o cliente poder ser recriado noutro worker
+            request.session['auth_token'] = client.token
+            api_clients.register(request.session.session_key, client)
+            
             # Mensagem de sucesso
             messages.success(request, '🎉 Login realizado com sucesso!')
             messages.info(request, 'Conectado à API EcoGás em tempo real')
@@ -52,36 +106,43 @@ def login_view(request):
     
     return render(request, 'dashboard/login.html')
 
+def _local_user(email, name):
+    """Usuário Django espelho do admin da API, com uma única escrita quando é criado"""
+    user = User.objects.filter(username=email).first()
+    if user is None:
+        user = User(username=email, email=email, is_staff=True, is_active=True, first_name=name)
+        user.set_unusable_password()  # Não usamos senha local
+        try:
+            user.save(force_insert=True)
+        except IntegrityError:
+            # Outro worker criou-o entretanto
+            user = User.objects.get(username=email)
+    elif user.first_name != name:
+        user.first_name = name
+        user.save(update_fields=['first_name'])
+    return user
+
 def logout_view(request):
     """Logout do sistema"""
+    api_clients.discard(request.session.session_key)
     logout(request)
     messages.info(request, 'Sessão encerrada com sucesso!')
     return redirect('login')
 
-@login_required
-def dashboard(request):
+@async_login_required
+async def dashboard(request):
     """Dashboard principal com dados reais"""
-    # Obter estatísticas reais
-    success, stats_data = advanced_hybrid_api.get_admin_stats()
-    
-    # Obter pedidos recentes
-    success_orders, orders_data = advanced_hybrid_api.get_all_orders()
+    client = await sync_to_async(client_for_request)(request)
+    api = AsyncEcoGasRealAPI(client)
     
-    # Status do sistema
-    system_status = advanced_hybrid_api.get_system_status()
+    # Estatísticas e pedidos recentes em paralelo; o status vem do monitor em memória
+    (success, stats_data), (success_orders, orders_data) = await api.gather(
+        api.get_admin_stats(),
+        _recent_orders(api, 5),
+    )
+    system_status = client.get_system_status()
     
-    # CORREÇÃO: Lidar com diferentes formatos de resposta
-    recent_orders = []
-    if success_orders:
-        if isinstance(orders_data, list):
-            # Se a API retornar uma lista diretamente
-            recent_orders = orders_data[:5]
-        elif isinstance(orders_data, dict) and 'orders' in orders_data:
-            # Se a API retornar um objeto com chave 'orders'
-            recent_orders = orders_data.get('orders', [])[:5]
-        else:
-            # Formato inesperado
-            recent_orders = []
+    recent_orders = Order.list_from(orders_data if success_orders else None)
     
     context = {
         'page_title': 'Dashboard EcoGás',
@@ -90,47 +151,116 @@ def dashboard(request):
         'system_status': system_status,
         'active_tab': 'dashboard'
     }
-    return render(request, 'dashboard/dashboard.html', context)
+    return await sync_to_async(render)(request, 'dashboard/dashboard.html', context)
 
 @login_required
 def orders_view(request):
     """Gestão de pedidos reais"""
-    success, orders_data = advanced_hybrid_api.get_all_orders()
-    system_status = advanced_hybrid_api.get_system_status()
-    
-    # CORREÇÃO: Lidar com diferentes formatos de resposta
-    orders = []
-    if success:
-        if isinstance(orders_data, list):
-            orders = orders_data
-        elif isinstance(orders_data, dict) and 'orders' in orders_data:
-            orders = orders_data.get('orders', [])
-        else:
-            orders = []
+    client = client_for_request(request)
+    success, page_context = _orders_page_context(client, request.GET)
+    system_status = client.get_system_status()
     
     context = {
         'page_title': 'Gestão de Pedidos',
-        'orders': orders,
+        **page_context,
         'system_status': system_status,
         'active_tab': 'orders'
     }
     return render(request, 'dashboard/orders.html', context)
 
+def _orders_page_context(client, params):
+    """(success, contexto) da página de pedidos com filtros, ordenação e paginação
+
+    Com o espelho em dia a página sai da BD pelas colunas indexadas; senão a
+    lista completa vem da API e é filtrada aqui. Em caso de erro da API o
+    contexto traz uma lista vazia e ``error`` com a mensagem.
+    """
+    query = parse_list_query(params)
+    error = None
+    # O espelho é preenchido com a conta do worker de sincronização (ver read_entity)
+    mirrored = orders_page(query, _mirror_max_age()) if client.token else None
+    if mirrored is not None:
+        page, status_counts, orders_total = mirrored
+    else:
+        success, orders_data = client.get_all_orders()
+        if not success:
+            error = orders_data.get('error')
+        # Filtros trabalham sobre os dicts; só a página vira registos tipados
+        orders = Order.list_from(orders_data if success else None).to_dicts()
+        page = apply_list_query(orders, query)
+        status_counts = count_by_status(orders)
+        orders_total = len(orders)
+    # Querystring sem offset, para os links de paginação
+    base_params = params.copy()
+    base_params.pop('offset', None)
+    return error is None, {
+        'orders': RecordList(page['results'], Order),
+        'page': page,
+        'query': query,
+        'query_string': base_params.urlencode(),
+        'status_counts': status_counts,
+        'orders_total': orders_total,
+        'error': error,
+    }
+
+@login_required
+def orders_data(request):
+    """Versão JSON da lista de pedidos, com os mesmos filtros de orders_view"""
+    client = client_for_request(request)
+    success, context = _orders_page_context(client, request.GET)
+    if not success:
+        return JsonResponse({'success': False, 'error': context['error']}, status=502)
+    
+    return JsonResponse({
+        'success': True,
+        'results': [order.to_dict() for order in context['orders']],
+        'total': context['page']['total'],
+        'offset': context['page']['offset'],
+        'limit': context['page']['limit'],
+        'status_counts': context['status_counts'],
+        'query': context['query'],
+    })
+
+@login_required
+def changes_view(request, entity):
+    """Registos adicionados, alterados ou removidos desde a versão em ?since="""
+    if entity not in delta_trackers:
+        raise Http404('Entidade não suportada')
+    
+    client = client_for_request(request)
+    success, body = entity_changes(delta_trackers[entity], client, request.GET.get('since'))
+    if not success:
+        return JsonResponse({'success': False, 'error': body.get('error')}, status=502)
+    return JsonResponse({'success': True, **body})
+
+@login_required
+def export_view(request, entity, fmt):
+    """Exporta pedidos, usuários ou entregas em CSV/JSONL, em streaming e com os filtros da lista"""
+    if entity not in EXPORTS or fmt not in CONTENT_TYPES:
+        raise Http404('Exportação não suportada')
+    
+    client = client_for_request(request)
+    success, records = getattr(client, EXPORTS[entity]['method'])()
+    if not success:
+        messages.error(request, f'❌ Erro ao exportar: {records.get("error")}')
+        return redirect(entity)
+    
+    rows = export_rows(records, entity, fmt, parse_list_query(request.GET))
+    if isinstance(request, ASGIRequest):
+        rows = aiter_rows(rows)
+    response = StreamingHttpResponse(rows, content_type=CONTENT_TYPES[fmt])
+    filename = f"ecogas-{entity}-{timezone.localtime():%Y%m%d-%H%M}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 @login_required
 def users_view(request):
     """Gestão de usuários reais"""
-    success, users_data = advanced_hybrid_api.get_all_users()
-    system_status = advanced_hybrid_api.get_system_status()
+    client = client_for_request(request)
+    success, users_data = _read_entity(client, 'users')
+    system_status = client.get_system_status()
     
-    # CORREÇÃO: Lidar com diferentes formatos de resposta
-    users = []
-    if success:
-        if isinstance(users_data, list):
-            users = users_data
-        elif isinstance(users_data, dict) and 'users' in users_data:
-            users = users_data.get('users', [])
-        else:
-            users = []
+    users = UserRecord.list_from(users_data if success else None)
     
     context = {
         'page_title': 'Gestão de Usuários',
@@ -143,40 +273,52 @@ def users_view(request):
 @login_required
 def deliveries_view(request):
     """Entregas em tempo real"""
-    success, deliveries_data = advanced_hybrid_api.get_live_deliveries()
-    system_status = advanced_hybrid_api.get_system_status()
+    client = client_for_request(request)
+    success, deliveries_data = _read_entity(client, 'deliveries')
+    system_status = client.get_system_status()
     
-    # CORREÇÃO: Lidar com diferentes formatos de resposta
-    deliveries = []
-    if success:
-        if isinstance(deliveries_data, list):
-            deliveries = deliveries_data
-        elif isinstance(deliveries_data, dict) and 'deliveries' in deliveries_data:
-            deliveries = deliveries_data.get('deliveries', [])
-        else:
-            deliveries = []
+    deliveries = Delivery.list_from(deliveries_data if success else None)
     
     context = {
         'page_title': 'Entregas em Tempo Real',
         'deliveries': deliveries,
+        'live_interval_ms': live_deliveries.interval * 1000,
         'system_status': system_status,
         'active_tab': 'deliveries'
     }
     return render(request, 'dashboard/deliveries.html', context)
 
+@async_login_required
+async def deliveries_stream(request):
+    """Server-Sent Events com as entregas que mudaram (só sob ASGI)"""
+    if not isinstance(request, ASGIRequest):
+        # Sob WSGI o stream prenderia uma thread sem enviar nada; o 204 manda o browser para o polling
+        return HttpResponse(status=204)
+    client = await sync_to_async(client_for_request)(request)
+    stream = event_stream(
+        live_deliveries,
+        client,
+        disconnected=request.scope.get(DISCONNECTED_SCOPE_KEY),
+        # Sem o DisconnectWatcher à frente, só este limite fecha o stream de um browser que saiu
+        max_duration=getattr(settings, 'LIVE_DELIVERIES_MAX_STREAM', 300),
+    )
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 def products_view(request):
     """Gestão de produtos reais"""
-    success, products = advanced_hybrid_api.get_products()
-    system_status = advanced_hybrid_api.get_system_status()
+    client = client_for_request(request)
+    success, products_data = _read_entity(client, 'products')
+    system_status = client.get_system_status()
     
-    # CORREÇÃO: Garantir que products seja uma lista
-    if not success or not products:
-        products = []
+    products = Product.list_from(products_data if success else None)
     
     context = {
         'page_title': 'Gestão de Produtos',
-        'products': products if isinstance(products, list) else [],
+        'products': products,
         'system_status': system_status,
         'active_tab': 'products'
     }
@@ -184,30 +326,124 @@ def products_view(request):
 
 @login_required
 def update_order_status(request, order_id):
-    """Atualiza status do pedido na API real"""
-    if request.method == 'POST':
-        new_status = request.POST.get('status')
-        success, result = advanced_hybrid_api.update_order_status(order_id, new_status)
-        
-        if success:
-            messages.success(request, f'✅ Pedido #{order_id} atualizado para: {new_status}')
+    """Atualiza status do pedido na API real (JSON para o JS de orders.html)"""
+    if request.method != 'POST':
+        return redirect('orders')
+    
+    if not valid_order_id(order_id):
+        return JsonResponse({'success': False, 'error': 'order_id inválido'}, status=400)
+    new_status = request.POST.get('status')
+    if new_status not in ORDER_STATUSES:
+        return JsonResponse({'success': False, 'order_id': order_id, 'error': f'Status inválido: {new_status!r}'},
+                            status=400)
+    client = client_for_request(request)
+    success, result = client.update_order_status(order_id, new_status)
+    if not success:
+        return JsonResponse({'success': False, 'order_id': order_id, 'error': result.get('error')}, status=502)
+    mark_stale('orders', 'deliveries')
+    return JsonResponse({'success': True, 'order_id': order_id, 'status': new_status})
+
+def _bulk_status_updates(request):
+    """Lista de (order_id, status) de um POST em lote
+    
+    Aceita JSON ``{"updates": [{"order_id": .., "status": ..}]}`` ou
+    ``{"order_ids": [..], "status": ..}``, ou o mesmo em formulário
+    (``order_ids`` repetido e ``status``). Um id repetido fica com o último status.
+    """
+    if request.content_type == 'application/json':
+        try:
+            body = json.loads(request.body or b'{}')
+        except ValueError:
+            raise ValueError('JSON inválido')
+        if not isinstance(body, dict):
+            raise ValueError('JSON inválido')
+        if 'updates' in body:
+            items = body['updates']
+            if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+                raise ValueError('"updates" deve ser uma lista de {"order_id", "status"}')
+            pairs = [(item.get('order_id'), item.get('status')) for item in items]
         else:
-            messages.error(request, f'❌ Erro ao atualizar pedido: {result.get("error")}')
+            order_ids = body.get('order_ids')
+            if not isinstance(order_ids, list):
+                raise ValueError('Indique "updates" ou "order_ids" e "status"')
+            pairs = [(order_id, body.get('status')) for order_id in order_ids]
+    else:
+        pairs = [(order_id, request.POST.get('status')) for order_id in request.POST.getlist('order_ids')]
     
-    return redirect('orders')
+    updates = {}
+    for order_id, status in pairs:
+        if not valid_order_id(order_id):
+            raise ValueError('order_id em falta ou inválido')
+        if status not in ORDER_STATUSES:
+            raise ValueError(f'Status inválido: {status!r}')
+        updates[str(order_id)] = status
+    if not updates:
+        raise ValueError('Nenhum pedido indicado')
+    max_items = getattr(settings, 'ECO_GAS_BULK_MAX_ITEMS', 500)
+    if len(updates) > max_items:
+        raise ValueError(f'No máximo {max_items} pedidos por lote')
+    return list(updates.items())
+
+@login_required
+def bulk_update_order_status(request):
+    """Atualiza o status de vários pedidos numa só ação, com um resultado por pedido"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método não permitido'}, status=405)
+    try:
+        updates = _bulk_status_updates(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    results = client_for_request(request).bulk_update_order_status(updates)
+    failed = sum(1 for item in results if not item['success'])
+    if failed < len(results):
+        mark_stale('orders', 'deliveries')
+    return JsonResponse({
+        'success': failed == 0,
+        'updated': len(results) - failed,
+        'failed': failed,
+        'results': results,
+    })
 
 @login_required
 def system_status_view(request):
     """Página de status do sistema"""
-    system_status = advanced_hybrid_api.get_system_status()
+    client = client_for_request(request)
+    system_status = client.get_system_status()
     
     context = {
         'page_title': 'Status do Sistema',
         'system_status': system_status,
+        'metrics': client.get_metrics(),
         'active_tab': 'status'
     }
     return render(request, 'dashboard/system_status.html', context)
 
+def prometheus_metrics(request):
+    """Métricas no formato do Prometheus, somadas entre os workers (exige ECO_GAS_METRICS_TOKEN fora de DEBUG)"""
+    token = getattr(settings, 'ECO_GAS_METRICS_TOKEN', None)
+    if not token:
+        if not settings.DEBUG:
+            raise Http404('Métricas desativadas')
+    elif request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse('Não autorizado', status=401)
+    return HttpResponse(
+        advanced_hybrid_api.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+@login_required
+def system_metrics(request):
+    """Métricas reais deste processo em JSON, para a página de status ir atualizando"""
+    client = client_for_request(request)
+    system_status = client.get_system_status()
+    return JsonResponse({
+        'success': True,
+        'api_status': system_status.get('api_status'),
+        'latency_ms': system_status.get('latency_ms'),
+        'metrics': client.get_metrics(),
+    })
+
 
 def login_view_simple(request):
     """Sistema de login SIMPLIFICADO sem User.objects"""
@@ -215,17 +451,20 @@ def login_view_simple(request):
         email = request.POST.get('email')
         password = request.POST.get('password')
         
-        print(f"🔐 Tentando autenticação: {email}")
+        logger.info("Tentando autenticação: %s", email)
         
-        # Autenticação real na API
-        success, result = advanced_hybrid_api.login(email, password)
+        # Autenticação real na API, com um cliente próprio para esta sessão
+        client = advanced_hybrid_api.for_token()
+        success, result = client.login(email, password)
         
         if success:
             # Login SIMPLES sem User.objects - usa sessão apenas
+            request.session.cycle_key()
             request.session['user_authenticated'] = True
             request.session['user_data'] = result.get('user', {})
             request.session['auth_token'] = result.get('token', '')
             request.session.modified = True
+            api_clients.register(request.session.session_key, client)
             
             # Mensagem de sucesso
             messages.success(request, '🎉 Login realizado com sucesso!')
@@ -246,22 +485,22 @@ def session_login_required(view_func):
         return view_func(request, *args, **kwargs)
     return wrapper
 
-def dashboard_simple(request):
+async def dashboard_simple(request):
     """Dashboard SIMPLES sem @login_required"""
-    if not request.session.get('user_authenticated'):
+    # A sessão vem da BD, por isso é lida fora do event loop
+    if not await sync_to_async(request.session.get)('user_authenticated'):
         return redirect('login_simple')
     
-    # Resto do seu código igual...
-    success, stats_data = advanced_hybrid_api.get_admin_stats()
-    success_orders, orders_data = advanced_hybrid_api.get_all_orders()
-    system_status = advanced_hybrid_api.get_system_status()
+    # Resto do seu código igual, mas com as chamadas em paralelo
+    client = await sync_to_async(client_for_request)(request)
+    api = AsyncEcoGasRealAPI(client)
+    (success, stats_data), (success_orders, orders_data) = await api.gather(
+        api.get_admin_stats(),
+        _recent_orders(api, 5),
+    )
+    system_status = client.get_system_status()
     
-    recent_orders = []
-    if success_orders:
-        if isinstance(orders_data, list):
-            recent_orders = orders_data[:5]
-        elif isinstance(orders_data, dict) and 'orders' in orders_data:
-            recent_orders = orders_data.get('orders', [])[:5]
+    recent_orders = Order.list_from(orders_data if success_orders else None)
     
     context = {
         'page_title': 'Dashboard EcoGás',
@@ -270,24 +509,18 @@ def dashboard_simple(request):
         'system_status': system_status,
         'active_tab': 'dashboard'
     }
-    return render(request, 'dashboard/dashboard.html', context)
+    return await sync_to_async(render)(request, 'dashboard/dashboard.html', context)
 
 @session_login_required
 def orders_view_simple(request):
     """Gestão de pedidos - versão simples"""
-    success, orders_data = advanced_hybrid_api.get_all_orders()
-    system_status = advanced_hybrid_api.get_system_status()
-    
-    orders = []
-    if success:
-        if isinstance(orders_data, list):
-            orders = orders_data
-        elif isinstance(orders_data, dict) and 'orders' in orders_data:
-            orders = orders_data.get('orders', [])
+    client = client_for_request(request)
+    success, page_context = _orders_page_context(client, request.GET)
+    system_status = client.get_system_status()
     
     context = {
         'page_title': 'Gestão de Pedidos',
-        'orders': orders,
+        **page_context,
         'system_status': system_status,
         'active_tab': 'orders'
     }
@@ -0,0 +1,125 @@
+"""Configuração do gunicorn para produção (lida automaticamente a partir da raiz do projeto)
+
+    gunicorn            # ASGI com workers uvicorn (SSE e views async)
+    GUNICORN_WORKER_CLASS=gthread gunicorn   # WSGI com threads
+
+O master importa o Django e todas as views uma vez (``preload_app``); os
+workers nascem por fork já com tudo carregado e cada um aquece o cliente
+EcoGás assim que arranca. Os workers são reciclados a cada ``max_requests``.
+
+Medido nesta máquina (4 cores, 4 workers, ``manage.py fake_ecogas_api`` com
+50ms de latência e 1000 pedidos; ``python -X importtime`` para os imports):
+
+    import de config.settings                    ~2.4 ms
+    django.setup() + aplicação ASGI              ~520 ms (com preload, só no master)
+    URLconf e views                              ~16 ms
+
+                              1.º 200     PSS total   /dashboard/   /orders/
+    uvicorn, sem preload      2.30 s      173 MB      48 req/s      13 req/s
+    uvicorn, com preload      0.91 s       93 MB      45 req/s      13 req/s
+    gthread, sem preload      2.21 s      166 MB      60 req/s      18 req/s
+    gthread, com preload      1.02 s       78 MB      56 req/s      16 req/s
+
+O débito em regime estável foi medido com 8 clientes durante 8s, na mesma
+máquina, depois do cache aquecido. O preload não o altera (diferenças no
+ruído) e corta para metade a memória e o tempo até servir. O gthread dá mais
+~25% nestas views, mas não tem SSE: o stream das entregas responde 204 e a
+página passa a polling de /changes/deliveries/. Em ASGI o SSE e as
+exportações CSV/JSONL (lidas em lotes numa thread) saem em streaming, por
+isso o uvicorn fica por omissão. O /orders/ está limitado pela
+renderização da tabela, não pelo servidor.
+"""
+
+import multiprocessing
+import os
+
+_cores = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+
+# uvicorn: um event loop por core chega (o trabalho é esperar pelo upstream);
+# os streams SSE ficam no loop e as exportações leem o upstream no pool de threads.
+# gthread: views síncronas em threads, daí mais workers; sem SSE (o browser faz polling).
+worker_class = {
+    'uvicorn': 'uvicorn.workers.UvicornWorker',
+    'gthread': 'gthread',
+}.get(os.getenv('GUNICORN_WORKER_CLASS', 'uvicorn'), os.getenv('GUNICORN_WORKER_CLASS'))
+_asgi = worker_class.startswith('uvicorn')
+wsgi_app = 'config.asgi:application' if _asgi else 'config.wsgi:application'
+workers = int(os.getenv('WEB_CONCURRENCY', _cores if _asgi else _cores * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 1 if _asgi else 8))
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') != '0'
+
+# Recicla workers para limitar crescimento de memória; o jitter evita que reiniciem todos juntos
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = 30
+# Streams SSE abertos são cortados ao reciclar; o EventSource volta a ligar sozinho
+graceful_timeout = 20
+# O proxy do Render reutiliza ligações: manter acima do seu idle
+keepalive = 75
+forwarded_allow_ips = '*'
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    """Apaga o estado do /metrics deixado por workers de um arranque anterior"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    from django.conf import settings
+
+    directory = getattr(settings, 'ECO_GAS_PROMETHEUS_DIR', None)
+    if not directory or not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith(('.json', '.tmp')):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def when_ready(server):
+    """Importa URLconf, views e templates no master, para os workers os herdarem já carregados"""
+    if not server.cfg.preload_app:
+        return
+    from django.conf import settings
+    from django.template.loader import get_template
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+    templates_dir = settings.BASE_DIR / 'templates'
+    for path in sorted(templates_dir.glob('**/*.html')):
+        get_template(str(path.relative_to(templates_dir)))
+
+
+def post_worker_init(worker):
+    """Worker pronto a servir: aquece o cliente EcoGás"""
+    from api.advanced_hybrid_client import advanced_hybrid_api
+
+    advanced_hybrid_api.warm_up()
+
+
+def worker_exit(server, worker):
+    """Passa as métricas do worker para o agregado dos que terminaram e grava os logins pendentes"""
+    from api.advanced_hybrid_client import advanced_hybrid_api
+    from dashboard.audit import login_audit
+
+    advanced_hybrid_api.prometheus.retire()
+    login_audit.flush()
+
+
+def child_exit(server, worker):
+    """No master: retira as métricas de um worker que não chegou ao worker_exit (ex.: morto pelo timeout)"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    from django.conf import settings
+
+    from api.prometheus import PrometheusStore
+
+    directory = getattr(settings, 'ECO_GAS_PROMETHEUS_DIR', None)
+    if directory:
+        PrometheusStore(directory).retire(worker.pid)